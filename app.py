@@ -1,22 +1,59 @@
-from flask import Flask, request, jsonify
+import time
+IMPORT_STARTED = time.perf_counter()
+
+import os
+import sys
+
+# SERVING_MODE=async runs under gunicorn's gevent worker (see gunicorn.conf.py):
+# sockets, locks and psycopg2 waits become cooperative, so a request waiting on
+# the emotion service or the database no longer pins the worker. Patching has
+# to happen before requests/psycopg2/threading are imported; spawned training
+# processes skip it.
+SERVING_MODE = os.getenv("SERVING_MODE", "sync").lower()
+if SERVING_MODE == "async" and "--multiprocessing-fork" not in sys.argv:
+    from gevent import monkey
+    monkey.patch_all()
+    from psycogreen.gevent import patch_psycopg
+    patch_psycopg()
+
+from flask import Flask, request, jsonify, g, has_request_context
+from flask.json.provider import DefaultJSONProvider
 from flask_cors import CORS
 import requests
-from transformers import AutoTokenizer, AutoModel
-import torch
-import torch.nn as nn
-import torch.nn.functional as F
-from torch.optim import AdamW
-import pandas as pd
-from sklearn.preprocessing import LabelEncoder
-from torch.utils.data import DataLoader, Dataset
-from sklearn.utils import shuffle
+from requests.adapters import HTTPAdapter
 import psycopg2
 import psycopg2.extras
-import os
+import psycopg2.pool
+import importlib.util
 import numpy as np
+from scoring import ScoringError, score_batch, score_one
+from lexicon import load_lexicon
 import json
+import hashlib
+import bisect
+import heapq
+import itertools
+import math
+import re
 import logging
 import shutil
+import csv
+import fcntl
+import io
+import tempfile
+import uuid
+import multiprocessing
+from datetime import datetime, timedelta, timezone
+import atexit
+import threading
+import queue
+from contextlib import contextmanager
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout, as_completed
+
+# `python app.py` runs this file as __main__; register it as `app` as well so
+# emotion_model (which imports from app) shares this module instead of loading a second copy
+sys.modules.setdefault("app", sys.modules[__name__])
 
 # ---------------- Flask + CORS ----------------
 app = Flask(__name__)
@@ -30,23 +67,11 @@ CORS(app,
          "https://*.vercel.app",
          os.getenv("FRONTEND_URL", "*")
      ],
-     allow_headers=["Content-Type", "Authorization"],
+     allow_headers=["Content-Type", "Authorization", "If-None-Match"],
+     expose_headers=["ETag", "X-Next-Cursor"],
      methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"]
 )
 
-# ---------------- BERT Model ----------------
-MODEL_NAME = "google-bert/bert-base-uncased"
-tokenizer = None
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-
-def get_tokenizer():
-    global tokenizer
-    if tokenizer is None:
-        logger.info("Loading tokenizer...")
-        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
-        logger.info("Tokenizer loaded")
-    return tokenizer
-
 CHECKPOINT_DIR = "checkpoints"
 CHECKPOINT_FILE = os.path.join(CHECKPOINT_DIR, "emotion_classifier_checkpoint.pth")
 os.makedirs(CHECKPOINT_DIR, exist_ok=True)
@@ -55,22 +80,229 @@ os.makedirs(CHECKPOINT_DIR, exist_ok=True)
 logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
 logger = logging.getLogger(__name__)
 
-import gc
+# ---------------- Metrics ----------------
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0)
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_label_value(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in self._values.items():
+                lines.append(f"{self.name}{_format_labels(self.labelnames, labels)} {value}")
+        return lines
+
+class Histogram:
+    """Fixed-bucket latency histogram; observe() is a bisect and three adds under a lock"""
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labels):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total, count) in self._series.items():
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = 'le="{}"'.format("+Inf" if bound == float("inf") else repr(bound))
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labels, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labels)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, labels)} {count}")
+        return lines
+
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency by route",
+                            ("route", "method", "status"))
+DEPENDENCY_LATENCY = Histogram("dependency_duration_seconds", "Time spent in downstream calls",
+                               ("dependency", "operation"))
+EMOTION_FALLBACKS = Counter("emotion_keyword_fallback_total", "analyze_text results produced by the keyword fallback")
+ADMISSION_SHED = Counter("admission_shed_total", "Requests rejected by admission control",
+                         ("gate", "class", "reason"))
+
+@contextmanager
+def timed(histogram, *labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        histogram.observe(time.perf_counter() - start, *labels)
+
+class TimedJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, timing every serialization done by jsonify()"""
+
+    def dumps(self, obj, **kwargs):
+        with timed(DEPENDENCY_LATENCY, "json", "dumps"):
+            return super().dumps(obj, **kwargs)
+
+app.json = TimedJSONProvider(app)
+
+# status() providers rendered as gauges at scrape time, e.g. cache hit ratios
+metric_gauges = []
+
+def render_metrics():
+    lines = []
+    for metric in (REQUEST_LATENCY, DEPENDENCY_LATENCY, EMOTION_FALLBACKS, ADMISSION_SHED):
+        lines.extend(metric.render())
+    for name, documentation, provider in metric_gauges:
+        try:
+            values = provider()
+        except Exception as e:
+            logger.warning("Metric %s failed: %s", name, e)
+            continue
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} gauge")
+        for labels, value in values:
+            if value is not None:
+                lines.append(f"{name}{_format_labels(tuple(labels), tuple(labels.values()))} {float(value)}")
+    return "\n".join(lines) + "\n"
 
 # ---------------- Checkpoint download (Hugging Face Hub support) ----------------
-try:
-    from huggingface_hub import hf_hub_download
-except Exception:
-    hf_hub_download = None
-
-def download_file_http(url, dest_path):
-    import requests
-    with requests.get(url, stream=True, timeout=60) as r:
-        r.raise_for_status()
-        with open(dest_path, 'wb') as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
+CHECKPOINT_DOWNLOAD_WORKERS = int(os.getenv("CHECKPOINT_DOWNLOAD_WORKERS", "4"))
+CHECKPOINT_CHUNK_MB = int(os.getenv("CHECKPOINT_CHUNK_MB", "16"))
+# optional expected sha256 of the checkpoint; HF LFS blobs are verified against their own hash
+CHECKPOINT_SHA256 = os.getenv("CHECKPOINT_SHA256", "").lower()
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def verify_checksum(path, expected):
+    if not expected:
+        return
+    actual = file_sha256(path)
+    if actual != expected:
+        raise RuntimeError(f"Checksum mismatch for {path}: expected {expected}, got {actual}")
+    logger.info("Checksum verified for %s", path)
+
+def download_file_http(url, dest_path, expected_sha256=None):
+    """Download `url` into `dest_path` via a `.part` file that survives restarts.
+
+    Servers that accept byte ranges are fetched in parallel CHECKPOINT_CHUNK_MB
+    chunks; finished chunks are recorded in `<dest>.part.json` so an interrupted
+    download only fetches what is missing. The file is verified and then
+    renamed into place, so `dest_path` never holds a partial checkpoint.
+    """
+    part_path = dest_path + ".part"
+    manifest_path = part_path + ".json"
+    session = requests.Session()
+    head = session.head(url, allow_redirects=True, timeout=60)
+    head.raise_for_status()
+    size = int(head.headers.get("Content-Length", 0))
+    etag = head.headers.get("ETag")
+    ranged = head.headers.get("Accept-Ranges", "").lower() == "bytes" and size > 0
+    target_url = head.url  # reuse the resolved redirect for every chunk
+
+    if not ranged:
+        logger.info("Server does not support range requests; downloading %s in one stream", url)
+        with session.get(target_url, stream=True, timeout=60) as r:
+            r.raise_for_status()
+            with open(part_path, 'wb') as f:
+                for chunk in r.iter_content(chunk_size=1 << 20):
+                    if chunk:
+                        f.write(chunk)
+    else:
+        chunk_size = CHECKPOINT_CHUNK_MB * 1024 * 1024
+        chunks = [(start, min(start + chunk_size, size) - 1) for start in range(0, size, chunk_size)]
+        manifest = {"url": url, "size": size, "etag": etag, "chunk_size": chunk_size, "done": []}
+        try:
+            with open(manifest_path) as f:
+                previous = json.load(f)
+            if all(previous.get(k) == manifest[k] for k in ("url", "size", "etag", "chunk_size")) \
+                    and os.path.exists(part_path):
+                manifest = previous
+        except (OSError, ValueError):
+            pass
+        if not manifest["done"]:
+            with open(part_path, 'wb') as f:
+                f.truncate(size)
+        done = set(manifest["done"])
+        pending = [i for i in range(len(chunks)) if i not in done]
+        logger.info("Downloading %d of %d chunks (%d bytes) with %d workers",
+                    len(pending), len(chunks), size, CHECKPOINT_DOWNLOAD_WORKERS)
+        manifest_lock = threading.Lock()
+        fd = os.open(part_path, os.O_WRONLY)
+
+        def fetch(index):
+            start, end = chunks[index]
+            r = session.get(target_url, headers={"Range": f"bytes={start}-{end}"}, timeout=60)
+            r.raise_for_status()
+            if r.status_code != 206 or len(r.content) != end - start + 1:
+                raise RuntimeError(f"Bad range response for bytes {start}-{end}")
+            os.pwrite(fd, r.content, start)
+            with manifest_lock:
+                manifest["done"].append(index)
+                with open(manifest_path + ".tmp", "w") as f:
+                    json.dump(manifest, f)
+                os.replace(manifest_path + ".tmp", manifest_path)
+
+        try:
+            with ThreadPoolExecutor(max_workers=CHECKPOINT_DOWNLOAD_WORKERS) as pool:
+                for future in [pool.submit(fetch, i) for i in pending]:
+                    future.result()
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    try:
+        verify_checksum(part_path, expected_sha256)
+    except RuntimeError:
+        os.remove(part_path)
+        if os.path.exists(manifest_path):
+            os.remove(manifest_path)
+        raise
+    os.replace(part_path, dest_path)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+
+def link_or_copy(src_path, dest_path):
+    """Hard-link `src_path` to `dest_path` (copying across filesystems), atomically"""
+    tmp_path = dest_path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(src_path, tmp_path)
+        logger.info("Linked %s to %s", src_path, dest_path)
+    except OSError:
+        logger.info("Copying from %s to %s", src_path, dest_path)
+        shutil.copyfile(src_path, tmp_path)
+    os.replace(tmp_path, dest_path)
 
 def ensure_checkpoint_available():
     """Ensure the checkpoint file exists locally. If missing, try to download from CHECKPOINT_URL.
@@ -88,10 +320,22 @@ def ensure_checkpoint_available():
         logger.warning("No CHECKPOINT_URL provided and checkpoint is missing at %s", CHECKPOINT_FILE)
         return False
 
+    # one download per machine: other workers wait for it and then find the file
+    from filelock import FileLock
+    os.makedirs(os.path.dirname(CHECKPOINT_FILE), exist_ok=True)
+    with FileLock(CHECKPOINT_FILE + ".lock"):
+        if os.path.exists(CHECKPOINT_FILE):
+            logger.info("Checkpoint was downloaded by another worker to %s", CHECKPOINT_FILE)
+            return True
+        return download_checkpoint(url)
+
+def download_checkpoint(url):
     logger.info("Attempting to download checkpoint from %s", url)
     try:
         if url.startswith("hf://") or url.startswith("hf:"):
-            if hf_hub_download is None:
+            try:
+                from huggingface_hub import hf_hub_download
+            except Exception:
                 raise RuntimeError("huggingface_hub is not available in the environment")
             if "//" in url:
                 repo_id = url.split("//", 1)[1]
@@ -103,45 +347,39 @@ def ensure_checkpoint_available():
             logger.info("Downloading from HF repo: %s, filename: %s", repo_id, filename)
             logger.info("Target checkpoint file path: %s", CHECKPOINT_FILE)
             try:
-                local_path = hf_hub_download(repo_id=repo_id, filename=filename, token=token)
+                local_path = hf_hub_download(repo_id=repo_id, filename=filename, token=token,
+                                             resume_download=True)
                 logger.info("Downloaded to temporary path: %s", local_path)
             except TypeError:
                 logger.info("Trying fallback auth parameter")
-                local_path = hf_hub_download(repo_id=repo_id, filename=filename, use_auth_token=token)
+                local_path = hf_hub_download(repo_id=repo_id, filename=filename, use_auth_token=token,
+                                             resume_download=True)
                 logger.info("Downloaded to temporary path: %s", local_path)
             
             # Verify the downloaded file exists and has content
-            if os.path.exists(local_path):
-                file_size = os.path.getsize(local_path)
+            blob_path = os.path.realpath(local_path)
+            if os.path.exists(blob_path):
+                file_size = os.path.getsize(blob_path)
                 logger.info("Downloaded file size: %d bytes", file_size)
                 if file_size == 0:
                     raise RuntimeError("Downloaded file is empty")
             else:
                 raise RuntimeError(f"Downloaded file not found at {local_path}")
-            
+
+            # LFS blobs in the hub cache are named after their sha256
+            blob_name = os.path.basename(blob_path)
+            expected = CHECKPOINT_SHA256 or (blob_name if re.fullmatch(r"[0-9a-f]{64}", blob_name) else None)
+            verify_checksum(blob_path, expected)
+
             # Ensure target directory exists
             os.makedirs(os.path.dirname(CHECKPOINT_FILE), exist_ok=True)
-            
-            logger.info("Copying from %s to %s", local_path, CHECKPOINT_FILE)
-            shutil.copy2(local_path, CHECKPOINT_FILE)
-            
-            if not os.path.exists(CHECKPOINT_FILE):
-                raise RuntimeError(f"File copy failed - checkpoint not found at {CHECKPOINT_FILE}")
-        
-            original_size = os.path.getsize(local_path)
-            copied_size = os.path.getsize(CHECKPOINT_FILE)
-            logger.info("File copied successfully: %d bytes (original: %d bytes)", copied_size, original_size)
-            
-            if copied_size != original_size:
-                raise RuntimeError(f"File copy incomplete - size mismatch: {copied_size} != {original_size} check this shiii")
-            try:
-                os.remove(local_path)
-                logger.info("Temporary file removed: %s", local_path)
-            except Exception as e:
-                logger.warning("Failed to remove temporary file %s: %s", local_path, e)
+
+            # link instead of copying so the checkpoint isn't stored twice
+            link_or_copy(blob_path, CHECKPOINT_FILE)
         else:
             # assume http(s) (including presigned s3 link)
-            download_file_http(url, CHECKPOINT_FILE)
+            os.makedirs(os.path.dirname(CHECKPOINT_FILE), exist_ok=True)
+            download_file_http(url, CHECKPOINT_FILE, CHECKPOINT_SHA256 or None)
 
         logger.info("Checkpoint downloaded to %s", CHECKPOINT_FILE)
         return True
@@ -151,187 +389,1147 @@ def ensure_checkpoint_available():
 
 
 
-training_status = {"status": "idle", "epoch": 0, "loss": None}
-model = None
-label_encoder = LabelEncoder()
+# ---------------- Database Connection Pool ----------------
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# connections idle longer than this get a "SELECT 1" probe before being handed out
+DB_HEALTHCHECK_IDLE = float(os.getenv("DB_HEALTHCHECK_IDLE", "30"))
+
+def db_connect_params():
+    """Return (args, kwargs) for psycopg2.connect from DATABASE_URL or the DB_* vars"""
+    database_url = os.getenv("DATABASE_URL")
+    # DB_SSL_DISABLED=1 for local Postgres without TLS (e.g. benchmark.py)
+    sslmode = "disable" if os.getenv("DB_SSL_DISABLED", "").lower() in ("1", "true") else "require"
+    if database_url:
+        return (database_url,), {"sslmode": sslmode}
+    return (), {
+        "host": os.getenv("DB_HOST", "localhost"),
+        "user": os.getenv("DB_USER", "postgres"),
+        "password": os.getenv("DB_PASSWORD", ""),
+        "database": os.getenv("DB_NAME", "postgres"),
+        "port": int(os.getenv("DB_PORT", "5432")),
+        "sslmode": sslmode,
+    }
+
+class PoolTimeout(Exception):
+    pass
+
+class DatabasePool:
+    """Per-process ThreadedConnectionPool with blocking checkout and health checks.
 
-# ---------------- Database Connection ----------------
-def get_db_connection():
+    psycopg2's pool raises immediately when exhausted, so a semaphore sized to
+    maxconn makes callers wait (up to `timeout`) for a free connection instead.
+    The underlying pool is created lazily and rebuilt after fork, so gunicorn
+    workers never share sockets inherited from the master.
+    """
+
+    def __init__(self, minconn, maxconn, timeout):
+        self.minconn = minconn
+        self.maxconn = maxconn
+        self.timeout = timeout
+        self._pool = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(maxconn)
+        self._last_used = {}
+        self.stats = {
+            "checkouts": 0,
+            "in_use": 0,
+            "timeouts": 0,
+            "reconnects": 0,
+            "discarded": 0,
+            "wait_seconds_total": 0.0,
+            "wait_seconds_max": 0.0,
+        }
+
+    def _get_pool(self):
+        if self._pool is None or self._pid != os.getpid():
+            with self._lock:
+                if self._pool is None or self._pid != os.getpid():
+                    args, kwargs = db_connect_params()
+                    self._pool = psycopg2.pool.ThreadedConnectionPool(
+                        self.minconn, self.maxconn, *args, **kwargs)
+                    self._pid = os.getpid()
+                    self._slots = threading.BoundedSemaphore(self.maxconn)
+                    self._last_used = {}
+                    logger.info("Database pool created (min=%d, max=%d, pid=%d)",
+                                self.minconn, self.maxconn, self._pid)
+        return self._pool
+
+    def _is_healthy(self, conn):
+        if conn.closed:
+            return False
+        last_used = self._last_used.get(id(conn))
+        if last_used is not None and time.monotonic() - last_used < DB_HEALTHCHECK_IDLE:
+            return True
+        try:
+            with conn.cursor() as probe:
+                probe.execute("SELECT 1")
+            if not conn.autocommit:
+                # a new connection's probe opened a transaction; close it so getconn can set autocommit
+                conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def getconn(self):
+        pool = self._get_pool()
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.stats["timeouts"] += 1
+            raise PoolTimeout(f"No database connection available after {self.timeout}s")
+        waited = time.monotonic() - start
+        DEPENDENCY_LATENCY.observe(waited, "db", "pool_wait")
+        try:
+            conn = pool.getconn()
+            if not self._is_healthy(conn):
+                with self._lock:
+                    self.stats["reconnects"] += 1
+                pool.putconn(conn, close=True)
+                conn = pool.getconn()
+            conn.autocommit = True
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self.stats["checkouts"] += 1
+            self.stats["in_use"] += 1
+            self.stats["wait_seconds_total"] += waited
+            self.stats["wait_seconds_max"] = max(self.stats["wait_seconds_max"], waited)
+        return conn
+
+    def putconn(self, conn, discard=False):
+        try:
+            if discard or conn.closed:
+                with self._lock:
+                    self.stats["discarded"] += 1
+                self._last_used.pop(id(conn), None)
+                self._pool.putconn(conn, close=True)
+            else:
+                self._last_used[id(conn)] = time.monotonic()
+                self._pool.putconn(conn)
+        finally:
+            with self._lock:
+                self.stats["in_use"] -= 1
+            self._slots.release()
+
+    def status(self):
+        with self._lock:
+            stats = dict(self.stats)
+        checkouts = stats["checkouts"]
+        return dict(stats,
+                    min_size=self.minconn,
+                    max_size=self.maxconn,
+                    initialized=self._pool is not None and self._pid == os.getpid(),
+                    wait_seconds_avg=round(stats["wait_seconds_total"] / checkouts, 6) if checkouts else 0.0)
+
+db_pool = DatabasePool(DB_POOL_MIN, DB_POOL_MAX, DB_POOL_TIMEOUT)
+
+@contextmanager
+def db_cursor():
+    """Check out a pooled connection for the duration of a `with` block.
+
+    Connections run in autocommit mode; broken connections are dropped from
+    the pool instead of being handed to the next request.
+    """
+    conn = db_pool.getconn()
+    discard = False
+    start = time.perf_counter()
     try:
-        database_url = os.getenv("DATABASE_URL")
-        if database_url:
-            connection = psycopg2.connect(database_url, sslmode='require')
-        else:
-            connection = psycopg2.connect(
-                host=os.getenv("DB_HOST", "localhost"),
-                user=os.getenv("DB_USER", "postgres"),
-                password=os.getenv("DB_PASSWORD", ""),
-                database=os.getenv("DB_NAME", "postgres"),
-                port=int(os.getenv("DB_PORT", "5432")),
-                sslmode='require'
-            )
-        connection.autocommit = True
-        return connection
-    except psycopg2.Error as err:
-        print(f"Database connection error: {err}")
+        with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+            yield cur
+    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+        discard = True
+        raise
+    finally:
+        DEPENDENCY_LATENCY.observe(time.perf_counter() - start, "db", "query")
+        db_pool.putconn(conn, discard=discard)
+
+# ---------------- Result Write-Behind Queue ----------------
+# assessment results are buffered and bulk-inserted off the request path; set to 0 to insert inline
+ASYNC_RESULT_WRITES = os.getenv("ASYNC_RESULT_WRITES", "1") == "1"
+RESULT_FLUSH_SIZE = int(os.getenv("RESULT_FLUSH_SIZE", "50"))
+RESULT_FLUSH_INTERVAL = float(os.getenv("RESULT_FLUSH_INTERVAL", "2"))
+RESULT_FLUSH_RETRIES = int(os.getenv("RESULT_FLUSH_RETRIES", "3"))
+RESULT_SPILL_FILE = os.getenv("RESULT_SPILL_FILE", os.path.join("spill", "pending_results.ndjson"))
+
+RESULT_COLUMNS = {
+    "anxiety_results": ("user_name", "score", "result_text", "description", "lr_score",
+                        "bert_anomaly_score", "final_risk", "is_high_risk", "answers_json"),
+    "depression_results": ("user_name", "score", "result_text", "description", "lr_score",
+                           "bert_anomaly_score", "hybrid_risk_score", "risk_level", "is_high_risk",
+                           "answers_json"),
+    "personality_results": ("user_name", "extraversion", "agreeableness", "neuroticism", "openness",
+                            "conscientiousness", "hybrid_score", "risk_level", "lr_score", "bert_score",
+                            "is_high_risk", "answers_json"),
+    "wellbeing_results": ("user_name", "score", "result_text", "description", "lr_score", "bert_score",
+                          "hybrid_score", "risk_level", "is_high_risk", "answers_json"),
+}
+
+def insert_rows(table, rows):
+    """Insert many result rows with a single multi-row INSERT"""
+    columns = RESULT_COLUMNS[table]
+    with db_cursor() as cur:
+        psycopg2.extras.execute_values(
+            cur, f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s", rows, page_size=len(rows))
+
+class ResultWriter:
+    """Write-behind buffer for assessment result rows.
+
+    Rows are flushed in bulk when `flush_size` rows are pending or every
+    `interval` seconds. A table whose insert keeps failing after `retries`
+    attempts is appended to an NDJSON spill file, which is replayed after the
+    next successful flush, so a database outage never fails a submission.
+    Workers share the spill file; appends and replays hold an exclusive lock
+    on `<spill_file>.lock`, so one process replays a given row at a time.
+    """
+
+    def __init__(self, flush_size, interval, retries, spill_file):
+        self.flush_size = max(1, flush_size)
+        self.interval = interval
+        self.retries = max(1, retries)
+        self.spill_file = spill_file
+        self._buffer = []
+        self._cond = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._pid = None
+        self._next_replay = 0.0
+        self.stats = {"submitted": 0, "written": 0, "flushes": 0, "retries": 0, "spilled": 0, "replayed": 0}
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._cond:
+            if self._pid == os.getpid():
+                return
+            self._buffer = []
+            self._pid = os.getpid()
+            threading.Thread(target=self._run, name="result-writer", daemon=True).start()
+
+    def _count(self, name, amount=1):
+        with self._cond:
+            self.stats[name] += amount
+
+    def submit(self, table, row):
+        if table not in RESULT_COLUMNS:
+            raise ValueError(f"Unknown result table: {table}")
+        self._ensure_started()
+        with self._cond:
+            self._buffer.append((table, tuple(row)))
+            self.stats["submitted"] += 1
+            if len(self._buffer) >= self.flush_size:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: len(self._buffer) >= self.flush_size, timeout=self.interval)
+                batch, self._buffer = self._buffer, []
+            if batch:
+                self._write(batch)
+            elif self._spill_pending() and time.monotonic() >= self._next_replay:
+                self._replay_spill()
+
+    def flush(self):
+        """Synchronously write everything that is buffered (used at shutdown)"""
+        with self._cond:
+            batch, self._buffer = self._buffer, []
+        if batch:
+            self._write(batch)
+
+    def _write(self, batch):
+        grouped = OrderedDict()
+        for table, row in batch:
+            grouped.setdefault(table, []).append(row)
+        ok = True
+        for table, rows in grouped.items():
+            for attempt in range(self.retries):
+                try:
+                    insert_rows(table, rows)
+                    self._count("written", len(rows))
+                    break
+                except Exception as e:
+                    self._count("retries")
+                    logger.warning("Bulk insert into %s failed (attempt %d/%d): %s",
+                                   table, attempt + 1, self.retries, e)
+                    if attempt + 1 < self.retries:
+                        time.sleep(0.5 * 2 ** attempt)
+            else:
+                ok = False
+                self._spill(table, rows)
+        self._count("flushes")
+        if ok and self._spill_pending():
+            self._replay_spill()
+
+    def _spill_pending(self):
+        return os.path.exists(self.spill_file) or os.path.exists(self.spill_file + ".replaying")
+
+    @contextmanager
+    def _spill_locked(self, wait=True):
+        """Exclusive cross-process lock on the spill file; yields False if busy and wait=False.
+
+        Polls instead of blocking in flock so a gevent worker keeps serving while it waits.
+        """
+        with self._spill_lock:
+            os.makedirs(os.path.dirname(self.spill_file) or ".", exist_ok=True)
+            with open(self.spill_file + ".lock", "a") as lock:
+                while True:
+                    try:
+                        fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if not wait:
+                            yield False
+                            return
+                        time.sleep(0.05)
+                try:
+                    yield True
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _append_spill(self, table, rows):
+        with open(self.spill_file, "a") as f:
+            for row in rows:
+                f.write(json.dumps({"table": table, "row": list(row)}) + "\n")
+
+    def _spill(self, table, rows):
+        with self._spill_locked():
+            self._append_spill(table, rows)
+        self._count("spilled", len(rows))
+        logger.error("Spilled %d %s rows to %s", len(rows), table, self.spill_file)
+
+    def _replay_spill(self):
+        """Replay spilled rows; a `.replaying` file left by a crashed replay goes first"""
+        replaying = self.spill_file + ".replaying"
+        with self._spill_locked(wait=False) as locked:
+            if not locked:
+                return  # another worker is replaying
+            while True:
+                if not os.path.exists(replaying):
+                    try:
+                        os.replace(self.spill_file, replaying)
+                    except FileNotFoundError:
+                        return
+                grouped = OrderedDict()
+                with open(replaying) as f:
+                    for line in f:
+                        if line.strip():
+                            item = json.loads(line)
+                            grouped.setdefault(item["table"], []).append(tuple(item["row"]))
+                try:
+                    for table, rows in list(grouped.items()):
+                        insert_rows(table, rows)
+                        self._count("replayed", len(rows))
+                        del grouped[table]
+                except Exception as e:
+                    logger.warning("Spill replay failed, keeping rows for later: %s", e)
+                    self._next_replay = time.monotonic() + 30
+                    for table, rows in grouped.items():
+                        self._append_spill(table, rows)
+                    os.remove(replaying)
+                    return
+                os.remove(replaying)
+                logger.info("Replayed spilled results from %s", self.spill_file)
+
+    def status(self):
+        with self._cond:
+            pending = len(self._buffer)
+            stats = dict(self.stats)
+        return dict(stats,
+                    enabled=ASYNC_RESULT_WRITES,
+                    pending=pending,
+                    spill_file_exists=self._spill_pending())
+
+result_writer = ResultWriter(RESULT_FLUSH_SIZE, RESULT_FLUSH_INTERVAL, RESULT_FLUSH_RETRIES, RESULT_SPILL_FILE)
+atexit.register(result_writer.flush)
+
+def save_result(table, row):
+    """Persist one assessment result row, write-behind unless ASYNC_RESULT_WRITES=0"""
+    if ASYNC_RESULT_WRITES:
+        result_writer.submit(table, row)
+    else:
+        insert_rows(table, [tuple(row)])
+
+# ---------------- Helper Functions ----------------
+# "remote" sends texts to the HF Space; "local" runs the checkpoint in-process
+EMOTION_INFERENCE_MODE = os.getenv("EMOTION_INFERENCE_MODE", "remote").lower()
+# load the model at import time so `gunicorn --preload` shares the weights copy-on-write across workers
+PRELOAD_MODEL = os.getenv("PRELOAD_MODEL", "0") == "1"
+LOCAL_BATCH_SIZE = int(os.getenv("LOCAL_BATCH_SIZE", "16"))
+LOCAL_BATCH_WINDOW_MS = float(os.getenv("LOCAL_BATCH_WINDOW_MS", "5"))
+LOCAL_MAX_LENGTH = int(os.getenv("LOCAL_MAX_LENGTH", "128"))
+LOCAL_TORCH_THREADS = int(os.getenv("LOCAL_TORCH_THREADS", "0"))
+# long texts: overlapping max_length windows instead of truncation, aggregated per text
+LOCAL_LONG_TEXT = os.getenv("LOCAL_LONG_TEXT", "1") == "1"
+LOCAL_WINDOW_STRIDE = int(os.getenv("LOCAL_WINDOW_STRIDE", "32"))  # tokens shared by neighbouring windows
+LOCAL_MAX_WINDOWS = int(os.getenv("LOCAL_MAX_WINDOWS", "8"))  # per text, spread evenly when capped
+LOCAL_WINDOW_AGGREGATION = os.getenv("LOCAL_WINDOW_AGGREGATION", "attention").lower()  # max | mean | attention
+LOCAL_WINDOW_BATCH = int(os.getenv("LOCAL_WINDOW_BATCH", "64"))  # windows per forward pass
+# fp32 | int8 | onnx, see export_model.py
+EMOTION_MODEL_VARIANT = os.getenv("EMOTION_MODEL_VARIANT", "fp32").lower()
+INT8_CHECKPOINT_FILE = os.path.join(CHECKPOINT_DIR, "emotion_classifier_int8.pth")
+CHECKPOINT_SAFETENSORS_FILE = os.path.join(CHECKPOINT_DIR, "emotion_classifier.safetensors")
+CHECKPOINT_METADATA_FILE = os.path.join(CHECKPOINT_DIR, "emotion_classifier.json")
+ONNX_MODEL_FILE = os.path.join(CHECKPOINT_DIR, "emotion_classifier.onnx")
+
+def read_checkpoint_metadata():
+    try:
+        with open(CHECKPOINT_METADATA_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
         return None
 
-db = get_db_connection()
-cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if db else None
-
-def ensure_db_connection():
-    global db, cursor
-    if db is None or db.closed:
-        db = get_db_connection()
-        cursor = db.cursor(cursor_factory=psycopg2.extras.RealDictCursor) if db else None
-    return db, cursor
-
-# ---------------- Dataset & Model ----------------
-class EmotionDataset(Dataset):
-    def __init__(self, texts, labels):
-        self.texts = texts
-        self.labels = labels
-
-    def __len__(self):
-        return len(self.texts)
-
-    def __getitem__(self, idx):
-        encoding = get_tokenizer()(self.texts[idx], return_tensors='pt',
-                             truncation=True, padding='max_length', max_length=128)
-        input_ids = encoding['input_ids'].squeeze(0)
-        attention_mask = encoding['attention_mask'].squeeze(0)
+def checkpoint_weights_path(metadata):
+    """Weights file named by the sidecar. Promotions write a new, versioned weights
+    file first and the sidecar last, so the sidecar is the commit marker."""
+    return os.path.join(CHECKPOINT_DIR, metadata.get("weights") or os.path.basename(CHECKPOINT_SAFETENSORS_FILE))
+
+def safetensors_checkpoint_available():
+    metadata = read_checkpoint_metadata()
+    return metadata is not None and os.path.exists(checkpoint_weights_path(metadata))
+
+# ---------------- Serving / ML Profiles ----------------
+# Workers start in the serving profile: Flask, psycopg2, requests and numpy only.
+# torch, transformers, pandas and scikit-learn live in emotion_model.py and are
+# imported the first time local inference, /train or /checkpoint_status needs them.
+ml_import_seconds = None
+
+def ml_loaded():
+    return "emotion_model" in sys.modules
+
+def load_ml():
+    """Import the ML profile on first use and return the emotion_model module"""
+    global ml_import_seconds
+    if ml_loaded():
+        return sys.modules["emotion_model"]
+    start = time.perf_counter()
+    import emotion_model
+    if ml_import_seconds is None:
+        ml_import_seconds = round(time.perf_counter() - start, 3)
+        logger.info("ML profile loaded in %.2fs (RSS %s MB)", ml_import_seconds, process_memory()["rss_mb"])
+    return emotion_model
+
+def process_memory():
+    """Current (VmRSS) and peak resident set size of this process in MB"""
+    rss_mb = peak_mb = None
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    rss_mb = round(int(line.split()[1]) / 1024, 1)
+                elif line.startswith("VmHWM:"):
+                    peak_mb = round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return {"rss_mb": rss_mb, "peak_rss_mb": peak_mb}
+
+def offload(fn, *args, **kwargs):
+    """Run CPU-bound work (model forward passes) off the gevent hub in async mode.
+
+    torch and onnxruntime release the GIL, so a native thread keeps the other
+    in-flight requests moving while a batch is scored. Sync mode calls fn directly.
+    """
+    if SERVING_MODE != "async":
+        return fn(*args, **kwargs)
+    import gevent
+    return gevent.get_hub().threadpool.apply(fn, args, kwargs)
+
+def process_status():
+    return dict(process_memory(),
+                pid=os.getpid(),
+                serving_mode=SERVING_MODE,
+                profile="ml" if ml_loaded() else "serving",
+                startup_seconds=startup_seconds,
+                ml_import_seconds=ml_import_seconds,
+                uptime_seconds=round(time.perf_counter() - IMPORT_STARTED, 1))
+
+# ---------------- Admission Control ----------------
+ADMISSION_CONTROL = os.getenv("ADMISSION_CONTROL", "1") == "1"
+
+# lower number = served first; background work (bulk imports) never gets shed
+ADMISSION_PRIORITIES = {"clinical": 0, "standard": 1, "community": 2, "background": 3}
+
+def admission_limits(name, concurrency, queue_size, max_wait):
+    prefix = f"ADMISSION_{name.upper()}"
+    return (int(os.getenv(f"{prefix}_CONCURRENCY", concurrency)),
+            int(os.getenv(f"{prefix}_QUEUE", queue_size)),
+            float(os.getenv(f"{prefix}_MAX_WAIT", max_wait)))
+
+# concurrent requests, queued requests and max queue wait (s) per class
+ADMISSION_CLASS_LIMITS = {
+    "clinical": admission_limits("clinical", 64, 256, 10),
+    "standard": admission_limits("standard", 32, 64, 5),
+    "community": admission_limits("community", 16, 32, 1),
+}
+# calls into analyze_text/analyze_texts, shared by every class in priority order
+ANALYSIS_LIMITS = admission_limits("analysis", 16, 128, 5)
+
+# endpoint -> class; endpoints not listed (health, metrics, debug) are never queued or shed
+ROUTE_CLASSES = {
+    "gad7_risk": "clinical",
+    "phq9_risk": "clinical",
+    "bfi10_risk": "clinical",
+    "who5_risk": "clinical",
+    "score_batch_route": "clinical",
+    "user_history": "standard",
+    "dashboard_stats": "standard",
+    "upload_csv": "standard",
+    "upload_csv_status": "standard",
+    "train": "standard",
+    "cancel_training": "standard",
+    "get_training_status": "standard",
+    "get_posts": "community",
+    "create_post": "community",
+    "add_comment": "community",
+    "delete_post": "community",
+    "delete_comment": "community",
+    "analyze": "community",
+}
+
+class AdmissionRejected(Exception):
+    """Raised when a gate sheds a caller; rendered as 429 (queue full) or 503 (waited too long)"""
+
+    def __init__(self, gate, admission_class, reason, retry_after):
+        super().__init__(f"{gate} is saturated ({reason})")
+        self.gate = gate
+        self.admission_class = admission_class
+        self.reason = reason
+        self.status = 429 if reason in ("queue_full", "evicted") else 503
+        self.retry_after = retry_after
+
+class _Waiter:
+    __slots__ = ("event", "state", "bounded")
+
+    def __init__(self, bounded):
+        self.event = threading.Event()
+        self.state = "waiting"
+        self.bounded = bounded
+
+class PriorityGate:
+    """Concurrency limit with a bounded wait queue served in priority order.
+
+    A caller takes a free slot immediately; otherwise it waits, and released
+    slots are handed to the highest-priority (then oldest) waiter. When the
+    queue is full a higher-priority caller evicts the newest lowest-priority
+    waiter instead of being turned away, so clinical requests are only shed
+    once the queue holds nothing but clinical requests. Unbounded callers
+    (background work) wait outside the queue limit and are never evicted.
+    Retry-After is estimated from how long slots have recently been held.
+    """
+
+    def __init__(self, name, limit, max_queue, max_wait):
+        self.name = name
+        self.limit = max(1, limit)
+        self.max_queue = max(0, max_queue)
+        self.max_wait = max_wait
+        self._lock = threading.Lock()
+        self._active = 0
+        self._waiters = []  # heap of (priority, seq, admission class, waiter)
+        self._seq = itertools.count()
+        self._hold_seconds = 0.0
+        self.stats = {"admitted": 0, "queued": 0, "shed_queue_full": 0, "shed_evicted": 0, "shed_timeout": 0}
+
+    def retry_after(self):
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._hold_seconds * backlog / self.limit))
+
+    def _shed(self, admission_class, reason):
+        self.stats[f"shed_{reason}"] += 1
+        ADMISSION_SHED.inc(self.name, admission_class, reason)
+        return AdmissionRejected(self.name, admission_class, reason, self.retry_after())
+
+    def acquire(self, admission_class, bounded=True):
+        """Wait for a slot; returns a token for release(). bounded=False waits without queue or time limits."""
+        priority = ADMISSION_PRIORITIES[admission_class]
+        with self._lock:
+            if self._active < self.limit and not self._waiters:
+                self._active += 1
+                self.stats["admitted"] += 1
+                return time.monotonic()
+            # unbounded (background) waiters neither count towards the queue nor get evicted
+            sheddable = [entry for entry in self._waiters if entry[3].bounded]
+            if bounded and len(sheddable) >= self.max_queue:
+                victim = max(sheddable, default=None)
+                if victim is None or victim[0] <= priority:
+                    raise self._shed(admission_class, "queue_full")
+                self._waiters.remove(victim)
+                heapq.heapify(self._waiters)
+                victim[3].state = "evicted"
+                victim[3].event.set()
+            waiter = _Waiter(bounded)
+            heapq.heappush(self._waiters, (priority, next(self._seq), admission_class, waiter))
+            self.stats["queued"] += 1
+        waiter.event.wait(self.max_wait if bounded else None)
+        with self._lock:
+            if waiter.state == "granted":
+                self.stats["admitted"] += 1
+                return time.monotonic()
+            if waiter.state == "evicted":
+                raise self._shed(admission_class, "evicted")
+            self._waiters = [entry for entry in self._waiters if entry[3] is not waiter]
+            heapq.heapify(self._waiters)
+            raise self._shed(admission_class, "timeout")
+
+    def release(self, token):
+        with self._lock:
+            # EWMA of slot hold time, used for Retry-After
+            self._hold_seconds += 0.1 * (time.monotonic() - token - self._hold_seconds)
+            if self._waiters:
+                # hand the slot straight to the next waiter; _active is unchanged
+                waiter = heapq.heappop(self._waiters)[3]
+                waiter.state = "granted"
+                waiter.event.set()
+            else:
+                self._active -= 1
+
+    def status(self):
+        with self._lock:
+            return dict(self.stats,
+                        limit=self.limit,
+                        in_flight=self._active,
+                        queued_now=len(self._waiters),
+                        max_queue=self.max_queue,
+                        max_wait=self.max_wait,
+                        hold_seconds=round(self._hold_seconds, 4))
+
+route_gates = {name: PriorityGate(f"route_{name}", *limits) for name, limits in ADMISSION_CLASS_LIMITS.items()}
+analysis_gate = PriorityGate("analysis", *ANALYSIS_LIMITS)
+
+def admission_gates():
+    return list(route_gates.values()) + [analysis_gate]
+
+def admission_class():
+    """Class of the current request; work outside a request (bulk imports) is background"""
+    if not has_request_context():
+        return "background"
+    return g.get("admission_class") or "standard"
+
+@contextmanager
+def analysis_slot():
+    """Hold an analysis_gate slot around one analyze_text(s) call.
+
+    Yields False when a clinical caller could not get a slot: it should use the
+    lexicon instead, so an assessment is never refused here. Community callers
+    that cannot get one are shed with 429/503.
+    """
+    if not ADMISSION_CONTROL:
+        yield True
+        return
+    cls = admission_class()
+    try:
+        token = analysis_gate.acquire(cls, bounded=cls != "background")
+    except AdmissionRejected:
+        if cls != "clinical":
+            raise
+        yield False
+        return
+    try:
+        yield True
+    finally:
+        analysis_gate.release(token)
+
+# ---------------- Emotion Inference Client ----------------
+EMOTION_API_URL = os.getenv("EMOTION_API_URL", "https://jeffrey996-bert-space.hf.space/analyze")
+EMOTION_API_TIMEOUT = float(os.getenv("EMOTION_API_TIMEOUT", "15"))
+EMOTION_BATCH_SIZE = int(os.getenv("EMOTION_BATCH_SIZE", "16"))
+EMOTION_BATCH_WINDOW_MS = float(os.getenv("EMOTION_BATCH_WINDOW_MS", "10"))
+EMOTION_CACHE_SIZE = int(os.getenv("EMOTION_CACHE_SIZE", "2048"))
+EMOTION_CACHE_TTL = float(os.getenv("EMOTION_CACHE_TTL", "3600"))
+EMOTION_BREAKER_FAILURES = int(os.getenv("EMOTION_BREAKER_FAILURES", "5"))
+EMOTION_BREAKER_RESET = float(os.getenv("EMOTION_BREAKER_RESET", "30"))
+EMOTION_TIMEOUT_MIN = float(os.getenv("EMOTION_TIMEOUT_MIN", "2"))
+EMOTION_TIMEOUT_MULTIPLIER = float(os.getenv("EMOTION_TIMEOUT_MULTIPLIER", "3"))
+EMOTION_HEDGE = os.getenv("EMOTION_HEDGE", "0") == "1"
+# batches in flight to the Space at once; greenlets are cheap, so async mode allows many more
+EMOTION_CONCURRENCY = int(os.getenv("EMOTION_CONCURRENCY", "32" if SERVING_MODE == "async" else "4"))
+
+def normalize_text(text):
+    """Cache key for a text: the model is uncased, so case and spacing don't matter"""
+    return " ".join(text.lower().split())
+
+class TTLCache:
+    """Thread-safe bounded LRU cache whose entries expire after `ttl` seconds"""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is not None and item[1] > time.monotonic():
+                self._data.move_to_end(key)
+                self.hits += 1
+                return item[0]
+            if item is not None:
+                del self._data[key]
+            self.misses += 1
+            return None
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
         return {
-            'input_ids': input_ids,
-            'attention_mask': attention_mask,
-            'label': torch.tensor(self.labels[idx], dtype=torch.long)
+            "size": len(self._data),
+            "max_size": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
         }
 
-class EmotionClassifier(nn.Module):
-    def __init__(self, num_labels):
-        super(EmotionClassifier, self).__init__()
-        self.bert = AutoModel.from_pretrained(MODEL_NAME)
-        self.dropout = nn.Dropout(0.3)
-        self.classifier = nn.Linear(self.bert.config.hidden_size, num_labels)
-        self.anomaly_head = nn.Linear(self.bert.config.hidden_size, 1)
+class CircuitOpenError(RuntimeError):
+    """Raised without a network call while the breaker is open"""
 
-    def forward(self, input_ids, attention_mask, labels=None, anomaly=False):
-        outputs = self.bert(input_ids=input_ids, attention_mask=attention_mask)
-        cls_output = outputs.last_hidden_state[:, 0]
+class BatchNotSupported(RuntimeError):
+    """The Space rejected a {"texts": [...]} payload; it is up, it just wants one text per call"""
 
-        if anomaly:
-            score = torch.sigmoid(self.anomaly_head(self.dropout(cls_output)))
-            return {"anomaly_score": score}
+# statuses a single-text Space answers a batch payload with
+BATCH_REJECTED_STATUSES = (400, 404, 405, 413, 422)
 
-        logits = self.classifier(self.dropout(cls_output))
-        loss = F.cross_entropy(logits, labels) if labels is not None else None
-        return {"logits": logits, "loss": loss}
+class CircuitBreaker:
+    """Consecutive-failure circuit breaker.
 
-# ---------------- Helper Functions ----------------
-def load_model():
-    """DISABLED: Model loading moved to HF Spaces to prevent OOM"""
-    logger.info("Model loading disabled - using HF Space API instead")
-    return None
-
-# # using hf now
-# def load_model():
-#     global model
-#     if model is None:
-#         if not ensure_checkpoint_available():
-#             logger.error("Could not ensure checkpoint availability")
-#             return None
-#             
-#         if os.path.exists(CHECKPOINT_FILE):
-#             logger.info("Loading checkpoint from %s", CHECKPOINT_FILE)
-#             try:
-#                 # torch.load may raise in newer torch versions if weights-only; allow full load for trusted local file
-#                 checkpoint = torch.load(CHECKPOINT_FILE, map_location=device, weights_only=False)
-#             except TypeError:
-#                 # older torch versions don't accept weights_only
-#                 checkpoint = torch.load(CHECKPOINT_FILE, map_location=device)
-#             except Exception as e:
-#                 logger.exception("Error loading checkpoint: %s", e)
-#                 return None
-#                 
-#             try:
-#                 num_labels = checkpoint.get('num_labels', len(checkpoint['label_encoder_classes']))
-#                 model = EmotionClassifier(num_labels).to(device)
-#                 model.load_state_dict(checkpoint['model_state_dict'])
-#                 label_encoder.classes_ = checkpoint['label_encoder_classes']
-#                 logger.info("Checkpoint loaded successfully: num_labels=%s, device=%s", num_labels, device)
-#              #delete natin try 
-#                 del checkpoint
-#                 gc.collect()
-#                 
-#             except Exception as e:
-#                 logger.exception("Error initializing model from checkpoint: %s", e)
-#                 model = None
-#                 return None
-#         else:
-#             logger.error("Checkpoint file does not exist at %s after download attempt", CHECKPOINT_FILE)
-#             return None
-#     return model
+    After `failure_threshold` failures in a row the breaker opens and callers
+    are rejected immediately. Once `reset_timeout` seconds have passed it goes
+    half-open and lets a single probe through: success closes it, failure
+    opens it for another `reset_timeout`.
+    """
+
+    def __init__(self, failure_threshold, reset_timeout):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "rejected": 0, "probes": 0}
+
+    def allow(self):
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self.probing = False
+            if self.state == "half_open" and not self.probing:
+                self.probing = True
+                self.stats["probes"] += 1
+                return True
+            self.stats["rejected"] += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info("Emotion API recovered; circuit closed")
+            self.state = "closed"
+            self.failures = 0
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                logger.warning("Emotion API failing; circuit open for %.0fs", self.reset_timeout)
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.probing = False
+                self.stats["opened"] += 1
+
+    def status(self):
+        retry_in = self.reset_timeout - (time.monotonic() - self.opened_at) if self.state == "open" else 0.0
+        return dict(self.stats,
+                    state=self.state,
+                    consecutive_failures=self.failures,
+                    failure_threshold=self.failure_threshold,
+                    retry_in_seconds=round(max(0.0, retry_in), 1))
+
+class LatencyTracker:
+    """Rolling window of successful call latencies driving timeouts and hedging.
+
+    Until `min_samples` calls have succeeded the configured maximum timeout is
+    used; after that the timeout is `multiplier` x p99, kept within
+    [minimum, maximum]. Hedged requests fire after the p95 latency.
+    """
+
+    def __init__(self, minimum, maximum, multiplier, window=200, min_samples=20):
+        self.minimum = min(minimum, maximum)
+        self.maximum = maximum
+        self.multiplier = multiplier
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self._samples.append(seconds)
+
+    def percentile(self, q):
+        samples = list(self._samples)
+        if len(samples) < self.min_samples:
+            return None
+        return float(np.percentile(samples, q))
+
+    def timeout(self):
+        p99 = self.percentile(99)
+        if p99 is None:
+            return self.maximum
+        return min(self.maximum, max(self.minimum, p99 * self.multiplier))
+
+    def hedge_delay(self):
+        return self.percentile(95)
+
+    def status(self):
+        p50, p95, p99 = (self.percentile(q) for q in (50, 95, 99))
+        return {
+            "samples": len(self._samples),
+            "p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "p99_ms": round(p99 * 1000, 1) if p99 is not None else None,
+            "timeout_seconds": round(self.timeout(), 3),
+        }
+
+class EmotionServiceClient:
+    """Keep-alive, micro-batching, caching client for the HF Space /analyze API.
+
+    Concurrent callers enqueue their texts; a dispatcher thread collects up to
+    `batch_size` texts (waiting at most `window_ms` after the first) and sends
+    them as one {"texts": [...]} request. If the Space answers a batch with
+    something other than a list, batching is switched off and texts are sent
+    one per request over the same pooled session. Identical texts that are
+    in flight at the same time share one future.
+
+    Calls go through a circuit breaker, so while the Space is down texts fail
+    immediately and callers drop to the fallback. Per-request timeouts follow
+    the observed latency (the full `timeout` is kept for breaker probes, which
+    may hit a cold Space), and with `hedge` a single-text request still
+    unanswered after the p95 latency is sent a second time.
+    """
+
+    def __init__(self, url, timeout, batch_size, window_ms, cache, breaker, latency, hedge=False, concurrency=4):
+        self.url = url
+        self.timeout = timeout
+        self.batch_size = max(1, batch_size)
+        self.window = window_ms / 1000.0
+        self.cache = cache
+        self.breaker = breaker
+        self.latency = latency
+        self.hedge = hedge
+        self.concurrency = max(1, concurrency)
+        self.batch_supported = self.batch_size > 1
+        self._session = None
+        self._queue = None
+        self._executor = None
+        self._hedge_executor = None
+        self._pid = None
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "batched_requests": 0, "texts_sent": 0, "errors": 0, "coalesced": 0,
+                      "hedged": 0, "short_circuited": 0}
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(8, self.concurrency))
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            self._session = session
+            self._queue = queue.Queue()
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="emotion-batch")
+            self._hedge_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="emotion-hedge") if self.hedge else None
+            self._inflight = {}
+            self._pid = os.getpid()
+            threading.Thread(target=self._dispatch_loop, name="emotion-dispatcher", daemon=True).start()
+
+    def _count(self, name, amount=1):
+        # batch runners, hedges and request threads all update stats
+        with self._lock:
+            self.stats[name] += amount
+
+    def _dispatch_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._run_batch, batch)
+
+    def _request(self, payload, timeout, hedge):
+        post = lambda: self._session.post(self.url, json=payload, timeout=timeout)
+        delay = self.latency.hedge_delay() if hedge else None
+        if delay is None:
+            return post()
+        first = self._hedge_executor.submit(post)
+        try:
+            return first.result(timeout=delay)
+        except FutureTimeout:
+            pass
+        self._count("hedged")
+        error = None
+        for attempt in as_completed([first, self._hedge_executor.submit(post)]):
+            if attempt.exception() is None:
+                return attempt.result()
+            error = attempt.exception()
+        raise error
+
+    def _post(self, payload):
+        probe = self.breaker.state == "half_open"
+        timeout = self.timeout if probe else self.latency.timeout()
+        hedge = self.hedge and not probe and "text" in payload
+        self._count("requests")
+        start = time.perf_counter()
+        try:
+            with timed(DEPENDENCY_LATENCY, "emotion_api", "analyze_batch" if "texts" in payload else "analyze"):
+                response = self._request(payload, timeout, hedge)
+            if "texts" in payload and response.status_code in BATCH_REJECTED_STATUSES:
+                raise BatchNotSupported(f"HF Space API returned status {response.status_code} for a batch")
+            if response.status_code != 200:
+                raise RuntimeError(f"HF Space API returned status {response.status_code}")
+            result = response.json()
+        except BatchNotSupported:
+            # the Space answered, so this is not a breaker failure
+            self.breaker.record_success()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        self.latency.observe(time.perf_counter() - start)
+        return result
+
+    def _send(self, texts):
+        if len(texts) > 1 and self.batch_supported:
+            try:
+                result = self._post({"texts": texts})
+            except BatchNotSupported:
+                result = None
+            if isinstance(result, list) and len(result) == len(texts):
+                self._count("batched_requests")
+                self._count("texts_sent", len(texts))
+                return result
+            # retry the same texts one by one below
+            logger.info("Emotion API does not accept batches; sending texts individually")
+            self.batch_supported = False
+        results = []
+        for text in texts:
+            if self.breaker.state == "open":
+                results.append(CircuitOpenError("Emotion API circuit is open"))
+                continue
+            try:
+                results.append(self._post({"text": text}))
+                self._count("texts_sent")
+            except Exception as e:
+                self._count("errors")
+                results.append(e)
+        return results
+
+    def _run_batch(self, batch):
+        texts = [text for _, text, _ in batch]
+        try:
+            results = self._send(texts)
+        except Exception as e:
+            self._count("errors")
+            results = [e] * len(batch)
+        for (key, _, future), result in zip(batch, results):
+            with self._lock:
+                self._inflight.pop(key, None)
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                self.cache.set(key, result)
+                future.set_result(result)
+
+    def submit(self, text):
+        """Return a Future resolving to the raw API result for `text`"""
+        key = normalize_text(text)
+        cached = self.cache.get(key)
+        if cached is not None:
+            future = Future()
+            future.set_result(cached)
+            return future
+        if not self.breaker.allow():
+            self._count("short_circuited")
+            future = Future()
+            future.set_exception(CircuitOpenError("Emotion API circuit is open"))
+            return future
+        self._ensure_started()
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future
+            future = Future()
+            self._inflight[key] = future
+        self._queue.put((key, text, future))
+        return future
+
+    def analyze(self, text):
+        return self.submit(text).result(timeout=self.timeout + 1)
+
+    def analyze_many(self, texts):
+        """Analyze many texts; failed entries come back as None"""
+        futures = [self.submit(text) for text in texts]
+        results = []
+        for future in futures:
+            try:
+                results.append(future.result(timeout=self.timeout + 1))
+            except CircuitOpenError:
+                results.append(None)
+            except Exception as e:
+                logger.warning("Emotion API batch item failed: %s", e)
+                results.append(None)
+        return results
+
+    def status(self):
+        with self._lock:
+            stats = dict(self.stats)
+        return dict(stats,
+                    url=self.url,
+                    batch_size=self.batch_size,
+                    batch_supported=self.batch_supported,
+                    concurrency=self.concurrency,
+                    pending=self._queue.qsize() if self._queue is not None else 0,
+                    hedging=self.hedge,
+                    breaker=self.breaker.status(),
+                    latency=self.latency.status(),
+                    cache=self.cache.stats())
+
+emotion_client = EmotionServiceClient(
+    EMOTION_API_URL, EMOTION_API_TIMEOUT, EMOTION_BATCH_SIZE, EMOTION_BATCH_WINDOW_MS,
+    TTLCache(EMOTION_CACHE_SIZE, EMOTION_CACHE_TTL),
+    CircuitBreaker(EMOTION_BREAKER_FAILURES, EMOTION_BREAKER_RESET),
+    LatencyTracker(EMOTION_TIMEOUT_MIN, EMOTION_API_TIMEOUT, EMOTION_TIMEOUT_MULTIPLIER),
+    hedge=EMOTION_HEDGE, concurrency=EMOTION_CONCURRENCY)
+
+def format_emotion_result(result):
+    formatted = {
+        "label": result.get("label", "neutral"),
+        "is_negative": result.get("is_negative", False),
+        "confidence": result.get("confidence", 0.8),
+        "score": result.get("confidence", 0.8)
+    }
+    if result.get("anomaly_score") is not None:
+        formatted["anomaly_score"] = result["anomaly_score"]
+    return formatted
+
+EMOTION_LEXICON_FILE = os.getenv("EMOTION_LEXICON_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "emotion_lexicon.json"))
+emotion_lexicon = load_lexicon(EMOTION_LEXICON_FILE, logger)
+
+def keyword_emotion(text):
+    """Lexicon fallback used when the HF Space (or local model) is unavailable"""
+    return keyword_emotions([text])[0]
+
+def keyword_emotions(texts):
+    """Batch version of keyword_emotion"""
+    start = time.perf_counter()
+    EMOTION_FALLBACKS.inc(amount=len(texts))
+    results = emotion_lexicon.analyze_many(texts)
+    DEPENDENCY_LATENCY.observe(time.perf_counter() - start, "keyword_fallback", "analyze")
+    return results
 
 def analyze_text(text):
     """Analyze emotion using HF Space API or simple fallback"""
     if not text or not text.strip():
         return {"label": "neutral", "is_negative": False}
-    
+
+    with analysis_slot() as admitted:
+        if not admitted:
+            return keyword_emotion(text)
+        return model_emotion(text)
+
+def model_emotion(text):
+    """analyze_text without admission control: local model or HF Space, lexicon on failure"""
+    if EMOTION_INFERENCE_MODE == "local":
+        try:
+            return load_ml().local_engine.analyze(text)
+        except Exception as e:
+            logger.exception("Local inference failed, using the lexicon: %s", e)
+        return keyword_emotion(text)
+
     try:
-        hf_space_url = "https://jeffrey996-bert-space.hf.space/analyze"
-        response = requests.post(
-            hf_space_url,
-            json={"text": text},
-            timeout=15
-        )
-        
-        if response.status_code == 200:
-            result = response.json()
-            return {
-                "label": result.get("label", "neutral"),
-                "is_negative": result.get("is_negative", False),
-                "confidence": result.get("confidence", 0.8),
-                "score": result.get("confidence", 0.8)  
-            }
-        else:
-            print(f"HF Space API returned status {response.status_code}")
+        return format_emotion_result(emotion_client.analyze(text))
+    except CircuitOpenError:
+        pass
     except Exception as e:
-        print(f"HF Space API error: {e}")
-    
-    text_lower = text.lower()
-    
-    emotions = {
-        "joy": ["happy", "great", "awesome", "wonderful", "amazing", "excited", "love", "good", "best", "fantastic", "glad", "excellent", "perfect"],
-        "sadness": ["sad", "down", "depressed", "crying", "hurt", "broken", "lonely", "miss", "lost", "disappointed", "upset", "terrible"],
-        "anger": ["angry", "mad", "furious", "hate", "annoyed", "frustrated", "pissed", "rage", "irritated", "disgusted"],
-        "fear": ["scared", "afraid", "worried", "anxious", "nervous", "terrified", "panic", "frightened", "concerned"],
-        "surprise": ["wow", "surprised", "shocked", "incredible", "unbelievable", "amazing"],
-        "neutral": ["okay", "fine", "normal", "usual", "regular"]
-    }
-    
-    scores = {emotion: 0 for emotion in emotions}
-    for emotion, keywords in emotions.items():
-        for keyword in keywords:
-            if keyword in text_lower:
-                scores[emotion] += 1
+        logger.warning("HF Space API error, using the lexicon: %s", e)
     
-    max_emotion = max(scores, key=scores.get)
-    if scores[max_emotion] == 0:
-        max_emotion = "neutral"
-    
-    negative_emotions = ["sadness", "anger", "fear"]
-    is_negative = max_emotion in negative_emotions
-    
-    return {
-        "label": max_emotion,
-        "is_negative": is_negative,
-        "confidence": 0.7 if scores[max_emotion] > 0 else 0.5,
-        "score": 0.7 if scores[max_emotion] > 0 else 0.5  # For backward compatibility
-    }
+    return keyword_emotion(text)
 
-# ---------------- GAD-7 / Anxiety ----------------
-GAD7_WEIGHTS = np.array([0.5,0.7,0.6,0.4,0.6,0.5,0.8])
-GAD7_INTERCEPT = -5.857  # Adjusted for prob ≈ 0.5 at sum=10 (moderate cutoff)
+def analyze_texts(texts, embeddings=False):
+    """Batch version of analyze_text: one micro-batched round trip for many texts.
+
+    With embeddings=True local inference also returns each text's CLS embedding.
+    """
+    results = [{"label": "neutral", "is_negative": False}] * len(texts)
+    pending = [i for i, text in enumerate(texts) if text and text.strip()]
+    if not pending:
+        return results
+    with analysis_slot() as admitted:
+        if admitted:
+            analyzed = model_emotions([texts[i] for i in pending], embeddings=embeddings)
+        else:
+            analyzed = keyword_emotions([texts[i] for i in pending])
+    for i, result in zip(pending, analyzed):
+        results[i] = result
+    return results
+
+def model_emotions(texts, embeddings=False):
+    """Batch version of model_emotion for non-empty texts"""
+    if EMOTION_INFERENCE_MODE == "local":
+        try:
+            return load_ml().local_engine.analyze_many(texts, embeddings=embeddings)
+        except Exception as e:
+            logger.exception("Local inference failed, using the lexicon: %s", e)
+            return keyword_emotions(texts)
+    results = emotion_client.analyze_many(texts)
+    failed = [i for i, result in enumerate(results) if result is None]
+    results = [format_emotion_result(result) if result is not None else None for result in results]
+    for i, result in zip(failed, keyword_emotions([texts[i] for i in failed])):
+        results[i] = result
+    return results
+
+def emotion_anomaly_score(emotion_result):
+    """The anomaly score used by the hybrid risk.
+
+    Local inference reports the anomaly head's score from the same forward pass
+    as the label; results without one (remote Space, lexicon fallback) are
+    mapped from is_negative/confidence as before.
+    """
+    if emotion_result.get("anomaly_score") is not None:
+        return float(emotion_result["anomaly_score"])
+    if emotion_result.get("is_negative", False):
+        return emotion_result.get("confidence", 0.5)
+    return 0.1
 
+# ---------------- GAD-7 / Anxiety ----------------
 @app.route('/gad7_risk', methods=['POST'])
 def gad7_risk():
     data = request.get_json()
@@ -341,20 +1539,17 @@ def gad7_risk():
 
     probability = data.get("lr_score")
     if not probability and answers:
-        features = np.array(answers)
-        logit = np.dot(features, GAD7_WEIGHTS) + GAD7_INTERCEPT
-        probability = 1/(1+np.exp(-logit))
+        try:
+            probability = score_one("gad7", answers)
+        except ScoringError as e:
+            return jsonify({"error": str(e)}), 400
 
     anomaly_score = 0.0
     if text:
         try:
-            emotion_result = analyze_text(text)
-            if emotion_result.get("is_negative", False):
-                anomaly_score = emotion_result.get("confidence", 0.5)
-            else:
-                anomaly_score = 0.1  # Low anomaly for positive emotions
+            anomaly_score = emotion_anomaly_score(analyze_text(text))
         except Exception as e:
-            print(f"Error analyzing text for GAD-7: {e}")
+            logger.warning("Error analyzing text for GAD-7: %s", e)
             anomaly_score = 0.0
 
     hybrid_score = (probability + anomaly_score)/2
@@ -362,25 +1557,19 @@ def gad7_risk():
 
     # non-blck
     try:
-        db_conn, cursor_conn = ensure_db_connection()
-        if db_conn and cursor_conn:
-            cursor_conn.execute("""
-                INSERT INTO anxiety_results (user_name, score, result_text, description, lr_score, bert_anomaly_score, final_risk, is_high_risk, answers_json)
-                VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s)
-            """, (
-                user_name,
-                int(sum(answers)) if answers else 0,
-                risk_level,
-                "Hybrid GAD-7 + BERT analysis",
-                round(probability,4),
-                round(anomaly_score,4),
-                risk_level,
-                risk_level=="High",
-                json.dumps(answers)
-            ))
-            db_conn.commit()
+        save_result("anxiety_results", (
+            user_name,
+            int(sum(answers)) if answers else 0,
+            risk_level,
+            "Hybrid GAD-7 + BERT analysis",
+            round(probability,4),
+            round(anomaly_score,4),
+            risk_level,
+            risk_level=="High",
+            json.dumps(answers)
+        ))
     except Exception as e:
-        print(f"Database error in GAD-7: {e}")
+        logger.exception("Database error in GAD-7: %s", e)
 
     return jsonify({
         "lr_score": round(probability,4),
@@ -390,9 +1579,6 @@ def gad7_risk():
     })
 
 # ---------------- PHQ-9 / Depression ----------------
-PHQ9_WEIGHTS = np.array([0.12, 0.15, 0.1, 0.12, 0.1, 0.15, 0.12, 0.1, 0.14])
-PHQ9_INTERCEPT = -5.555  # Adjusted for prob ≈ 0.5 at sum=10 (moderate cutoff)
-
 @app.route('/phq9_risk', methods=['POST'])
 def phq9_risk():
     data = request.get_json()
@@ -403,51 +1589,40 @@ def phq9_risk():
     if not answers or len(answers)!=9:
         return jsonify({"error":"Answers must be a list of 9 numbers"}),400
     
-    features = np.array(answers)
-
-    logit = np.dot(features, PHQ9_WEIGHTS) + PHQ9_INTERCEPT
-    probability = 1/(1+np.exp(-logit))
+    try:
+        probability = score_one("phq9", answers)
+    except ScoringError as e:
+        return jsonify({"error": str(e)}), 400
 
     anomaly_score = 0.0
 
     if text:
 
         try:
-            emotion_result = analyze_text(text)
-
-            if emotion_result.get("is_negative", False):
-                anomaly_score = emotion_result.get("confidence", 0.5)
-            else:
-                anomaly_score = 0.1  # Low anomaly for positive emotions
+            anomaly_score = emotion_anomaly_score(analyze_text(text))
         except Exception as e:
-            print(f"Error analyzing text for PHQ-9: {e}")
+            logger.warning("Error analyzing text for PHQ-9: %s", e)
             anomaly_score = 0.0
 
     hybrid_score = (probability+anomaly_score)/2
     risk_level = "High" if hybrid_score >= 0.5 else "Low"  # Now based on hybrid for consistency
     is_high_risk = risk_level == "High"
 
-    cursor.execute("""
-    INSERT INTO depression_results (
-        user_name, score, result_text, description, 
-        lr_score, bert_anomaly_score, hybrid_risk_score, 
-        risk_level, is_high_risk, answers_json
-    )
-    VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-""", (
-    user_name,
-    int(sum(answers)),
-    risk_level,
-    "PHQ-9 Depression + BERT analysis",
-    round(probability,4),
-    round(anomaly_score,4),
-    round(hybrid_score,4),
-    risk_level,
-    is_high_risk,
-    json.dumps(answers)
-))
-
-    db.commit()
+    try:
+        save_result("depression_results", (
+            user_name,
+            int(sum(answers)),
+            risk_level,
+            "PHQ-9 Depression + BERT analysis",
+            round(probability,4),
+            round(anomaly_score,4),
+            round(hybrid_score,4),
+            risk_level,
+            is_high_risk,
+            json.dumps(answers)
+        ))
+    except Exception as e:
+        logger.exception("Database error in PHQ-9: %s", e)
 
     return jsonify({
         "lr_score": round(probability,4),
@@ -476,13 +1651,9 @@ def bfi10_risk():
     bert_anomaly_score = 0.0
     if text:
         try:
-            emotion_result = analyze_text(text)
-            if emotion_result.get("is_negative", False):
-                bert_anomaly_score = emotion_result.get("confidence", 0.5)
-            else:
-                bert_anomaly_score = 0.1  
+            bert_anomaly_score = emotion_anomaly_score(analyze_text(text))
         except Exception as e:
-            print(f"Error analyzing text for BFI-10: {e}")
+            logger.warning("Error analyzing text for BFI-10: %s", e)
             bert_anomaly_score = 0.0
 
     if lr_score is None:
@@ -491,17 +1662,14 @@ def bfi10_risk():
     risk_level = "High" if hybrid_score >= 0.5 else "Low"
     is_high_risk = risk_level == "High"
 
-    cursor.execute("""
-        INSERT INTO personality_results (
+    try:
+        save_result("personality_results", (
             user_name, extraversion, agreeableness, neuroticism, openness, conscientiousness,
-            hybrid_score, risk_level, lr_score, bert_score, is_high_risk, answers_json
-        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-    """, (
-        user_name, extraversion, agreeableness, neuroticism, openness, conscientiousness,
-        round(hybrid_score, 4), risk_level, round(lr_score, 4), round(bert_anomaly_score, 4),
-        is_high_risk, json.dumps(answers)
-    ))
-    db.commit()
+            round(hybrid_score, 4), risk_level, round(lr_score, 4), round(bert_anomaly_score, 4),
+            is_high_risk, json.dumps(answers)
+        ))
+    except Exception as e:
+        logger.exception("Database error in BFI-10: %s", e)
 
     return jsonify({
         "extraversion": extraversion,
@@ -517,9 +1685,6 @@ def bfi10_risk():
     })
 
 # ---------------- WHO-5 Well-Being ----------------
-WHO5_WEIGHTS = np.array([0.6, 0.7, 0.5, 0.8, 0.6])
-WHO5_INTERCEPT = -1.2
-
 @app.route('/who5_risk', methods=['POST'])
 def who5_risk():
     data = request.get_json()
@@ -530,39 +1695,32 @@ def who5_risk():
     description = data.get("description", "")
 
     answers_list = list(answers.values()) if isinstance(answers, dict) else answers
-    features = np.array([int(a) if isinstance(a, (int, float)) else 0 for a in answers_list])
-    logit = np.dot(features, WHO5_WEIGHTS) + WHO5_INTERCEPT
-    lr_score = 1 / (1 + np.exp(-logit))
+    try:
+        lr_score = score_one("who5", answers)
+    except ScoringError as e:
+        return jsonify({"error": str(e)}), 400
 
     bert_score = 0.0
     text = data.get("text", " ".join(map(str, answers_list)))
     if text:
         try:
-            emotion_result = analyze_text(text)
-            if emotion_result.get("is_negative", False):
-                bert_score = emotion_result.get("confidence", 0.5)
-            else:
-                bert_score = 0.1
+            bert_score = emotion_anomaly_score(analyze_text(text))
         except Exception as e:
-            print(f"Error analyzing text for WHO-5: {e}")
+            logger.warning("Error analyzing text for WHO-5: %s", e)
             bert_score = 0.0
 
     hybrid_score = (lr_score + bert_score) / 2
     risk_level = "High" if hybrid_score >= 0.5 else "Low"
     is_high_risk = risk_level == "High"
 
-    cursor.execute("""
-        INSERT INTO wellbeing_results (
+    try:
+        save_result("wellbeing_results", (
             user_name, score, result_text, description,
-            lr_score, bert_score, hybrid_score,
-            risk_level, is_high_risk, answers_json
-        ) VALUES (%s,%s,%s,%s,%s,%s,%s,%s,%s,%s)
-    """, (
-        user_name, score, result_text, description,
-        round(lr_score, 4), round(bert_score, 4), round(hybrid_score, 4),
-        risk_level, is_high_risk, json.dumps(answers)
-    ))
-    db.commit()
+            round(lr_score, 4), round(bert_score, 4), round(hybrid_score, 4),
+            risk_level, is_high_risk, json.dumps(answers)
+        ))
+    except Exception as e:
+        logger.exception("Database error in WHO-5: %s", e)
 
     return jsonify({
         "score": score,
@@ -573,15 +1731,527 @@ def who5_risk():
         "is_high_risk": is_high_risk
     })
 
+# ---------------- Feed Cache ----------------
+# memory (per worker) | redis (shared across workers, needs the redis package and FEED_CACHE_URL)
+FEED_CACHE_BACKEND = os.getenv("FEED_CACHE_BACKEND", "memory").lower()
+FEED_CACHE_URL = os.getenv("FEED_CACHE_URL", "")
+FEED_CACHE_SIZE = int(os.getenv("FEED_CACHE_SIZE", "512"))
+FEED_CACHE_TTL = float(os.getenv("FEED_CACHE_TTL", "60"))
+
+class MemoryFeedBackend:
+    name = "memory"
+
+    def __init__(self, maxsize, ttl):
+        self.entries = TTLCache(maxsize, ttl)
+        self.generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, entry):
+        self.entries.set(key, entry)
+
+    def generation(self, space):
+        return self.generations.get(space, 0)
+
+    def bump(self, space):
+        with self._lock:
+            self.generations[space] = self.generations.get(space, 0) + 1
+
+    def size(self):
+        return self.entries.stats()["size"]
+
+class RedisFeedBackend:
+    name = "redis"
+
+    def __init__(self, url, ttl):
+        import redis
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+
+    def get(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value is not None else None
+
+    def set(self, key, entry):
+        # feed-keys indexes live pages by expiry time, so size() needs no KEYS/SCAN
+        with self.client.pipeline() as pipe:
+            pipe.setex(key, self.ttl, json.dumps(entry))
+            pipe.zadd("feed-keys", {key: time.time() + self.ttl})
+            pipe.execute()
+
+    def generation(self, space):
+        value = self.client.get(f"feed-gen:{space}")
+        return int(value) if value is not None else 0
+
+    def bump(self, space):
+        self.client.incr(f"feed-gen:{space}")
+
+    def size(self):
+        with self.client.pipeline() as pipe:
+            pipe.zremrangebyscore("feed-keys", "-inf", time.time())
+            pipe.zcard("feed-keys")
+            return pipe.execute()[1]
+
+class FeedCache:
+    """Read-through cache of serialized feed pages.
+
+    Keys embed a per-space generation number. Every write to a space bumps
+    its generation, so all cached pages of that space (and only that space)
+    become unreachable at once and age out of the backend on their own.
+    Writes only invalidate: cached pages are never patched in place, the next
+    read of the space rebuilds its first page with one query.
+    """
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "invalidations": 0, "errors": 0,
+                      "served_age_seconds_total": 0.0, "served_age_seconds_max": 0.0}
+
+    def _count(self, name, amount=1):
+        with self._lock:
+            self.stats[name] += amount
+
+    def key(self, space, *page):
+        return "feed:{}:{}:{}".format(space, self.backend.generation(space), ":".join(map(str, page)))
+
+    def get(self, key):
+        try:
+            entry = self.backend.get(key)
+        except Exception as e:
+            self._count("errors")
+            logger.warning("Feed cache read failed: %s", e)
+            return None
+        if entry is None:
+            self._count("misses")
+            return None
+        age = time.time() - entry["cached_at"]
+        with self._lock:
+            self.stats["hits"] += 1
+            self.stats["served_age_seconds_total"] += age
+            self.stats["served_age_seconds_max"] = max(self.stats["served_age_seconds_max"], age)
+        return entry
+
+    def set(self, key, body, next_cursor):
+        try:
+            self.backend.set(key, {"body": body, "next_cursor": next_cursor, "cached_at": time.time()})
+        except Exception as e:
+            self._count("errors")
+            logger.warning("Feed cache write failed: %s", e)
+
+    def invalidate(self, space):
+        if space is None:
+            return
+        try:
+            self.backend.bump(space)
+            self._count("invalidations")
+        except Exception as e:
+            self._count("errors")
+            logger.warning("Feed cache invalidation failed for %s: %s", space, e)
+
+    def size(self):
+        """Cached pages in the backend (None if the backend cannot be reached)"""
+        try:
+            return self.backend.size()
+        except Exception as e:
+            self._count("errors")
+            logger.warning("Feed cache size unavailable: %s", e)
+            return None
+
+    def status(self):
+        with self._lock:
+            stats = dict(self.stats)
+        hits, misses = stats["hits"], stats["misses"]
+        return dict(stats,
+                    backend=self.backend.name,
+                    size=self.size(),
+                    ttl_seconds=FEED_CACHE_TTL,
+                    hit_ratio=round(hits / (hits + misses), 4) if hits + misses else 0.0,
+                    served_age_seconds_avg=round(stats["served_age_seconds_total"] / hits, 3) if hits else 0.0)
+
+def create_feed_backend():
+    if FEED_CACHE_BACKEND == "redis" and FEED_CACHE_URL:
+        try:
+            return RedisFeedBackend(FEED_CACHE_URL, FEED_CACHE_TTL)
+        except Exception as e:
+            logger.warning("Redis feed cache unavailable, using in-process cache: %s", e)
+    return MemoryFeedBackend(FEED_CACHE_SIZE, FEED_CACHE_TTL)
+
+feed_cache = FeedCache(create_feed_backend())
+
+# ---------------- Batch Scoring ----------------
+SCORE_BATCH_MAX = int(os.getenv("SCORE_BATCH_MAX", "10000"))
+
+@app.route('/score/batch', methods=['POST'])
+def score_batch_route():
+    """Score many GAD-7 / PHQ-9 / WHO-5 submissions with one vectorized call.
+
+    Body: {"instrument": "gad7" | "phq9" | "who5", "submissions": [[...], ...]}
+    Only the logistic model is evaluated; nothing is stored.
+    """
+    data = request.get_json(silent=True) or {}
+    instrument = str(data.get("instrument", "")).lower()
+    submissions = data.get("submissions")
+    if not isinstance(submissions, list) or not submissions:
+        return jsonify({"error": "submissions must be a non-empty list"}), 400
+    if len(submissions) > SCORE_BATCH_MAX:
+        return jsonify({"error": f"At most {SCORE_BATCH_MAX} submissions per request"}), 400
+    try:
+        lr_scores, totals = score_batch(instrument, submissions)
+    except ScoringError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({
+        "instrument": instrument,
+        "count": len(submissions),
+        "lr_scores": np.round(lr_scores, 4).tolist(),
+        "totals": totals.astype(int).tolist()
+    })
+
+# ---------------- Bulk Import ----------------
+IMPORT_BATCH_ROWS = int(os.getenv("IMPORT_BATCH_ROWS", "1000"))
+IMPORT_DIR = os.getenv("IMPORT_DIR", os.path.join(tempfile.gettempdir(), "mental-health-imports"))
+
+IMPORT_KINDS = {
+    # kind: (table, number of answer items, description stored with the row)
+    "gad7": ("anxiety_results", 7, "Hybrid GAD-7 + BERT analysis"),
+    "phq9": ("depression_results", 9, "PHQ-9 Depression + BERT analysis"),
+    "who5": ("wellbeing_results", 5, ""),
+    "post": ("posts", 0, None),
+}
+# the posts.space CHECK constraint in supabase_setup.sql
+POST_SPACES = frozenset({
+    "Community Support", "Suggested Actions", "About Developers", "About System",
+    "Admin Dashboard", "User Reports", "System Notifications", "Admin Actions",
+})
+
+import_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="bulk-import")
+
+# job state lives next to the uploads, so any gunicorn worker can answer a status poll
+def import_job_path(job_id):
+    return os.path.join(IMPORT_DIR, f"{job_id}.status.json")
+
+def read_import_job(job_id):
+    try:
+        with open(import_job_path(job_id)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_import_job(job):
+    write_json_atomic(import_job_path(job["id"]), job)
+
+def copy_value(value):
+    """Encode one value for COPY ... FROM STDIN (text format)"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (str(value).replace("\\", "\\\\").replace("\t", "\\t")
+            .replace("\n", "\\n").replace("\r", "\\r"))
+
+def copy_rows(table, columns, rows):
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write("\t".join(copy_value(v) for v in row) + "\n")
+    buffer.seek(0)
+    with db_cursor() as cur:
+        cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+def read_import_records(path, fmt):
+    """Yield one dict per CSV row / NDJSON line without loading the file"""
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        if fmt == "ndjson":
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(f)
+
+def parse_number(value):
+    number = float(value)
+    return int(number) if number.is_integer() else number
+
+def record_answers(record, items):
+    """Answers come as an `answers` JSON list/object or as q1..qN columns.
+
+    Unlike the live routes, an import never scores a missing or non-numeric
+    answer as 0: such rows are rejected and reported in the job's errors.
+    """
+    answers = record.get("answers")
+    if isinstance(answers, str) and answers.strip():
+        answers = json.loads(answers)
+    if answers is None or answers == "":
+        answers = [record.get(f"q{i}") for i in range(1, items + 1)]
+    if isinstance(answers, dict):
+        answers = list(answers.values())
+    if not isinstance(answers, list) or len(answers) != items:
+        raise ValueError(f"answers must be a list of {items} numbers")
+    answers = [parse_number(a) if isinstance(a, str) and a.strip() else a for a in answers]
+    if not all(isinstance(a, (int, float)) and not isinstance(a, bool) for a in answers):
+        raise ValueError(f"answers must be a list of {items} numbers")
+    return answers
+
+def record_created_at(record, default):
+    """created_at of an import row, normalized so one bad value cannot fail a whole COPY"""
+    value = str(record.get("created_at") or "").strip()
+    if not value:
+        return default
+    try:
+        return datetime.fromisoformat(value.replace("Z", "+00:00")).isoformat()
+    except ValueError:
+        raise ValueError(f"created_at is not an ISO-8601 timestamp: {value[:40]!r}") from None
+
+def import_assessments(kind, records, job):
+    table, items, description = IMPORT_KINDS[kind]
+    now = datetime.now(timezone.utc).isoformat()
+    answers, valid, created, scores = [], [], [], []
+    for record in records:
+        # everything COPY could reject is checked here, so a bad row fails alone
+        try:
+            row_answers = record_answers(record, items)
+            created_at = record_created_at(record, now)
+            score = record.get("score") if kind == "who5" else None
+            if score is not None and str(score).strip():
+                score = parse_number(score)
+                if not float(score).is_integer():
+                    raise ValueError(f"score must be a whole number: {score!r}")
+                score = int(score)
+            else:
+                score = None
+        except (ValueError, TypeError) as e:
+            job["rows_failed"] += 1
+            job["errors"].append(f"{kind}: {e}")
+            continue
+        answers.append(row_answers)
+        created.append(created_at)
+        scores.append(score)
+        valid.append(record)
+    if not valid:
+        return
+    # record_answers has validated every row, so the batch scores in one call
+    lr_scores, totals = score_batch(kind, answers)
+
+    texts = [str(record.get("text") or "") for record in valid]
+    emotions = analyze_texts(texts)
+    rows = []
+    for record, row_answers, lr, total, text, emotion, created_at, score in zip(
+            valid, answers, lr_scores, totals, texts, emotions, created, scores):
+        anomaly = emotion_anomaly_score(emotion) if text.strip() else 0.0
+        hybrid = (float(lr) + anomaly) / 2
+        risk_level = "High" if hybrid >= 0.5 else "Low"
+        user_name = record.get("user_name") or "Anonymous"
+        if kind == "gad7":
+            row = (user_name, int(total), risk_level, description, round(float(lr), 4), round(anomaly, 4),
+                   risk_level, risk_level == "High", json.dumps(row_answers))
+        elif kind == "phq9":
+            row = (user_name, int(total), risk_level, description, round(float(lr), 4), round(anomaly, 4),
+                   round(hybrid, 4), risk_level, risk_level == "High", json.dumps(row_answers))
+        else:
+            row = (user_name, int(total) if score is None else score, record.get("result_text") or risk_level,
+                   record.get("description") or description, round(float(lr), 4), round(anomaly, 4),
+                   round(hybrid, 4), risk_level, risk_level == "High", json.dumps(row_answers))
+        rows.append(row + (created_at,))
+    copy_rows(table, RESULT_COLUMNS[table] + ("created_at",), rows)
+    job["rows_written"] += len(rows)
+    job["tables"][table] = job["tables"].get(table, 0) + len(rows)
+
+def import_posts(records, job):
+    now = datetime.now(timezone.utc).isoformat()
+    valid, created, spaces = [], [], []
+    for record in records:
+        try:
+            if not str(record.get("text") or "").strip():
+                raise ValueError("empty text")
+            space = str(record.get("space") or "Community Support")
+            if space not in POST_SPACES:
+                raise ValueError(f"unknown space: {space[:50]!r}")
+            created.append(record_created_at(record, now))
+        except ValueError as e:
+            job["rows_failed"] += 1
+            job["errors"].append(f"post: {e}")
+            continue
+        spaces.append(space)
+        valid.append(record)
+    if not valid:
+        return
+    emotions = analyze_texts([str(record["text"]) for record in valid])
+    rows = [(record.get("user_name") or "Anonymous", space,
+             str(record["text"]), emotion.get("label", "neutral"), created_at)
+            for record, space, emotion, created_at in zip(valid, spaces, emotions, created)]
+    copy_rows("posts", ("user_name", "space", "text", "emotion", "created_at"), rows)
+    for space in {row[1] for row in rows}:
+        feed_cache.invalidate(space)
+    job["rows_written"] += len(rows)
+    job["tables"]["posts"] = job["tables"].get("posts", 0) + len(rows)
+
+def flush_import_batch(batch, job):
+    grouped = OrderedDict()
+    for record in batch:
+        kind = str(record.get("instrument") or record.get("kind") or job["default_kind"] or "").lower()
+        if kind not in IMPORT_KINDS:
+            job["rows_failed"] += 1
+            job["errors"].append(f"Unknown row kind: {kind or '(missing)'}")
+            continue
+        grouped.setdefault(kind, []).append(record)
+    for kind, records in grouped.items():
+        failed_before = job["rows_failed"]
+        try:
+            if kind == "post":
+                import_posts(records, job)
+            else:
+                import_assessments(kind, records, job)
+        except Exception as e:
+            logger.exception("Bulk import batch failed for %s", kind)
+            # nothing from the chunk was written; rows rejected during validation are already counted
+            job["rows_failed"] = failed_before + len(records)
+            job["errors"].append(f"{kind}: {e}")
+    del job["errors"][20:]
+
+def run_import_job(job, path):
+    job.update(status="running", started_at=time.time(), pid=os.getpid())
+    write_import_job(job)
+    try:
+        batch = []
+        for record in read_import_records(path, job["format"]):
+            batch.append(record)
+            job["rows_read"] += 1
+            if len(batch) >= IMPORT_BATCH_ROWS:
+                flush_import_batch(batch, job)
+                write_import_job(job)
+                batch = []
+        if batch:
+            flush_import_batch(batch, job)
+        job["status"] = "completed"
+    except Exception as e:
+        logger.exception("Bulk import %s failed", job["id"])
+        job.update(status="error", error=str(e))
+    finally:
+        job["finished_at"] = time.time()
+        write_import_job(job)
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+@app.route('/upload_csv', methods=['POST'])
+def upload_csv():
+    """Queue a CSV or NDJSON import of historical results and community posts.
+
+    Each row names its kind in an `instrument` (or `kind`) column: gad7, phq9,
+    who5 or post; the form field `kind` sets a default for files of one kind.
+    Assessment rows carry `answers` (JSON list) or q1..qN columns and optional
+    user_name, text and created_at; post rows carry space, text and user_name.
+    """
+    upload = request.files.get("file")
+    if upload is None or not upload.filename:
+        return jsonify({"error": "A file is required"}), 400
+    fmt = "ndjson" if upload.filename.lower().endswith((".ndjson", ".jsonl")) else "csv"
+
+    job_id = uuid.uuid4().hex
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_DIR, f"{job_id}.{fmt}")
+    upload.save(path)
+
+    job = {
+        "id": job_id,
+        "status": "queued",
+        "filename": upload.filename,
+        "format": fmt,
+        "default_kind": request.form.get("kind"),
+        "size_bytes": os.path.getsize(path),
+        "rows_read": 0,
+        "rows_written": 0,
+        "rows_failed": 0,
+        "tables": {},
+        "errors": [],
+        "created_at": time.time(),
+    }
+    write_import_job(job)
+    import_executor.submit(run_import_job, job, path)
+    return jsonify({
+        "job_id": job_id,
+        "status_url": f"/upload_csv/{job_id}",
+        "message": f"Import of {upload.filename} queued (job {job_id})"
+    }), 202
+
+@app.route('/upload_csv/<job_id>', methods=['GET'])
+def upload_csv_status(job_id):
+    job = read_import_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown import job"}), 404
+    status = dict(job)
+    end = job.get("finished_at") or time.time()
+    if job.get("started_at"):
+        status["elapsed_seconds"] = round(end - job["started_at"], 2)
+    return jsonify(status)
+
 # ---------------- Posts & Comments ----------------
+POSTS_PAGE_DEFAULT = int(os.getenv("POSTS_PAGE_DEFAULT", "50"))
+POSTS_PAGE_MAX = int(os.getenv("POSTS_PAGE_MAX", "200"))
+
+def parse_post_cursor(value):
+    """Parse a keyset cursor of the form "<created_at ISO>,<post id>" """
+    created_at, post_id = value.rsplit(",", 1)
+    return created_at, int(post_id)
+
 @app.route('/posts/<space>', methods=['GET'])
 def get_posts(space):
-    cursor.execute("SELECT * FROM posts WHERE space=%s ORDER BY created_at DESC",(space,))
-    posts = cursor.fetchall()
-    for post in posts:
-        cursor.execute("SELECT * FROM comments WHERE post_id=%s ORDER BY created_at ASC",(post['id'],))
-        post['comments'] = cursor.fetchall()
-    return jsonify(posts)
+    """One page of a space's feed, newest first, with comments aggregated in the same query.
+
+    Query params: limit, before=<created_at>,<id> (from the X-Next-Cursor header
+    of the previous page) and comments=count to get only comment_count per post.
+    """
+    limit = min(max(request.args.get("limit", POSTS_PAGE_DEFAULT, type=int), 1), POSTS_PAGE_MAX)
+    counts_only = request.args.get("comments") == "count"
+
+    conditions = ["p.space = %s"]
+    params = [space]
+    before = request.args.get("before")
+    if before:
+        try:
+            created_at, post_id = parse_post_cursor(before)
+        except ValueError:
+            return jsonify({"error": "before must be '<created_at>,<id>'"}), 400
+        conditions.append("(p.created_at, p.id) < (%s::timestamptz, %s)")
+        params.extend([created_at, post_id])
+
+    if counts_only:
+        comments_sql = "(SELECT count(*) FROM comments c WHERE c.post_id = p.id) AS comment_count"
+    else:
+        # created_at rendered like Flask renders the post's own timestamp (RFC 1123, GMT)
+        comments_sql = """COALESCE((SELECT json_agg(json_build_object(
+                                        'id', c.id, 'post_id', c.post_id, 'user_name', c.user_name,
+                                        'text', c.text, 'emotion', c.emotion,
+                                        'created_at', to_char(c.created_at AT TIME ZONE 'UTC',
+                                                              'Dy, DD Mon YYYY HH24:MI:SS "GMT"'))
+                                    ORDER BY c.created_at, c.id)
+                                    FROM comments c WHERE c.post_id = p.id), '[]'::json) AS comments"""
+
+    cache_key = feed_cache.key(space, limit, "count" if counts_only else "full", before or "")
+    entry = feed_cache.get(cache_key)
+    if entry is None:
+        with db_cursor() as cur:
+            cur.execute(f"""
+                SELECT p.*, {comments_sql}
+                FROM posts p
+                WHERE {' AND '.join(conditions)}
+                ORDER BY p.created_at DESC, p.id DESC
+                LIMIT %s
+            """, params + [limit])
+            posts = cur.fetchall()
+        next_cursor = None
+        if len(posts) == limit:
+            next_cursor = f"{posts[-1]['created_at'].isoformat()},{posts[-1]['id']}"
+        entry = {"body": jsonify(posts).get_data(as_text=True), "next_cursor": next_cursor}
+        feed_cache.set(cache_key, entry["body"], next_cursor)
+
+    response = app.response_class(entry["body"], mimetype="application/json")
+    if entry["next_cursor"]:
+        response.headers["X-Next-Cursor"] = entry["next_cursor"]
+    response.set_etag(hashlib.md5(response.get_data()).hexdigest())
+    return response.make_conditional(request)
 
 @app.route('/posts', methods=['POST'])
 def create_post():
@@ -590,9 +2260,10 @@ def create_post():
     space = data.get("space","Community Support")
     emotion = analyze_text(text).get("label","neutral")
 
-    cursor.execute("INSERT INTO posts (space,text,emotion) VALUES (%s,%s,%s) RETURNING id",(space,text,emotion))
-    post_id = cursor.fetchone()['id']
-    db.commit()
+    with db_cursor() as cur:
+        cur.execute("INSERT INTO posts (space,text,emotion) VALUES (%s,%s,%s) RETURNING id",(space,text,emotion))
+        post_id = cur.fetchone()['id']
+    feed_cache.invalidate(space)
     return jsonify({"id":post_id,"space":space,"text":text,"emotion":emotion,"comments":[]})
 
 @app.route('/posts/<int:post_id>/comments', methods=['POST'])
@@ -602,86 +2273,365 @@ def add_comment(post_id):
     user_name = data.get("user_name", "Anonymous")
     emotion = analyze_text(text).get("label","neutral")
 
-    cursor.execute("INSERT INTO comments (post_id,user_name,text,emotion) VALUES (%s,%s,%s,%s) RETURNING id",(post_id,user_name,text,emotion))
-    comment_id = cursor.fetchone()['id']
-    db.commit()
-    return jsonify({"id":comment_id,"post_id":post_id, "user_name":"user_name","text":text,"emotion":emotion})
+    with db_cursor() as cur:
+        cur.execute("""
+            INSERT INTO comments (post_id,user_name,text,emotion) VALUES (%s,%s,%s,%s)
+            RETURNING id, (SELECT space FROM posts WHERE id = %s) AS space
+        """,(post_id,user_name,text,emotion,post_id))
+        row = cur.fetchone()
+    comment_id = row['id']
+    feed_cache.invalidate(row['space'])
+    return jsonify({"id":comment_id,"post_id":post_id, "user_name":user_name,"text":text,"emotion":emotion})
 
 @app.route('/posts/<int:post_id>', methods=['DELETE'])
 def delete_post(post_id):
-    cursor.execute("DELETE FROM posts WHERE id=%s",(post_id,))
-    db.commit()
+    with db_cursor() as cur:
+        cur.execute("DELETE FROM posts WHERE id=%s RETURNING space",(post_id,))
+        row = cur.fetchone()
+    if row:
+        feed_cache.invalidate(row['space'])
     return jsonify({"message":"Post deleted"})
 
 @app.route('/comments/<int:comment_id>', methods=['DELETE'])
 def delete_comment(comment_id):
-    cursor.execute("DELETE FROM comments WHERE id=%s",(comment_id,))
-    db.commit()
+    with db_cursor() as cur:
+        cur.execute("""
+            DELETE FROM comments c USING posts p
+            WHERE c.id = %s AND p.id = c.post_id
+            RETURNING p.space
+        """,(comment_id,))
+        row = cur.fetchone()
+    if row:
+        feed_cache.invalidate(row['space'])
     return jsonify({"message":"Comment deleted"})
 
+# ---------------- Assessment History ----------------
+HISTORY_PAGE_DEFAULT = int(os.getenv("HISTORY_PAGE_DEFAULT", "20"))
+HISTORY_PAGE_MAX = int(os.getenv("HISTORY_PAGE_MAX", "100"))
+
+# instrument: (table, compact summary built from columns in the table's covering index)
+HISTORY_SOURCES = {
+    "gad7": ("anxiety_results", """json_build_object(
+        'score', score, 'risk_level', final_risk, 'is_high_risk', is_high_risk,
+        'lr_score', lr_score, 'anomaly_score', bert_anomaly_score)"""),
+    "phq9": ("depression_results", """json_build_object(
+        'score', score, 'risk_level', risk_level, 'is_high_risk', is_high_risk,
+        'lr_score', lr_score, 'anomaly_score', bert_anomaly_score, 'hybrid_score', hybrid_risk_score)"""),
+    "who5": ("wellbeing_results", """json_build_object(
+        'score', score, 'percentage', percentage, 'risk_level', risk_level, 'is_high_risk', is_high_risk,
+        'lr_score', lr_score, 'hybrid_score', hybrid_score)"""),
+    "bfi10": ("personality_results", """json_build_object(
+        'traits', json_build_object('extraversion', extraversion, 'agreeableness', agreeableness,
+                                    'neuroticism', neuroticism, 'openness', openness,
+                                    'conscientiousness', conscientiousness),
+        'risk_level', risk_level, 'is_high_risk', is_high_risk, 'hybrid_score', hybrid_score)"""),
+}
+
+def parse_history_cursor(value):
+    """Parse a keyset cursor of the form "<created_at ISO>,<instrument>,<id>" """
+    created_at, instrument, row_id = value.rsplit(",", 2)
+    if instrument not in HISTORY_SOURCES:
+        raise ValueError(instrument)
+    return created_at, instrument, int(row_id)
+
+def history_branch(instrument, cursor):
+    """One UNION ALL branch: this instrument's next rows in (created_at, instrument, id) DESC order.
+
+    The cursor is turned into a plain range on (created_at, id) per table so every
+    branch stays an index scan on (user_name, created_at DESC, id DESC).
+    """
+    table, summary = HISTORY_SOURCES[instrument]
+    conditions = ["user_name = %(user_name)s"]
+    if cursor is not None:
+        _, cursor_instrument, _ = cursor
+        if instrument == cursor_instrument:
+            conditions.append("(created_at, id) < (%(before_at)s::timestamptz, %(before_id)s)")
+        elif instrument > cursor_instrument:
+            conditions.append("created_at < %(before_at)s::timestamptz")
+        else:
+            conditions.append("created_at <= %(before_at)s::timestamptz")
+    return f"""(SELECT '{instrument}' AS instrument, id, created_at, {summary} AS summary
+               FROM {table}
+               WHERE {' AND '.join(conditions)}
+               ORDER BY created_at DESC, id DESC
+               LIMIT %(limit)s)"""
+
+@app.route('/users/<user_name>/history', methods=['GET'])
+def user_history(user_name):
+    """A user's results across all instruments, newest first, in one query.
+
+    Query params: limit, instruments=gad7,phq9,... (default all) and
+    before=<created_at>,<instrument>,<id> from the X-Next-Cursor header of the
+    previous page. Each item is {instrument, id, created_at, summary}.
+    """
+    limit = min(max(request.args.get("limit", HISTORY_PAGE_DEFAULT, type=int), 1), HISTORY_PAGE_MAX)
+    instruments = request.args.get("instruments")
+    instruments = [i.strip() for i in instruments.split(",")] if instruments else list(HISTORY_SOURCES)
+    unknown = [i for i in instruments if i not in HISTORY_SOURCES]
+    if unknown:
+        return jsonify({"error": f"Unknown instruments: {', '.join(unknown)}"}), 400
+
+    cursor = None
+    params = {"user_name": user_name, "limit": limit}
+    before = request.args.get("before")
+    if before:
+        try:
+            cursor = parse_history_cursor(before)
+        except ValueError:
+            return jsonify({"error": "before must be '<created_at>,<instrument>,<id>'"}), 400
+        params["before_at"], _, params["before_id"] = cursor
+
+    # each branch returns at most `limit` rows, so the outer sort only merges a few pages
+    branches = " UNION ALL ".join(history_branch(i, cursor) for i in instruments)
+    with db_cursor() as cur:
+        cur.execute(f"""
+            SELECT * FROM ({branches}) history
+            ORDER BY created_at DESC, instrument DESC, id DESC
+            LIMIT %(limit)s
+        """, params)
+        items = cur.fetchall()
+
+    response = jsonify(items)
+    if len(items) == limit:
+        last = items[-1]
+        response.headers["X-Next-Cursor"] = f"{last['created_at'].isoformat()},{last['instrument']},{last['id']}"
+    response.set_etag(hashlib.md5(response.get_data()).hexdigest())
+    return response.make_conditional(request)
+
+# ---------------- Dashboard Stats ----------------
+STATS_DAYS_DEFAULT = int(os.getenv("STATS_DAYS_DEFAULT", "30"))
+STATS_DAYS_MAX = int(os.getenv("STATS_DAYS_MAX", "366"))
+
+@app.route('/stats', methods=['GET'])
+def dashboard_stats():
+    """Admin dashboard aggregates, read from the rollup tables of supabase_setup.sql.
+
+    Query params: days (window ending today, UTC; default 30) and
+    instruments=gad7,phq9,... (default all). The rollups are maintained by
+    triggers on every insert, so this reads O(days) rows whatever the size of
+    the result tables. Returns daily counts per instrument and risk level,
+    per-instrument totals and post/comment emotion counts per space.
+    """
+    days = min(max(request.args.get("days", STATS_DAYS_DEFAULT, type=int), 1), STATS_DAYS_MAX)
+    instruments = request.args.get("instruments")
+    instruments = [i.strip() for i in instruments.split(",")] if instruments else list(HISTORY_SOURCES)
+    unknown = [i for i in instruments if i not in HISTORY_SOURCES]
+    if unknown:
+        return jsonify({"error": f"Unknown instruments: {', '.join(unknown)}"}), 400
+    since = datetime.now(timezone.utc).date() - timedelta(days=days - 1)
+
+    with db_cursor() as cur:
+        cur.execute("""
+            SELECT day, instrument, risk_level, results, high_risk
+            FROM risk_daily_rollup
+            WHERE day >= %s AND instrument = ANY(%s) AND results > 0
+            ORDER BY day, instrument, risk_level
+        """, (since, instruments))
+        risk_rows = cur.fetchall()
+        cur.execute("""
+            SELECT space, source, emotion, SUM(items)::int AS items
+            FROM emotion_daily_rollup
+            WHERE day >= %s
+            GROUP BY space, source, emotion
+            HAVING SUM(items) > 0
+            ORDER BY space, source, items DESC
+        """, (since,))
+        emotion_rows = cur.fetchall()
+
+    totals = {i: {"results": 0, "high_risk": 0, "by_risk_level": {}} for i in instruments}
+    for row in risk_rows:
+        total = totals[row["instrument"]]
+        total["results"] += row["results"]
+        total["high_risk"] += row["high_risk"]
+        total["by_risk_level"][row["risk_level"]] = total["by_risk_level"].get(row["risk_level"], 0) + row["results"]
+        row["day"] = row["day"].isoformat()
+    emotions = {}
+    for row in emotion_rows:
+        emotions.setdefault(row["space"], {"post": {}, "comment": {}})[row["source"]][row["emotion"]] = row["items"]
+
+    response = jsonify({
+        "since": since.isoformat(),
+        "days": days,
+        "daily": risk_rows,
+        "totals": totals,
+        "emotions": emotions,
+    })
+    response.set_etag(hashlib.md5(response.get_data()).hexdigest())
+    return response.make_conditional(request)
+
 # ---------------- Training ----------------
+TRAINING_EPOCHS = int(os.getenv("TRAINING_EPOCHS", "5"))
+TRAINING_DATASET_FILE = "emotion_dataset.csv"
+# "bucketed" = length-bucketed batches padded per batch, "fixed" = shuffled batches padded to 128 tokens
+TRAINING_BATCHING = os.getenv("TRAINING_BATCHING", "bucketed").lower()
+TRAINING_BATCH_SIZE = int(os.getenv("TRAINING_BATCH_SIZE", "8"))
+TRAINING_GRAD_ACCUM = int(os.getenv("TRAINING_GRAD_ACCUM", "1"))
+TRAINING_THREADS = int(os.getenv("TRAINING_THREADS", "0"))
+TRAINING_VALIDATION_SPLIT = float(os.getenv("TRAINING_VALIDATION_SPLIT", "0.1"))
+TRAINING_JOBS_DIR = os.path.join(CHECKPOINT_DIR, "jobs")
+# progress is written at most this often (seconds) so status polling stays cheap
+TRAINING_STATUS_INTERVAL = float(os.getenv("TRAINING_STATUS_INTERVAL", "2"))
+
+def write_json_atomic(path, data):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def training_job_dir(job_id):
+    return os.path.join(TRAINING_JOBS_DIR, job_id)
+
+def read_training_job(job_id):
+    try:
+        with open(os.path.join(training_job_dir(job_id), "status.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_training_job(job):
+    write_json_atomic(os.path.join(training_job_dir(job["id"]), "status.json"), job)
+
+def latest_training_job():
+    try:
+        with open(os.path.join(TRAINING_JOBS_DIR, "LATEST")) as f:
+            return read_training_job(f.read().strip())
+    except OSError:
+        return None
+
+def training_job_alive(job):
+    """True while the job's process exists (job files are shared by every gunicorn worker).
+
+    A queued job has no pid file until the spawn returns; until then it is alive
+    as long as the worker that queued it (`spawned_by`) is.
+    """
+    if job is None or job.get("status") not in ("queued", "running", "validating"):
+        return False
+    try:
+        pid = job.get("pid")
+        if pid is None:
+            try:
+                with open(os.path.join(training_job_dir(job["id"]), "pid")) as f:
+                    pid = int(f.read())
+            except FileNotFoundError:
+                if job["status"] != "queued":
+                    raise
+                pid = job.get("spawned_by")
+        os.kill(pid, 0)
+        return True
+    except (TypeError, ValueError, OSError):
+        return False
+
+def run_training_job(job_id, config):
+    """Spawned process entry point; torch is only imported in the training process"""
+    load_ml().training_worker(job_id, config)
+
 @app.route('/train', methods=['POST'])
 def train():
-    global model, label_encoder, training_status
-    training_status["status"]="training"
+    """Start fine-tuning in a separate process and return immediately with a job id.
+
+    Body (optional): {"epochs", "batching", "batch_size", "grad_accum", "threads"}
+    (defaults from the TRAINING_* env vars) or {"resume": "<job_id>"} to continue a
+    cancelled or failed job from its last epoch checkpoint with its original settings.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    multiprocessing.active_children()  # reap finished training processes
+    latest = latest_training_job()
+    if training_job_alive(latest):
+        return jsonify({"error": "A training job is already running", "job_id": latest["id"]}), 409
+
     try:
-    
-        df = pd.read_csv("emotion_dataset.csv")
-        df = shuffle(df)
-
-        label_encoder.fit(df['label'])
-        labels = label_encoder.transform(df['label'])
-        dataset = EmotionDataset(df['text'].tolist(), labels)
-        dataloader = DataLoader(dataset, batch_size=8, shuffle=True)
-
-        model = EmotionClassifier(len(label_encoder.classes_)).to(device)
-        optimizer = AdamW(model.parameters(), lr=2e-5)
-
-        for epoch in range(5):
-            model.train()
-            total_loss = 0
-            for batch in dataloader:
-                input_ids = batch['input_ids'].to(device)
-                attention_mask = batch['attention_mask'].to(device)
-                labels_batch = batch['label'].to(device)
-
-                output = model(input_ids, attention_mask, labels_batch)
-                loss = output['loss']
-
-                optimizer.zero_grad()
-                loss.backward()
-                optimizer.step()
-                total_loss += loss.item()
-
-            training_status.update({"epoch":epoch+1,"loss":total_loss})
-
-        torch.save({
-            'model_state_dict':model.state_dict(),
-            'label_encoder_classes':label_encoder.classes_,
-            'num_labels':len(label_encoder.classes_)
-        }, CHECKPOINT_FILE)
-        logger.info("Training finished — checkpoint saved to %s", CHECKPOINT_FILE)
-
-        training_status["status"]="completed"
-        return jsonify({"message":"Training complete","loss":total_loss})
-    except Exception as e:
-        training_status["status"]="error"
-        return jsonify({"error":str(e)}),500
+        config = {
+            "epochs": int(data.get("epochs", TRAINING_EPOCHS)),
+            "seed": int(time.time()),
+            "resume_from": None,
+            "batching": str(data.get("batching", TRAINING_BATCHING)).lower(),
+            "batch_size": int(data.get("batch_size", TRAINING_BATCH_SIZE)),
+            "grad_accum": int(data.get("grad_accum", TRAINING_GRAD_ACCUM)),
+            "threads": int(data.get("threads", TRAINING_THREADS)),
+        }
+    except (TypeError, ValueError):
+        return jsonify({"error": "epochs, batch_size, grad_accum and threads must be integers"}), 400
+    if min(config["epochs"], config["batch_size"], config["grad_accum"]) < 1 or config["threads"] < 0:
+        return jsonify({"error": "epochs, batch_size and grad_accum must be at least 1, threads at least 0"}), 400
+    if config["batching"] not in ("bucketed", "fixed"):
+        return jsonify({"error": "batching must be 'bucketed' or 'fixed'"}), 400
+    resume_id = data.get("resume")
+    if resume_id:
+        previous = read_training_job(str(resume_id))
+        epoch_checkpoint = os.path.join(training_job_dir(str(resume_id)), "epoch_checkpoint.pth")
+        if previous is None or not os.path.exists(epoch_checkpoint):
+            return jsonify({"error": f"No epoch checkpoint to resume for job {resume_id}"}), 404
+        # same seed -> same train/validation split as the interrupted run
+        config.update(previous["config"], resume_from=epoch_checkpoint)
+
+    job_id = uuid.uuid4().hex[:12]
+    os.makedirs(training_job_dir(job_id), exist_ok=True)
+    job = {"id": job_id, "status": "queued", "epoch": 0, "loss": None, "epochs": config["epochs"],
+           "config": config, "history": [], "progress": 0.0, "eta_seconds": None,
+           "created_at": time.time(), "resumed_from": resume_id, "spawned_by": os.getpid()}
+    process = multiprocessing.get_context("spawn").Process(
+        target=run_training_job, args=(job_id, config), name=f"training-{job_id}")
+    write_training_job(job)
+    process.start()
+    # the child owns status.json from here on; the pid file covers the window before it first writes
+    with open(os.path.join(training_job_dir(job_id), "pid"), "w") as f:
+        f.write(str(process.pid))
+    latest_tmp = os.path.join(TRAINING_JOBS_DIR, "LATEST.tmp")
+    with open(latest_tmp, "w") as f:
+        f.write(job_id)
+    os.replace(latest_tmp, os.path.join(TRAINING_JOBS_DIR, "LATEST"))
+    return jsonify({"message": "Training started", "job_id": job_id,
+                    "status_url": f"/training_status?job_id={job_id}"}), 202
+
+@app.route('/train/<job_id>/cancel', methods=['POST'])
+def cancel_training(job_id):
+    job = read_training_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown training job"}), 404
+    if not training_job_alive(job):
+        return jsonify({"message": f"Job is not running ({job['status']})", "job_id": job_id}), 409
+    open(os.path.join(training_job_dir(job_id), "CANCEL"), "w").close()
+    return jsonify({"message": "Cancellation requested", "job_id": job_id})
 
 @app.route('/training_status', methods=['GET'])
 def get_training_status():
-    return jsonify(training_status)
+    job_id = request.args.get("job_id")
+    job = read_training_job(job_id) if job_id else latest_training_job()
+    if job is None:
+        if job_id:
+            return jsonify({"error": "Unknown training job"}), 404
+        return jsonify({"status": "idle", "epoch": 0, "loss": None})
+    if job["status"] in ("queued", "running", "validating") and not training_job_alive(job):
+        job["status"] = "error"
+        job["error"] = "Training process exited unexpectedly"
+    return jsonify(job)
 
 @app.route("/checkpoint_status", methods=["GET"])
 def checkpoint_status():
     try:
+        metadata = read_checkpoint_metadata() if safetensors_checkpoint_available() else None
+        if metadata is not None:
+            return jsonify({
+                "exists": True,
+                "path": checkpoint_weights_path(metadata),
+                "format": "safetensors",
+                "num_labels": metadata["num_labels"],
+                "labels_sample": metadata["label_encoder_classes"][:5],
+                "metrics": metadata.get("metrics"),
+                "dataset_sha256": metadata.get("dataset_sha256"),
+                "loaded": True,
+                "message": "Checkpoint is available and metadata loaded."
+            })
+
         if not os.path.exists(CHECKPOINT_FILE):
             return jsonify({
                 "exists": False,
                 "message": f"Checkpoint not found at {CHECKPOINT_FILE}"
             }), 404
 
-        checkpoint = torch.load(CHECKPOINT_FILE, map_location="cpu")
+        checkpoint = load_ml().load_checkpoint(CHECKPOINT_FILE)
 
         num_labels = checkpoint.get("num_labels", None)
         label_classes = checkpoint.get("label_encoder_classes", None)
@@ -717,21 +2667,21 @@ def health_check():
 def health():
     db_status = "disconnected"
     try:
-        db_conn, _ = ensure_db_connection()
-        if db_conn and not db_conn.closed:
-            db_status = "connected"
+        with db_cursor() as cur:
+            cur.execute("SELECT 1")
+        db_status = "connected"
     except Exception as e:
-        print(f"Health check database error: {e}")
+        logger.warning("Health check database error: %s", e)
     
     model_status = {
-        "loaded": model is not None,
+        "loaded": ml_loaded() and sys.modules["emotion_model"].model is not None,
         "checkpoint_exists": os.path.exists(CHECKPOINT_FILE),
         "checkpoint_url": os.getenv("CHECKPOINT_URL", "Not set"),
         "hf_token_set": bool(os.getenv("HF_TOKEN")),
     }
-    if not model_status["loaded"]:
+    if not model_status["loaded"] and EMOTION_INFERENCE_MODE == "local":
         try:
-            loaded_model = load_model()
+            loaded_model = load_ml().load_model()
             model_status["loaded"] = loaded_model is not None
             model_status["load_attempt"] = "success" if loaded_model else "failed"
         except Exception as e:
@@ -742,6 +2692,16 @@ def health():
         "database": db_status,
         "model_loaded": model_status["loaded"],
         "model_status": model_status,
+        "db_pool": db_pool.status(),
+        "emotion_api": emotion_client.status(),
+        "result_writer": result_writer.status(),
+        "feed_cache": feed_cache.status(),
+        "admission": {gate.name: gate.status() for gate in admission_gates()} if ADMISSION_CONTROL else None,
+        "inference_mode": EMOTION_INFERENCE_MODE,
+        "model_variant": EMOTION_MODEL_VARIANT,
+        "fallback_lexicon": {"version": emotion_lexicon.version, "terms": len(emotion_lexicon.terms)},
+        "local_inference": load_ml().local_engine.status() if EMOTION_INFERENCE_MODE == "local" else None,
+        "process": process_status(),
         "environment": os.getenv("RAILWAY_ENVIRONMENT", "development")
     })
 
@@ -762,20 +2722,9 @@ def debug_db():
     }
     
     try:
-        database_url = os.getenv("DATABASE_URL")
-        if database_url:
-            connection = psycopg2.connect(database_url, sslmode='require')
-            debug_info["connection_method"] = "DATABASE_URL"
-        else:
-            connection = psycopg2.connect(
-                host=os.getenv("DB_HOST", "localhost"),
-                user=os.getenv("DB_USER", "postgres"),
-                password=os.getenv("DB_PASSWORD", ""),
-                database=os.getenv("DB_NAME", "postgres"),
-                port=int(os.getenv("DB_PORT", "5432")),
-                sslmode='require'
-            )
-            debug_info["connection_method"] = "individual_vars"
+        args, kwargs = db_connect_params()
+        connection = psycopg2.connect(*args, **kwargs)
+        debug_info["connection_method"] = "DATABASE_URL" if args else "individual_vars"
         
         cursor = connection.cursor()
         cursor.execute("SELECT 1")
@@ -785,6 +2734,7 @@ def debug_db():
         
         debug_info["connection_attempt"] = "success"
         debug_info["test_query"] = "passed"
+        debug_info["pool"] = db_pool.status()
         
     except Exception as e:
         debug_info["error"] = str(e)
@@ -823,9 +2773,9 @@ def debug_model():
         },
         "checkpoint_file_path": CHECKPOINT_FILE,
         "checkpoint_exists": os.path.exists(CHECKPOINT_FILE),
-        "model_loaded": model is not None,
-        "huggingface_hub_available": hf_hub_download is not None,
-        "device": str(device)
+        "model_loaded": ml_loaded() and sys.modules["emotion_model"].model is not None,
+        "huggingface_hub_available": importlib.util.find_spec("huggingface_hub") is not None,
+        "device": str(sys.modules["emotion_model"].device) if ml_loaded() else None
     }
     try:
         download_result = ensure_checkpoint_available()
@@ -847,6 +2797,85 @@ def debug_model():
     
     return jsonify(debug_info)
 
+# ---------------- Metrics Endpoint ----------------
+metric_gauges.extend([
+    ("emotion_api_circuit_open", "1 while the emotion API circuit breaker rejects calls",
+     lambda: [({}, emotion_client.breaker.state == "open")]),
+    ("emotion_api_timeout_seconds", "Current adaptive timeout for emotion API calls",
+     lambda: [({}, emotion_client.latency.timeout())]),
+    ("process_startup_seconds", "Time from the start of app.py import to serving readiness",
+     lambda: [({}, startup_seconds)]),
+    ("process_resident_memory_megabytes", "Resident set size of this worker",
+     lambda: [({}, process_memory()["rss_mb"])]),
+    ("ml_profile_loaded", "1 once torch/transformers have been imported in this worker",
+     lambda: [({}, ml_loaded())]),
+    ("emotion_cache_hit_ratio", "Hit ratio of the emotion API result cache",
+     lambda: [({}, emotion_client.cache.stats()["hit_ratio"])]),
+    ("feed_cache_hit_ratio", "Hit ratio of the community feed cache",
+     lambda: [({}, feed_cache.status()["hit_ratio"])]),
+    ("feed_cache_served_age_seconds_max", "Oldest feed page served from cache",
+     lambda: [({}, feed_cache.status()["served_age_seconds_max"])]),
+    ("feed_cache_entries", "Feed pages held by the feed cache backend",
+     lambda: [({}, feed_cache.size())]),
+    ("db_pool_connections_in_use", "Database connections checked out of this worker's pool",
+     lambda: [({}, db_pool.stats["in_use"])]),
+    ("db_pool_timeouts", "Pool checkouts that timed out",
+     lambda: [({}, db_pool.stats["timeouts"])]),
+    ("result_writer_pending_rows", "Assessment rows waiting for the next bulk insert",
+     lambda: [({}, result_writer.status()["pending"])]),
+    ("admission_queue_depth", "Callers waiting at each admission gate",
+     lambda: [({"gate": gate.name}, gate.status()["queued_now"]) for gate in admission_gates()]),
+    ("admission_in_flight", "Callers holding a slot at each admission gate",
+     lambda: [({"gate": gate.name}, gate.status()["in_flight"]) for gate in admission_gates()]),
+])
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    start = g.get("request_start")
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else "unmatched"
+        REQUEST_LATENCY.observe(time.perf_counter() - start, route, request.method, response.status_code)
+    return response
+
+@app.before_request
+def admit_request():
+    """Queue or shed the request by its route's class before any work is done"""
+    admission = ROUTE_CLASSES.get(request.endpoint)
+    if not ADMISSION_CONTROL or admission is None or request.method == "OPTIONS":
+        return
+    g.admission_class = admission
+    g.admission_token = route_gates[admission].acquire(admission)
+
+@app.teardown_request
+def release_admission(exc=None):
+    token = g.pop("admission_token", None)
+    if token is not None:
+        route_gates[g.admission_class].release(token)
+
+@app.errorhandler(AdmissionRejected)
+def admission_rejected(e):
+    response = jsonify({"error": "Server is busy, please retry", "retry_after": e.retry_after})
+    response.status_code = e.status
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response
+
+@app.errorhandler(PoolTimeout)
+def pool_timeout(e):
+    # every connection stayed busy for DB_POOL_TIMEOUT; the caller already waited that long
+    response = jsonify({"error": "Database is busy, please retry", "retry_after": 1})
+    response.status_code = 503
+    response.headers["Retry-After"] = "1"
+    return response
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return app.response_class(render_metrics(), mimetype="text/plain; version=0.0.4")
+
 # ---------------- CORS Preflight Handler ----------------
 @app.before_request
 def handle_preflight():
@@ -858,9 +2887,24 @@ def handle_preflight():
         return response
 
 # ---------------- Analyze Text ----------------
+ANALYZE_BATCH_MAX = int(os.getenv("ANALYZE_BATCH_MAX", "256"))
+
 @app.route('/analyze', methods=['POST'])
 def analyze():
+    """{"text": ...} -> one result, or {"texts": [...], "embeddings": bool} -> a list of results
+
+    Each result has label/confidence and, with local inference, the anomaly
+    score (and CLS embedding if asked for) from the same forward pass.
+    """
     data = request.get_json()
+    texts = data.get("texts")
+    if texts is not None:
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            return jsonify({"error": "texts must be a list of strings"}), 400
+        if len(texts) > ANALYZE_BATCH_MAX:
+            return jsonify({"error": f"At most {ANALYZE_BATCH_MAX} texts per request"}), 400
+        return jsonify(analyze_texts(texts, embeddings=bool(data.get("embeddings"))))
+
     text = data.get("text", "").strip()
 
     if not text:
@@ -869,7 +2913,20 @@ def analyze():
     result = analyze_text(text)
     return jsonify(result)
 
+# spawned training processes import this module too; they never serve requests
+if PRELOAD_MODEL and EMOTION_INFERENCE_MODE == "local" and multiprocessing.current_process().name == "MainProcess":
+    load_ml().get_tokenizer()
+    load_ml().load_model()
+
+startup_seconds = round(time.perf_counter() - IMPORT_STARTED, 3)
+logger.info("App started in %.2fs (profile=%s, RSS %s MB)",
+            startup_seconds, "ml" if ml_loaded() else "serving", process_memory()["rss_mb"])
+
 # ---------------- Main ----------------
 if __name__=="__main__":
     port = int(os.getenv("PORT", 5000))
-    app.run(host="0.0.0.0", port=port)
+    if SERVING_MODE == "async":
+        from gevent.pywsgi import WSGIServer
+        WSGIServer(("0.0.0.0", port), app).serve_forever()
+    else:
+        app.run(host="0.0.0.0", port=port)
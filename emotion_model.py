@@ -0,0 +1,865 @@
+"""Torch side of the emotion service: tokenizer, training datasets, the
+classifier, checkpoint formats, in-process inference and the training worker.
+
+This is the ML profile of the app. app.py imports it only when local
+inference, /train or /checkpoint_status actually need it, so workers in the
+default serving profile (remote inference) never load torch, transformers,
+pandas or scikit-learn.
+"""
+import gc
+import hashlib
+import json
+import os
+import queue
+import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+import transformers
+from transformers import AutoTokenizer, AutoModel, AutoConfig
+import torch
+import torch.nn as nn
+import torch.nn.functional as F
+from torch.optim import AdamW
+from torch.utils.data import DataLoader, Dataset, Sampler
+from sklearn.preprocessing import LabelEncoder
+from sklearn.utils import shuffle
+
+from app import (
+    CHECKPOINT_DIR,
+    CHECKPOINT_FILE,
+    CHECKPOINT_METADATA_FILE,
+    CHECKPOINT_SAFETENSORS_FILE,
+    DEPENDENCY_LATENCY,
+    EMOTION_INFERENCE_MODE,
+    EMOTION_MODEL_VARIANT,
+    INT8_CHECKPOINT_FILE,
+    LOCAL_BATCH_SIZE,
+    LOCAL_BATCH_WINDOW_MS,
+    LOCAL_LONG_TEXT,
+    LOCAL_MAX_LENGTH,
+    LOCAL_MAX_WINDOWS,
+    LOCAL_TORCH_THREADS,
+    LOCAL_WINDOW_AGGREGATION,
+    LOCAL_WINDOW_BATCH,
+    LOCAL_WINDOW_STRIDE,
+    ONNX_MODEL_FILE,
+    TRAINING_DATASET_FILE,
+    TRAINING_STATUS_INTERVAL,
+    TRAINING_VALIDATION_SPLIT,
+    checkpoint_weights_path,
+    ensure_checkpoint_available,
+    file_sha256,
+    logger,
+    offload,
+    read_checkpoint_metadata,
+    read_training_job,
+    safetensors_checkpoint_available,
+    training_job_dir,
+    write_json_atomic,
+    write_training_job,
+)
+
+# ---------------- BERT Model ----------------
+MODEL_NAME = "google-bert/bert-base-uncased"
+tokenizer = None
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+
+def get_tokenizer():
+    global tokenizer
+    if tokenizer is None:
+        logger.info("Loading tokenizer...")
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        logger.info("Tokenizer loaded")
+    return tokenizer
+
+NEGATIVE_LABELS = {"sadness", "anger", "fear"}
+
+model = None
+label_encoder = LabelEncoder()
+
+# ---------------- Dataset & Model ----------------
+TOKEN_CACHE_DIR = os.path.join(CHECKPOINT_DIR, "token_cache")
+TRAINING_MAX_LENGTH = 128
+
+class TokenStore:
+    """Memory-mapped, unpadded token ids for every row of a dataset file.
+
+    input_ids.npy holds all rows back to back and offsets.npy the row
+    boundaries, so processes that open the same store share one page-cache
+    copy and nothing is re-tokenized between runs.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.input_ids = np.load(os.path.join(path, "input_ids.npy"), mmap_mode="r")
+        self.offsets = np.load(os.path.join(path, "offsets.npy"), mmap_mode="r")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def tokens(self, row):
+        return self.input_ids[self.offsets[row]:self.offsets[row + 1]]
+
+def token_cache_key(dataset_path, max_length):
+    digest = hashlib.sha256()
+    with open(dataset_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    tok = get_tokenizer()
+    digest.update(f"{MODEL_NAME}|{transformers.__version__}|{type(tok).__name__}|{len(tok)}|{max_length}".encode())
+    return digest.hexdigest()[:24]
+
+def load_token_store(dataset_path, texts, max_length=TRAINING_MAX_LENGTH):
+    """Return the TokenStore for `dataset_path`, tokenizing `texts` (its rows in file order) on a cache miss"""
+    path = os.path.join(TOKEN_CACHE_DIR, token_cache_key(dataset_path, max_length))
+    if os.path.exists(os.path.join(path, "offsets.npy")):
+        return TokenStore(path), True
+
+    tok = get_tokenizer()
+    dtype = np.uint16 if len(tok) < 2 ** 16 else np.int32
+    chunks, lengths = [], []
+    for start in range(0, len(texts), 1000):
+        for ids in tok(texts[start:start + 1000], truncation=True, max_length=max_length)["input_ids"]:
+            chunks.append(np.asarray(ids, dtype=dtype))
+            lengths.append(len(ids))
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp_path, exist_ok=True)
+    np.save(os.path.join(tmp_path, "input_ids.npy"), np.concatenate(chunks) if chunks else np.zeros(0, dtype=dtype))
+    np.save(os.path.join(tmp_path, "offsets.npy"), offsets)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        # another process built the same store first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    logger.info("Token cache written to %s (%d rows, %d tokens)", path, len(lengths), int(offsets[-1]))
+    return TokenStore(path), False
+
+class EmotionDataset(Dataset):
+    def __init__(self, texts, labels, token_store=None, rows=None, dynamic_padding=False):
+        self.texts = texts
+        self.labels = labels
+        self.token_store = token_store
+        self.rows = rows
+        # unpadded items; pad_collate pads each batch to its longest sequence
+        self.dynamic_padding = dynamic_padding and token_store is not None
+
+    def __len__(self):
+        return len(self.labels)
+
+    def lengths(self):
+        offsets = self.token_store.offsets
+        rows = np.asarray(self.rows)
+        return offsets[rows + 1] - offsets[rows]
+
+    def __getitem__(self, idx):
+        if self.dynamic_padding:
+            tokens = torch.from_numpy(self.token_store.tokens(self.rows[idx]).astype(np.int64))
+            return {'input_ids': tokens, 'label': torch.tensor(self.labels[idx], dtype=torch.long)}
+        if self.token_store is not None:
+            tokens = torch.from_numpy(self.token_store.tokens(self.rows[idx]).astype(np.int64))
+            input_ids = torch.zeros(TRAINING_MAX_LENGTH, dtype=torch.long)
+            attention_mask = torch.zeros(TRAINING_MAX_LENGTH, dtype=torch.long)
+            input_ids[:len(tokens)] = tokens
+            attention_mask[:len(tokens)] = 1
+        else:
+            encoding = get_tokenizer()(self.texts[idx], return_tensors='pt',
+                                 truncation=True, padding='max_length', max_length=TRAINING_MAX_LENGTH)
+            input_ids = encoding['input_ids'].squeeze(0)
+            attention_mask = encoding['attention_mask'].squeeze(0)
+        return {
+            'input_ids': input_ids,
+            'attention_mask': attention_mask,
+            'label': torch.tensor(self.labels[idx], dtype=torch.long)
+        }
+
+def pad_collate(batch):
+    """Pad a batch of unpadded items to its own longest sequence"""
+    longest = max(len(item['input_ids']) for item in batch)
+    input_ids = torch.zeros(len(batch), longest, dtype=torch.long)
+    attention_mask = torch.zeros(len(batch), longest, dtype=torch.long)
+    for i, item in enumerate(batch):
+        input_ids[i, :len(item['input_ids'])] = item['input_ids']
+        attention_mask[i, :len(item['input_ids'])] = 1
+    return {
+        'input_ids': input_ids,
+        'attention_mask': attention_mask,
+        'label': torch.stack([item['label'] for item in batch])
+    }
+
+class LengthBucketSampler(Sampler):
+    """Batch sampler that groups sequences of similar length.
+
+    Indices are shuffled, cut into pools of `batch_size * pool_batches`, sorted
+    by length inside each pool and split into batches; the batch order is
+    shuffled again so epochs don't run shortest-to-longest.
+    """
+
+    def __init__(self, lengths, batch_size, pool_batches=50, seed=0):
+        self.lengths = np.asarray(lengths)
+        self.batch_size = batch_size
+        self.pool_size = batch_size * pool_batches
+        self.seed = seed
+        self.epoch = 0
+
+    def __len__(self):
+        return (len(self.lengths) + self.batch_size - 1) // self.batch_size
+
+    def __iter__(self):
+        rng = np.random.default_rng(self.seed + self.epoch)
+        self.epoch += 1
+        indices = rng.permutation(len(self.lengths))
+        batches = []
+        for start in range(0, len(indices), self.pool_size):
+            pool = indices[start:start + self.pool_size]
+            pool = pool[np.argsort(self.lengths[pool], kind="stable")]
+            batches.extend(pool[i:i + self.batch_size].tolist() for i in range(0, len(pool), self.batch_size))
+        for i in rng.permutation(len(batches)):
+            yield batches[i]
+
+class EmotionClassifier(nn.Module):
+    def __init__(self, num_labels, pretrained=True):
+        super(EmotionClassifier, self).__init__()
+        if pretrained:
+            self.bert = AutoModel.from_pretrained(MODEL_NAME)
+        else:
+            self.bert = AutoModel.from_config(AutoConfig.from_pretrained(MODEL_NAME))
+        self.dropout = nn.Dropout(0.3)
+        self.classifier = nn.Linear(self.bert.config.hidden_size, num_labels)
+        self.anomaly_head = nn.Linear(self.bert.config.hidden_size, 1)
+
+    def forward(self, input_ids, attention_mask, labels=None, anomaly=False, anomaly_labels=None):
+        outputs = self.bert(input_ids=input_ids, attention_mask=attention_mask)
+        cls_output = outputs.last_hidden_state[:, 0]
+
+        if anomaly:
+            score = torch.sigmoid(self.anomaly_head(self.dropout(cls_output)))
+            return {"anomaly_score": score}
+
+        features = self.dropout(cls_output)
+        logits = self.classifier(features)
+        loss = F.cross_entropy(logits, labels) if labels is not None else None
+        if anomaly_labels is not None:
+            # the anomaly head is trained on the same pass to predict a negative emotion
+            anomaly_logit = self.anomaly_head(features).squeeze(-1)
+            loss = loss + F.binary_cross_entropy_with_logits(anomaly_logit, anomaly_labels.float())
+        return {"logits": logits, "loss": loss}
+
+    def heads(self, input_ids, attention_mask, return_embedding=False):
+        """Emotion logits, anomaly score and optionally the CLS embedding from one encoder pass"""
+        cls_output = self.bert(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state[:, 0]
+        features = self.dropout(cls_output)
+        result = {
+            "logits": self.classifier(features),
+            "anomaly_score": torch.sigmoid(self.anomaly_head(features)).squeeze(-1),
+        }
+        if return_embedding:
+            result["embedding"] = cls_output
+        return result
+
+def negative_label_mask(label_classes):
+    return torch.tensor([str(c).strip() in NEGATIVE_LABELS for c in label_classes])
+
+# ---------------- Checkpoints & Local Inference ----------------
+_model_lock = threading.Lock()
+
+def load_checkpoint(path, map_location="cpu"):
+    """torch.load a trusted local checkpoint, memory-mapped when torch supports it"""
+    try:
+        return torch.load(path, map_location=map_location, weights_only=False, mmap=True)
+    except (TypeError, RuntimeError):
+        # older torch versions don't accept weights_only / mmap, and legacy files can't be mapped
+        return torch.load(path, map_location=map_location)
+
+def save_safetensors_weights(state_dict, path):
+    """Write a state dict as safetensors (atomically) so loaders can mmap it"""
+    from safetensors.torch import save_file
+    tensors = {name: tensor.detach().cpu().contiguous() for name, tensor in state_dict.items()}
+    tmp_path = path + ".tmp"
+    save_file(tensors, tmp_path, metadata={"format": "pt"})
+    os.replace(tmp_path, path)
+
+def write_checkpoint_metadata(label_classes, metrics=None, weights=CHECKPOINT_SAFETENSORS_FILE, **extra):
+    """JSON sidecar describing the serving checkpoint; read instead of unpickling the weights.
+
+    Written last when a checkpoint changes: replacing it atomically is what
+    switches readers to `weights`, whose hash exports are checked against.
+    """
+    metadata = {
+        "format": "safetensors",
+        "weights": os.path.basename(weights),
+        "weights_sha256": file_sha256(weights),
+        "num_labels": len(label_classes),
+        "label_encoder_classes": [str(c) for c in label_classes],
+        "tokenizer": MODEL_NAME,
+        "tokenizer_version": transformers.__version__,
+        "dataset_sha256": file_sha256(TRAINING_DATASET_FILE) if os.path.exists(TRAINING_DATASET_FILE) else None,
+        "metrics": metrics or {},
+        "created_at": time.time(),
+    }
+    metadata.update(extra)
+    write_json_atomic(CHECKPOINT_METADATA_FILE, metadata)
+    return metadata
+
+def load_safetensors_model():
+    """Build the fp32 classifier on weights memory-mapped from the safetensors file.
+
+    load_state_dict(assign=True) keeps the mmap-backed tensors instead of copying
+    them, so every worker process reads the same page-cache pages.
+    """
+    from safetensors.torch import load_file
+    try:
+        metadata = read_checkpoint_metadata()
+        state_dict = load_file(checkpoint_weights_path(metadata), device="cpu")
+    except FileNotFoundError:
+        # a promotion replaced the sidecar and removed the old weights in between; read the new pair
+        metadata = read_checkpoint_metadata()
+        state_dict = load_file(checkpoint_weights_path(metadata), device="cpu")
+    loaded = EmotionClassifier(metadata["num_labels"], pretrained=False)
+    try:
+        loaded.load_state_dict(state_dict, assign=True)
+    except TypeError:
+        # torch < 2.1 has no assign=; fall back to copying into the module
+        loaded.load_state_dict(state_dict)
+    loaded.anomaly_head_trained = bool(metadata.get("anomaly_head_trained", False))
+    return loaded, np.array(metadata["label_encoder_classes"], dtype=object)
+
+def quantize_model(fp32_model):
+    """Dynamic int8 quantization of every nn.Linear (encoder, pooler and both heads)"""
+    return torch.quantization.quantize_dynamic(fp32_model, {nn.Linear}, dtype=torch.qint8)
+
+class OnnxEmotionModel:
+    """onnxruntime session with the same call signature as EmotionClassifier"""
+
+    def __init__(self, path):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if LOCAL_TORCH_THREADS > 0:
+            options.intra_op_num_threads = LOCAL_TORCH_THREADS
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def __call__(self, input_ids, attention_mask):
+        logits = self.session.run(["logits"], self._inputs(input_ids, attention_mask))[0]
+        return {"logits": torch.from_numpy(logits)}
+
+    def heads(self, input_ids, attention_mask, return_embedding=False):
+        # graphs exported before the multi-head export only have "logits"
+        names = [o.name for o in self.session.get_outputs()]
+        if not return_embedding and "embedding" in names:
+            names.remove("embedding")
+        outputs = dict(zip(names, self.session.run(names, self._inputs(input_ids, attention_mask))))
+        return {name: torch.from_numpy(value) for name, value in outputs.items()}
+
+    @staticmethod
+    def _inputs(input_ids, attention_mask):
+        return {
+            "input_ids": input_ids.cpu().numpy().astype(np.int64),
+            "attention_mask": attention_mask.cpu().numpy().astype(np.int64),
+        }
+
+    def eval(self):
+        return self
+
+def export_is_stale(source_sha256):
+    """True when an int8/ONNX export was made from other weights than the serving checkpoint's"""
+    metadata = read_checkpoint_metadata() if safetensors_checkpoint_available() else None
+    if not metadata or not metadata.get("weights_sha256"):
+        return False
+    return source_sha256 != metadata["weights_sha256"]
+
+def build_model(variant=None):
+    """Load a serving variant of the classifier; returns (model, label_classes).
+
+    fp32 -> the safetensors weights named by the sidecar when present, else CHECKPOINT_FILE;
+    int8 -> INT8_CHECKPOINT_FILE, onnx -> ONNX_MODEL_FILE (both from export_model.py).
+    An export made before the last promotion is refused in favour of fp32, so
+    a retrained model is never shadowed by a stale int8/ONNX file.
+    """
+    variant = (variant or EMOTION_MODEL_VARIANT).lower()
+    if variant == "onnx":
+        with open(ONNX_MODEL_FILE + ".labels.json") as f:
+            labels = json.load(f)
+        if export_is_stale(labels.get("source_weights_sha256")):
+            logger.warning("%s predates the serving checkpoint; loading fp32 instead "
+                           "(re-run export_model.py --onnx)", ONNX_MODEL_FILE)
+            return build_model("fp32")
+        loaded = OnnxEmotionModel(ONNX_MODEL_FILE)
+        loaded.anomaly_head_trained = bool(labels.get("anomaly_head_trained", False))
+        return loaded, np.array(labels["label_encoder_classes"], dtype=object)
+    if variant not in ("fp32", "int8"):
+        raise ValueError(f"Unknown EMOTION_MODEL_VARIANT: {variant}")
+
+    if variant == "fp32" and safetensors_checkpoint_available():
+        loaded, label_classes = load_safetensors_model()
+        loaded.eval()
+        for param in loaded.parameters():
+            param.requires_grad_(False)
+        return loaded, label_classes
+
+    path = INT8_CHECKPOINT_FILE if variant == "int8" else CHECKPOINT_FILE
+    checkpoint = load_checkpoint(path)
+    if variant == "int8" and export_is_stale(checkpoint.get("source_weights_sha256")):
+        logger.warning("%s predates the serving checkpoint; loading fp32 instead "
+                       "(re-run export_model.py)", INT8_CHECKPOINT_FILE)
+        del checkpoint
+        return build_model("fp32")
+    num_labels = checkpoint.get('num_labels', len(checkpoint['label_encoder_classes']))
+    # build the encoder from config only; the checkpoint overwrites every weight anyway
+    loaded = EmotionClassifier(num_labels, pretrained=False)
+    if variant == "int8":
+        loaded = quantize_model(loaded)
+    loaded.load_state_dict(checkpoint['model_state_dict'])
+    loaded.eval()
+    for param in loaded.parameters():
+        param.requires_grad_(False)
+    loaded.anomaly_head_trained = bool(checkpoint.get('anomaly_head_trained', False))
+    label_classes = checkpoint['label_encoder_classes']
+    del checkpoint
+    gc.collect()
+    return loaded, label_classes
+
+def load_model():
+    """Load the checkpoint once per process for local inference (EMOTION_INFERENCE_MODE=local)"""
+    global model
+    if EMOTION_INFERENCE_MODE != "local":
+        logger.info("Model loading disabled - using HF Space API instead")
+        return None
+    if model is not None:
+        return model
+    with _model_lock:
+        if model is not None:
+            return model
+        if EMOTION_MODEL_VARIANT == "fp32" and not safetensors_checkpoint_available() \
+                and not ensure_checkpoint_available():
+            logger.error("Could not ensure checkpoint availability")
+            return None
+        logger.info("Loading %s model variant", EMOTION_MODEL_VARIANT)
+        try:
+            loaded, label_classes = build_model()
+            label_encoder.classes_ = label_classes
+            model = loaded if EMOTION_MODEL_VARIANT == "onnx" else loaded.to(device)
+            logger.info("Model loaded successfully: variant=%s, num_labels=%s, device=%s",
+                        EMOTION_MODEL_VARIANT, len(label_classes), device)
+        except Exception as e:
+            logger.exception("Error loading %s model: %s", EMOTION_MODEL_VARIANT, e)
+            model = None
+    return model
+
+class LocalEmotionEngine:
+    """In-process inference with dynamic batching.
+
+    Requests are queued and a single dispatcher thread per process drains up
+    to `batch_size` texts at a time, padding each batch only to its longest
+    sequence and running one forward pass under torch.inference_mode().
+    That pass yields the label, the anomaly score and (when any text in the
+    batch asked for it) the CLS embedding together.
+    """
+
+    def __init__(self, batch_size, window_ms, max_length, long_text=False, stride=32, max_windows=8,
+                 aggregation="attention", window_batch=64):
+        if aggregation not in ("max", "mean", "attention"):
+            raise ValueError(f"Unknown window aggregation: {aggregation}")
+        self.batch_size = max(1, batch_size)
+        self.window = window_ms / 1000.0
+        self.max_length = max_length
+        self.long_text = long_text
+        self.stride = min(max(0, stride), max_length - 3)
+        self.max_windows = max(1, max_windows)
+        self.aggregation = aggregation
+        self.window_batch = max(1, window_batch)
+        self._queue = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.stats = {"batches": 0, "texts": 0, "windows": 0, "padded_tokens": 0, "errors": 0,
+                      "inference_seconds": 0.0}
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            if LOCAL_TORCH_THREADS > 0:
+                torch.set_num_threads(LOCAL_TORCH_THREADS)
+            self._queue = queue.Queue()
+            self._pid = os.getpid()
+            threading.Thread(target=self._dispatch_loop, name="local-inference", daemon=True).start()
+
+    def _dispatch_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                results = offload(self.infer, [text for text, _, _ in batch],
+                                  embeddings=any(embedding for _, embedding, _ in batch))
+            except Exception as e:
+                self.stats["errors"] += 1
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, embedding, future), result in zip(batch, results):
+                if not embedding:
+                    result.pop("embedding", None)
+                future.set_result(result)
+
+    def encode_windows(self, texts):
+        """Token windows for a batch of texts: (input_ids, attention_mask, spans).
+
+        Without long-text mode every text is one window truncated to max_length.
+        With it, each text is cut into windows of max_length - 2 tokens that
+        overlap by `stride` tokens; texts needing more than `max_windows` keep
+        that many windows spread evenly over the text. Windows of all texts are
+        padded together; spans[i] is the (start, end) row range of text i.
+        """
+        tok = get_tokenizer()
+        if not self.long_text:
+            encoding = tok(texts, return_tensors='pt', truncation=True, padding='longest', max_length=self.max_length)
+            return encoding['input_ids'], encoding['attention_mask'], [(i, i + 1) for i in range(len(texts))]
+
+        size = self.max_length - 2
+        step = max(1, size - self.stride)
+        windows, spans = [], []
+        for ids in tok(texts, add_special_tokens=False, verbose=False)["input_ids"]:
+            starts = [0]
+            while starts[-1] + size < len(ids):
+                starts.append(starts[-1] + step)
+            if len(starts) > self.max_windows:
+                picks = np.unique(np.linspace(0, len(starts) - 1, self.max_windows).round().astype(int))
+                starts = [starts[i] for i in picks]
+            spans.append((len(windows), len(windows) + len(starts)))
+            windows.extend([tok.cls_token_id] + ids[s:s + size] + [tok.sep_token_id] for s in starts)
+
+        longest = max(len(w) for w in windows)
+        input_ids = torch.full((len(windows), longest), tok.pad_token_id, dtype=torch.long)
+        attention_mask = torch.zeros(len(windows), longest, dtype=torch.long)
+        for i, window in enumerate(windows):
+            input_ids[i, :len(window)] = torch.tensor(window, dtype=torch.long)
+            attention_mask[i, :len(window)] = 1
+        return input_ids, attention_mask, spans
+
+    def aggregate(self, logits, probs, anomaly, embedding, start, end):
+        """Combine the windows start:end of one text into (probs, anomaly, embedding)"""
+        if end - start == 1:
+            return probs[start], anomaly[start], embedding[start] if embedding is not None else None
+        p, a = probs[start:end], anomaly[start:end]
+        if self.aggregation == "max":
+            # most extreme window per label/score; the embedding is the plain mean
+            text_probs = p.max(dim=0).values
+            text_probs = text_probs / text_probs.sum()
+            text_anomaly = a.max()
+            weights = torch.full((end - start,), 1.0 / (end - start), device=p.device)
+        else:
+            if self.aggregation == "mean":
+                weights = torch.full((end - start,), 1.0 / (end - start), device=p.device)
+            else:
+                # attention: windows the classifier is most decided about count most
+                weights = torch.softmax(logits[start:end].max(dim=-1).values, dim=0)
+            text_probs = (weights[:, None] * p).sum(dim=0)
+            text_anomaly = (weights * a).sum()
+        text_embedding = None
+        if embedding is not None:
+            text_embedding = (weights[:, None] * embedding[start:end]).sum(dim=0)
+        return text_probs, text_anomaly, text_embedding
+
+    def infer(self, texts, embeddings=False):
+        """Run the windows of all `texts` through the model as padded batches and aggregate per text"""
+        loaded = load_model()
+        if loaded is None:
+            raise RuntimeError("Local model is not available")
+        input_ids, attention_mask, spans = self.encode_windows(texts)
+        start = time.perf_counter()
+        with torch.inference_mode():
+            chunks = []
+            for first in range(0, len(input_ids), self.window_batch):
+                mask = attention_mask[first:first + self.window_batch]
+                # windows are right-padded, so each slice only needs its own longest width
+                width = int(mask.sum(dim=1).max())
+                chunks.append(loaded.heads(input_ids[first:first + self.window_batch, :width].to(device),
+                                           mask[:, :width].to(device), return_embedding=embeddings))
+            logits = torch.cat([c["logits"] for c in chunks])
+            probs = torch.softmax(logits, dim=-1)
+            if getattr(loaded, "anomaly_head_trained", False) and all(c.get("anomaly_score") is not None
+                                                                      for c in chunks):
+                anomaly = torch.cat([c["anomaly_score"].reshape(-1) for c in chunks])
+            else:
+                # checkpoints trained before the anomaly head was: probability mass on negative emotions
+                anomaly = probs[:, negative_label_mask(label_encoder.classes_).to(probs.device)].sum(dim=-1)
+            embedding = None
+            if embeddings and all(c.get("embedding") is not None for c in chunks):
+                embedding = torch.cat([c["embedding"] for c in chunks]).float()
+            aggregated = [self.aggregate(logits, probs, anomaly, embedding, s, e) for s, e in spans]
+            text_probs = torch.stack([p for p, _, _ in aggregated])
+            confidence, index = text_probs.max(dim=-1)
+        elapsed = time.perf_counter() - start
+        DEPENDENCY_LATENCY.observe(elapsed, "local_model", "forward")
+        self.stats["inference_seconds"] += elapsed
+        self.stats["batches"] += 1
+        self.stats["texts"] += len(texts)
+        self.stats["windows"] += len(input_ids)
+        self.stats["padded_tokens"] += int(input_ids.numel())
+        labels = [str(label).strip() for label in label_encoder.inverse_transform(index.cpu().numpy())]
+        results = []
+        for (first, last), label, conf, (_, text_anomaly, text_embedding) in zip(
+                spans, labels, confidence.tolist(), aggregated):
+            result = {
+                "label": label,
+                "is_negative": label in NEGATIVE_LABELS,
+                "confidence": round(float(conf), 4),
+                "score": round(float(conf), 4),
+                "anomaly_score": round(float(text_anomaly), 4),
+            }
+            if last - first > 1:
+                result["windows"] = last - first
+            if text_embedding is not None:
+                result["embedding"] = text_embedding.cpu().tolist()
+            results.append(result)
+        return results
+
+    def submit(self, text, embedding=False):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((text, embedding, future))
+        return future
+
+    def analyze(self, text, embedding=False):
+        return self.submit(text, embedding).result()
+
+    def analyze_many(self, texts, embeddings=False):
+        futures = [self.submit(text, embeddings) for text in texts]
+        return [future.result() for future in futures]
+
+    def status(self):
+        return dict(self.stats,
+                    batch_size=self.batch_size,
+                    max_length=self.max_length,
+                    long_text=self.long_text,
+                    max_windows=self.max_windows,
+                    aggregation=self.aggregation,
+                    pending=self._queue.qsize() if self._queue is not None else 0)
+
+local_engine = LocalEmotionEngine(LOCAL_BATCH_SIZE, LOCAL_BATCH_WINDOW_MS, LOCAL_MAX_LENGTH,
+                                  long_text=LOCAL_LONG_TEXT, stride=LOCAL_WINDOW_STRIDE,
+                                  max_windows=LOCAL_MAX_WINDOWS, aggregation=LOCAL_WINDOW_AGGREGATION,
+                                  window_batch=LOCAL_WINDOW_BATCH)
+
+# ---------------- Training ----------------
+def evaluate_accuracy(eval_model, label_classes, texts, labels, batch_size=32):
+    """Accuracy of a model on raw texts, comparing label strings so checkpoints with
+    different label orders can be compared on the same validation split"""
+    classes = [str(c).strip() for c in label_classes]
+    correct = 0
+    eval_model.eval()
+    with torch.inference_mode():
+        for start in range(0, len(texts), batch_size):
+            encoding = get_tokenizer()(texts[start:start + batch_size], return_tensors='pt',
+                                       truncation=True, padding='longest', max_length=128)
+            logits = eval_model(encoding['input_ids'].to(device), encoding['attention_mask'].to(device))["logits"]
+            for index, label in zip(logits.argmax(dim=-1).tolist(), labels[start:start + batch_size]):
+                correct += classes[index] == str(label).strip()
+    return correct / len(texts) if texts else 0.0
+
+def validation_mask(texts, fraction):
+    """Held-out rows chosen by a hash of their text rather than a random draw.
+
+    Every job, and so every checkpoint it is compared against, holds out the
+    same rows (duplicated texts included), and rows appended to the dataset
+    later never move existing rows between train and validation.
+    """
+    cutoff = int(fraction * 2 ** 32)
+    return np.array([zlib.crc32(str(text).encode("utf-8")) < cutoff for text in texts], dtype=bool)
+
+def current_checkpoint_accuracy(val_texts, val_labels):
+    """Accuracy of the serving checkpoint on the candidate's validation rows.
+
+    The sidecar's val_accuracy is not reused: it may come from a different
+    split, so the incumbent is always re-scored on the same rows as the candidate.
+    """
+    if not os.path.exists(CHECKPOINT_FILE) and not safetensors_checkpoint_available():
+        return None
+    current, classes = build_model("fp32")
+    accuracy = evaluate_accuracy(current, classes, val_texts, val_labels)
+    del current
+    gc.collect()
+    return accuracy
+
+def training_worker(job_id, config):
+    """Entry point of the training process: fine-tune, checkpoint every epoch, promote if better"""
+    job = read_training_job(job_id)
+    job_dir = training_job_dir(job_id)
+    epoch_checkpoint = os.path.join(job_dir, "epoch_checkpoint.pth")
+    cancel_file = os.path.join(job_dir, "CANCEL")
+    last_write = 0.0
+
+    def update(force=False, **fields):
+        nonlocal last_write
+        job.update(fields)
+        if force or time.monotonic() - last_write >= TRAINING_STATUS_INTERVAL:
+            write_training_job(job)
+            last_write = time.monotonic()
+
+    try:
+        update(force=True, status="running", pid=os.getpid(), started_at=time.time())
+        torch.manual_seed(config["seed"])
+        raw_df = pd.read_csv(TRAINING_DATASET_FILE)
+        token_store, cache_hit = load_token_store(TRAINING_DATASET_FILE, raw_df['text'].tolist())
+        update(force=True, token_cache="hit" if cache_hit else "built")
+        # shuffling keeps the original row index, which is the row id in the token store
+        df = shuffle(raw_df, random_state=config["seed"])
+        held_out = validation_mask(df['text'].tolist(), TRAINING_VALIDATION_SPLIT)
+        val_df, train_df = df[held_out], df[~held_out]
+
+        encoder = LabelEncoder()
+        encoder.fit(df['label'])
+        state = None
+        if config.get("resume_from"):
+            state = load_checkpoint(config["resume_from"], map_location=device)
+            # the labels are encoded below with these classes, so they must be the run's own
+            if list(state['label_encoder_classes']) != list(encoder.classes_):
+                raise ValueError("Dataset labels changed since the interrupted run; start a new job")
+            encoder.classes_ = state['label_encoder_classes']
+        bucketed = config["batching"] == "bucketed"
+        dataset = EmotionDataset(train_df['text'].tolist(), encoder.transform(train_df['label']),
+                                 token_store=token_store, rows=train_df.index.tolist(),
+                                 dynamic_padding=bucketed)
+        if bucketed:
+            sampler = LengthBucketSampler(dataset.lengths(), config["batch_size"], seed=config["seed"])
+            dataloader = DataLoader(dataset, batch_sampler=sampler, collate_fn=pad_collate)
+        else:
+            # reseeded every epoch, so a resumed run shuffles like an uninterrupted one
+            shuffle_generator = torch.Generator()
+            dataloader = DataLoader(dataset, batch_size=config["batch_size"], shuffle=True,
+                                    generator=shuffle_generator)
+        if config["threads"] > 0:
+            torch.set_num_threads(config["threads"])
+        grad_accum = max(1, config["grad_accum"])
+
+        clf = EmotionClassifier(len(encoder.classes_)).to(device)
+        optimizer = AdamW(clf.parameters(), lr=2e-5)
+        start_epoch = 0
+        if state is not None:
+            clf.load_state_dict(state['model_state_dict'])
+            optimizer.load_state_dict(state['optimizer_state_dict'])
+            start_epoch = state['epoch']
+            if bucketed:
+                sampler.epoch = state.get('sampler_epoch', start_epoch)
+            if state.get('rng_state') is not None:
+                torch.set_rng_state(state['rng_state'])
+            del state
+            logger.info("Resuming training job %s from epoch %d", job_id, start_epoch)
+
+        negative_mask = negative_label_mask(encoder.classes_).to(device)
+        epochs = config["epochs"]
+        total_batches = max(1, (epochs - start_epoch) * len(dataloader))
+        done_batches = 0
+        train_start = time.monotonic()
+        val_texts, val_labels = val_df['text'].tolist(), val_df['label'].tolist()
+        val_accuracy = None
+
+        real_tokens = padded_tokens = 0
+        for epoch in range(start_epoch, epochs):
+            if not bucketed:
+                shuffle_generator.manual_seed(config["seed"] + epoch)
+            clf.train()
+            total_loss = 0
+            optimizer.zero_grad()
+            for step, batch in enumerate(dataloader):
+                if os.path.exists(cancel_file):
+                    update(force=True, status="cancelled", finished_at=time.time())
+                    return
+                input_ids = batch['input_ids'].to(device)
+                attention_mask = batch['attention_mask'].to(device)
+                labels_batch = batch['label'].to(device)
+
+                output = clf(input_ids, attention_mask, labels_batch, anomaly_labels=negative_mask[labels_batch])
+                loss = output['loss']
+
+                (loss / grad_accum).backward()
+                if (step + 1) % grad_accum == 0 or step + 1 == len(dataloader):
+                    optimizer.step()
+                    optimizer.zero_grad()
+                total_loss += loss.item()
+
+                done_batches += 1
+                real_tokens += int(attention_mask.sum())
+                padded_tokens += attention_mask.numel()
+                elapsed = time.monotonic() - train_start
+                update(batch=step + 1, batches_per_epoch=len(dataloader),
+                       progress=round(done_batches / total_batches, 4),
+                       eta_seconds=round(elapsed * (total_batches - done_batches) / done_batches, 1),
+                       tokens_per_second=round(real_tokens / elapsed, 1),
+                       padding_ratio=round(1 - real_tokens / padded_tokens, 4))
+
+            val_accuracy = evaluate_accuracy(clf, encoder.classes_, val_texts, val_labels)
+            tmp_path = epoch_checkpoint + ".tmp"
+            torch.save({
+                'model_state_dict': clf.state_dict(),
+                'optimizer_state_dict': optimizer.state_dict(),
+                'label_encoder_classes': encoder.classes_,
+                'num_labels': len(encoder.classes_),
+                'anomaly_head_trained': True,
+                'epoch': epoch + 1,
+                'sampler_epoch': sampler.epoch if bucketed else None,
+                'rng_state': torch.get_rng_state(),
+            }, tmp_path)
+            os.replace(tmp_path, epoch_checkpoint)
+            job["history"].append({"epoch": epoch + 1, "loss": total_loss, "val_accuracy": round(val_accuracy, 4)})
+            update(force=True, epoch=epoch + 1, loss=total_loss, val_accuracy=round(val_accuracy, 4))
+
+        if val_accuracy is None:
+            val_accuracy = evaluate_accuracy(clf, encoder.classes_, val_texts, val_labels)
+        candidate = os.path.join(job_dir, "candidate.pth")
+        candidate_safetensors = os.path.join(job_dir, "candidate.safetensors")
+        torch.save({
+            'model_state_dict': clf.state_dict(),
+            'label_encoder_classes': encoder.classes_,
+            'num_labels': len(encoder.classes_),
+            'anomaly_head_trained': True,
+        }, candidate)
+        save_safetensors_weights(clf.state_dict(), candidate_safetensors)
+        del clf, optimizer
+        gc.collect()
+
+        update(force=True, status="validating")
+        baseline = current_checkpoint_accuracy(val_texts, val_labels)
+        promoted = baseline is None or val_accuracy > baseline
+        if promoted:
+            # new weights under a fresh name, then the sidecar (the switch), then cleanup:
+            # a reader sees either the old pair or the new pair, never a mix
+            previous = read_checkpoint_metadata() if safetensors_checkpoint_available() else None
+            weights = os.path.join(CHECKPOINT_DIR, f"emotion_classifier-{job_id}.safetensors")
+            os.replace(candidate_safetensors, weights)
+            write_checkpoint_metadata(encoder.classes_, {"val_accuracy": val_accuracy,
+                                                         "final_loss": job.get("loss")},
+                                      weights=weights, job_id=job_id, promoted_at=time.time(),
+                                      anomaly_head_trained=True)
+            os.replace(candidate, CHECKPOINT_FILE)
+            if previous is not None and checkpoint_weights_path(previous) != weights:
+                os.remove(checkpoint_weights_path(previous))
+            logger.info("Training job %s promoted to %s (val_accuracy=%.4f, previous=%s)",
+                        job_id, CHECKPOINT_FILE, val_accuracy, baseline)
+        else:
+            logger.info("Training job %s not promoted (val_accuracy=%.4f <= %.4f)", job_id, val_accuracy, baseline)
+            os.remove(candidate)
+            os.remove(candidate_safetensors)
+        if os.path.exists(epoch_checkpoint):
+            os.remove(epoch_checkpoint)
+        update(force=True, status="completed", promoted=promoted, baseline_val_accuracy=baseline,
+               progress=1.0, eta_seconds=0, finished_at=time.time())
+    except Exception as e:
+        logger.exception("Training job %s failed", job_id)
+        update(force=True, status="error", error=str(e), finished_at=time.time())
@@ -0,0 +1,191 @@
+"""Export the trained emotion classifier to smaller serving variants.
+
+Reads CHECKPOINT_FILE (written by /train) and produces:
+  - checkpoints/emotion_classifier_int8.pth  dynamic int8 quantization of all Linear layers
+  - checkpoints/emotion_classifier.onnx      fp32 ONNX graph (only with --onnx;
+                                             serving it needs onnxruntime installed)
+  - checkpoints/emotion_classifier-<hash>.safetensors + .json metadata sidecar
+                                             (only with --safetensors, for checkpoints
+                                             trained before /train wrote them itself;
+                                             a promoted safetensors checkpoint is kept)
+
+and writes checkpoints/export_report.json with size, accuracy and per-text CPU
+latency of each variant measured on emotion_dataset.csv. Select a variant for
+serving with EMOTION_MODEL_VARIANT=fp32|int8|onnx.
+
+Usage:
+    python export_model.py [--onnx] [--safetensors] [--samples 200] [--dataset emotion_dataset.csv]
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import torch
+
+from app import (
+    CHECKPOINT_DIR,
+    CHECKPOINT_FILE,
+    INT8_CHECKPOINT_FILE,
+    LOCAL_MAX_LENGTH,
+    ONNX_MODEL_FILE,
+    checkpoint_weights_path,
+    ensure_checkpoint_available,
+    file_sha256,
+    logger,
+    read_checkpoint_metadata,
+    safetensors_checkpoint_available,
+)
+from emotion_model import (
+    build_model,
+    get_tokenizer,
+    quantize_model,
+    save_safetensors_weights,
+    write_checkpoint_metadata,
+)
+
+REPORT_FILE = os.path.join(CHECKPOINT_DIR, "export_report.json")
+
+
+def export_int8(fp32_model, label_classes, source_sha256):
+    quantized = quantize_model(fp32_model)
+    torch.save({
+        'source_weights_sha256': source_sha256,
+        'model_state_dict': quantized.state_dict(),
+        'label_encoder_classes': label_classes,
+        'num_labels': len(label_classes),
+        'anomaly_head_trained': fp32_model.anomaly_head_trained,
+        'variant': 'int8',
+    }, INT8_CHECKPOINT_FILE)
+    logger.info("int8 model saved to %s", INT8_CHECKPOINT_FILE)
+    return quantized
+
+
+class HeadsOnly(torch.nn.Module):
+    """EmotionClassifier.heads returns a dict; ONNX wants a tuple of plain tensors"""
+
+    def __init__(self, classifier):
+        super().__init__()
+        self.classifier = classifier
+
+    def forward(self, input_ids, attention_mask):
+        outputs = self.classifier.heads(input_ids, attention_mask, return_embedding=True)
+        return outputs["logits"], outputs["anomaly_score"], outputs["embedding"]
+
+
+def export_onnx(fp32_model, label_classes, source_sha256):
+    encoding = get_tokenizer()(["export sample"], return_tensors='pt')
+    torch.onnx.export(
+        # eval() on the wrapper too: export restores its mode, recursively, onto fp32_model
+        HeadsOnly(fp32_model).eval(),
+        (encoding['input_ids'], encoding['attention_mask']),
+        ONNX_MODEL_FILE,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits", "anomaly_score", "embedding"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"},
+            "anomaly_score": {0: "batch"},
+            "embedding": {0: "batch"},
+        },
+        opset_version=14,
+    )
+    with open(ONNX_MODEL_FILE + ".labels.json", "w") as f:
+        json.dump({"label_encoder_classes": [str(c) for c in label_classes],
+                   "anomaly_head_trained": fp32_model.anomaly_head_trained,
+                   "source_weights_sha256": source_sha256}, f)
+    logger.info("ONNX model saved to %s", ONNX_MODEL_FILE)
+
+
+def evaluate(variant_model, label_classes, texts, labels):
+    """Accuracy and batch-of-one latency, the way /analyze calls the model"""
+    tokenizer = get_tokenizer()
+    classes = [str(c).strip() for c in label_classes]
+    latencies = []
+    correct = 0
+    with torch.inference_mode():
+        for text, label in zip(texts, labels):
+            encoding = tokenizer([text], return_tensors='pt', truncation=True, max_length=LOCAL_MAX_LENGTH)
+            start = time.perf_counter()
+            logits = variant_model(encoding['input_ids'], encoding['attention_mask'])["logits"]
+            latencies.append(time.perf_counter() - start)
+            correct += classes[int(logits.argmax(dim=-1)[0])] == label
+    latencies = np.array(latencies) * 1000
+    return {
+        "accuracy": round(correct / len(texts), 4),
+        "latency_ms_mean": round(float(latencies.mean()), 2),
+        "latency_ms_p95": round(float(np.percentile(latencies, 95)), 2),
+    }
+
+
+def file_size_mb(path):
+    return round(os.path.getsize(path) / (1024 * 1024), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--onnx", action="store_true", help="also export an ONNX graph")
+    parser.add_argument("--safetensors", action="store_true",
+                        help="also write the fp32 weights as safetensors with a metadata sidecar")
+    parser.add_argument("--samples", type=int, default=200, help="rows of the dataset used for the report")
+    parser.add_argument("--dataset", default="emotion_dataset.csv")
+    args = parser.parse_args()
+
+    if not ensure_checkpoint_available():
+        raise SystemExit(f"Checkpoint not found at {CHECKPOINT_FILE}")
+
+    df = pd.read_csv(args.dataset).dropna(subset=["text", "label"])
+    df = df.sample(n=min(args.samples, len(df)), random_state=0)
+    texts = df['text'].tolist()
+    labels = df['label'].str.strip().tolist()
+
+    fp32_model, label_classes = build_model("fp32")
+    # exports record which serving weights they were made from; build_model refuses stale ones
+    metadata = read_checkpoint_metadata() if safetensors_checkpoint_available() else None
+    source_sha256 = metadata.get("weights_sha256") if metadata else None
+    report = {"samples": len(texts), "variants": {}}
+    report["variants"]["fp32"] = dict(evaluate(fp32_model, label_classes, texts, labels),
+                                      file=CHECKPOINT_FILE, size_mb=file_size_mb(CHECKPOINT_FILE))
+
+    if args.safetensors and metadata is not None:
+        # build_model already loaded these weights; rewriting them would orphan the
+        # promoted file and drop the sidecar's job id and metrics
+        logger.info("safetensors checkpoint already present (%s); not converting",
+                    checkpoint_weights_path(metadata))
+    elif args.safetensors:
+        # versioned like a /train promotion: weights first, then the sidecar naming them
+        weights = os.path.join(CHECKPOINT_DIR,
+                               f"emotion_classifier-{file_sha256(CHECKPOINT_FILE)[:12]}.safetensors")
+        save_safetensors_weights(fp32_model.state_dict(), weights)
+        # no val_accuracy: the report sample overlaps the training rows, so the
+        # next /train run measures the current model on its own validation split
+        metadata = write_checkpoint_metadata(label_classes, weights=weights, converted_from=CHECKPOINT_FILE,
+                                             anomaly_head_trained=fp32_model.anomaly_head_trained)
+        source_sha256 = metadata["weights_sha256"]
+        logger.info("safetensors weights saved to %s", weights)
+
+    int8_model = export_int8(fp32_model, label_classes, source_sha256)
+    report["variants"]["int8"] = dict(evaluate(int8_model, label_classes, texts, labels),
+                                      file=INT8_CHECKPOINT_FILE, size_mb=file_size_mb(INT8_CHECKPOINT_FILE))
+    del int8_model
+
+    if args.onnx:
+        export_onnx(fp32_model, label_classes, source_sha256)
+        try:
+            onnx_model, _ = build_model("onnx")
+            report["variants"]["onnx"] = dict(evaluate(onnx_model, label_classes, texts, labels),
+                                              file=ONNX_MODEL_FILE, size_mb=file_size_mb(ONNX_MODEL_FILE))
+        except ImportError:
+            logger.warning("onnxruntime is not installed; ONNX model exported without a report entry")
+
+    with open(REPORT_FILE, "w") as f:
+        json.dump(report, f, indent=2)
+    logger.info("Export report written to %s", REPORT_FILE)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
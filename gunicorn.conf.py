@@ -0,0 +1,16 @@
+"""gunicorn settings read automatically by the Dockerfile and Procfile commands.
+
+SERVING_MODE=sync (the default) runs GUNICORN_THREADS request threads per
+worker (gunicorn's gthread worker), keep it at or below DB_POOL_MAX.
+SERVING_MODE=async switches to the gevent worker: each request runs in a
+greenlet, so one process keeps up to ASYNC_WORKER_CONNECTIONS requests in
+flight while they wait on the emotion service or Postgres. app.py applies the
+matching monkey patches when it is imported (also under --preload).
+"""
+import os
+
+if os.getenv("SERVING_MODE", "sync").lower() == "async":
+    worker_class = "gevent"
+    worker_connections = int(os.getenv("ASYNC_WORKER_CONNECTIONS", "1000"))
+else:
+    threads = int(os.getenv("GUNICORN_THREADS", "8"))
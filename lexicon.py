@@ -0,0 +1,129 @@
+"""Compiled emotion lexicon used when no model is available.
+
+The lexicon (emotion_lexicon.json) maps weighted terms, including short
+phrases, to emotions. All terms, negators and clause breaks are compiled into
+one word-boundary regex, so a text is scored in a single left-to-right pass:
+"good" no longer matches "goodbye" and "mad" no longer matches "made". A term
+preceded by a negator within `negation_window` words of the same clause
+("not happy", "don't feel great") moves a share of its weight to the emotion
+given by `negation_map` instead of counting for its own emotion.
+"""
+import json
+import re
+
+NEGATIVE_EMOTIONS = ("sadness", "anger", "fear")
+
+# Used when the lexicon file is missing or unreadable: the keyword lists the
+# fallback has always used, every term with weight 1 and no negation handling
+DEFAULT_LEXICON = {
+    "version": "builtin-1",
+    "negators": [],
+    "negation_window": 0,
+    "negation_weight": 0.0,
+    "negation_map": {},
+    "emotions": {
+        "joy": {t: 1.0 for t in ["happy", "great", "awesome", "wonderful", "amazing", "excited", "love", "good",
+                                 "best", "fantastic", "glad", "excellent", "perfect"]},
+        "sadness": {t: 1.0 for t in ["sad", "down", "depressed", "crying", "hurt", "broken", "lonely", "miss",
+                                     "lost", "disappointed", "upset", "terrible"]},
+        "anger": {t: 1.0 for t in ["angry", "mad", "furious", "hate", "annoyed", "frustrated", "pissed", "rage",
+                                   "irritated", "disgusted"]},
+        "fear": {t: 1.0 for t in ["scared", "afraid", "worried", "anxious", "nervous", "terrified", "panic",
+                                  "frightened", "concerned"]},
+        "surprise": {t: 1.0 for t in ["wow", "surprised", "shocked", "incredible", "unbelievable", "amazing"]},
+        "neutral": {t: 1.0 for t in ["okay", "fine", "normal", "usual", "regular"]},
+    },
+}
+
+
+class LexiconError(ValueError):
+    """A lexicon file that does not have the expected structure"""
+
+
+class EmotionLexicon:
+    def __init__(self, spec):
+        emotions = spec.get("emotions")
+        if not isinstance(emotions, dict) or not emotions:
+            raise LexiconError("lexicon needs a non-empty 'emotions' mapping")
+        self.version = str(spec.get("version", "unversioned"))
+        self.emotions = list(emotions)
+        self.negation_window = int(spec.get("negation_window", 3))
+        self.negation_weight = float(spec.get("negation_weight", 0.5))
+        self.negation_map = dict(spec.get("negation_map", {}))
+        self.negators = {n.lower() for n in spec.get("negators", [])}
+
+        # a term listed under several emotions counts for each of them
+        self.terms = {}
+        for emotion, terms in emotions.items():
+            for term, weight in terms.items():
+                key = " ".join(term.lower().split())
+                self.terms.setdefault(key, []).append((emotion, float(weight)))
+
+        # longest alternatives first so "let down" wins over "down"
+        def alternation(words):
+            return "|".join(r"\s+".join(map(re.escape, w.split())) for w in sorted(words, key=len, reverse=True))
+
+        parts = [r"(?P<term>\b(?:{})\b)".format(alternation(self.terms))]
+        if self.negators:
+            parts.append(r"(?P<neg>\b(?:{})\b)".format(alternation(self.negators)))
+        parts.append(r"(?P<stop>[.!?;:,]|\bbut\b)")
+        parts.append(r"(?P<word>[\w']+)")
+        self.pattern = re.compile("|".join(parts), re.IGNORECASE)
+
+    @classmethod
+    def from_file(cls, path):
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def scores(self, text):
+        """Weighted score per emotion for one text"""
+        scores = dict.fromkeys(self.emotions, 0.0)
+        words = 0
+        negated_at = None
+        for match in self.pattern.finditer(text.replace("’", "'")):
+            kind = match.lastgroup
+            if kind == "stop":
+                negated_at = None
+                continue
+            words += 1
+            if kind == "neg" or (kind == "word" and self.negators and match.group().lower().endswith("n't")):
+                negated_at = words
+                continue
+            if kind != "term":
+                continue
+            negated = negated_at is not None and words - negated_at <= self.negation_window
+            for emotion, weight in self.terms[" ".join(match.group().lower().split())]:
+                if not negated:
+                    scores[emotion] += weight
+                elif self.negation_map.get(emotion) in scores:
+                    scores[self.negation_map[emotion]] += weight * self.negation_weight
+        return scores
+
+    def analyze(self, text):
+        """Emotion result in the same shape as the model-backed paths"""
+        scores = self.scores(text)
+        label = max(scores, key=scores.get)
+        # fixed values: risk scoring reads confidence as the anomaly score and
+        # its thresholds were set against the keyword fallback's 0.7 / 0.5
+        confidence = 0.7 if scores[label] > 0 else 0.5
+        if scores[label] <= 0:
+            label = "neutral"
+        return {
+            "label": label,
+            "is_negative": label in NEGATIVE_EMOTIONS,
+            "confidence": confidence,
+            "score": confidence  # For backward compatibility
+        }
+
+    def analyze_many(self, texts):
+        return [self.analyze(text) for text in texts]
+
+
+def load_lexicon(path, logger=None):
+    """Load a lexicon file, falling back to the built-in keyword lists"""
+    try:
+        return EmotionLexicon.from_file(path)
+    except (OSError, ValueError) as e:
+        if logger is not None:
+            logger.warning("Emotion lexicon %s unavailable, using built-in keywords: %s", path, e)
+        return EmotionLexicon(DEFAULT_LEXICON)
@@ -113,17 +113,194 @@ CREATE TABLE IF NOT EXISTS wellbeing_results (
 ----------------------------------------------------------
 CREATE INDEX IF NOT EXISTS idx_posts_space ON posts(space);
 CREATE INDEX IF NOT EXISTS idx_posts_created_at ON posts(created_at);
+CREATE INDEX IF NOT EXISTS idx_posts_space_created_at_id ON posts(space, created_at DESC, id DESC);
 CREATE INDEX IF NOT EXISTS idx_comments_post_id ON comments(post_id);
+CREATE INDEX IF NOT EXISTS idx_comments_post_id_created_at ON comments(post_id, created_at, id);
 CREATE INDEX IF NOT EXISTS idx_comments_user_name ON comments(user_name);
-CREATE INDEX IF NOT EXISTS idx_anxiety_results_user_name ON anxiety_results(user_name);
 CREATE INDEX IF NOT EXISTS idx_anxiety_results_created_at ON anxiety_results(created_at);
-CREATE INDEX IF NOT EXISTS idx_depression_results_user_name ON depression_results(user_name);
 CREATE INDEX IF NOT EXISTS idx_depression_results_created_at ON depression_results(created_at);
-CREATE INDEX IF NOT EXISTS idx_personality_results_user_name ON personality_results(user_name);
 CREATE INDEX IF NOT EXISTS idx_personality_results_created_at ON personality_results(created_at);
-CREATE INDEX IF NOT EXISTS idx_wellbeing_results_user_name ON wellbeing_results(user_name);
 CREATE INDEX IF NOT EXISTS idx_wellbeing_results_created_at ON wellbeing_results(created_at);
 
+-- per-user history (GET /users/<user_name>/history): keyset order plus the summary
+-- columns, so each instrument's page is an index-only scan. These replace the
+-- plain user_name indexes, which are a prefix of them.
+DROP INDEX IF EXISTS idx_anxiety_results_user_name;
+DROP INDEX IF EXISTS idx_depression_results_user_name;
+DROP INDEX IF EXISTS idx_personality_results_user_name;
+DROP INDEX IF EXISTS idx_wellbeing_results_user_name;
+CREATE INDEX IF NOT EXISTS idx_anxiety_results_user_history
+    ON anxiety_results(user_name, created_at DESC, id DESC)
+    INCLUDE (score, final_risk, is_high_risk, lr_score, bert_anomaly_score);
+CREATE INDEX IF NOT EXISTS idx_depression_results_user_history
+    ON depression_results(user_name, created_at DESC, id DESC)
+    INCLUDE (score, risk_level, is_high_risk, lr_score, bert_anomaly_score, hybrid_risk_score);
+CREATE INDEX IF NOT EXISTS idx_personality_results_user_history
+    ON personality_results(user_name, created_at DESC, id DESC)
+    INCLUDE (extraversion, agreeableness, neuroticism, openness, conscientiousness,
+             risk_level, is_high_risk, hybrid_score);
+CREATE INDEX IF NOT EXISTS idx_wellbeing_results_user_history
+    ON wellbeing_results(user_name, created_at DESC, id DESC)
+    INCLUDE (score, percentage, risk_level, is_high_risk, lr_score, hybrid_score);
+
+----------------------------------------------------------
+-- 📊 DASHBOARD ROLLUPS (GET /stats)
+----------------------------------------------------------
+-- Daily counts kept up to date by statement-level triggers, so dashboard
+-- queries read one row per day x instrument x risk level (or day x space x
+-- emotion) instead of scanning the result tables. A statement touches each
+-- rollup row once however many rows it inserts, so bulk inserts from the
+-- result writer and CSV imports stay cheap. Updates to existing rows are not
+-- tracked; run SELECT rebuild_dashboard_rollups(); after editing rows by hand.
+CREATE TABLE IF NOT EXISTS risk_daily_rollup (
+    day DATE NOT NULL,
+    instrument VARCHAR(10) NOT NULL,
+    risk_level VARCHAR(100) NOT NULL,
+    results INTEGER NOT NULL DEFAULT 0,
+    high_risk INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, instrument, risk_level)
+);
+
+CREATE TABLE IF NOT EXISTS emotion_daily_rollup (
+    day DATE NOT NULL,
+    space VARCHAR(50) NOT NULL,
+    source VARCHAR(10) NOT NULL CHECK (source IN ('post', 'comment')),
+    emotion VARCHAR(50) NOT NULL,
+    items INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (day, space, source, emotion)
+);
+
+-- rollup_risk_results(instrument, risk column): fired once per INSERT/DELETE statement
+CREATE OR REPLACE FUNCTION rollup_risk_results() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    EXECUTE format($sql$
+        INSERT INTO risk_daily_rollup AS r (day, instrument, risk_level, results, high_risk)
+        SELECT (created_at AT TIME ZONE 'UTC')::date, %L, COALESCE(%I, 'Unknown'),
+               $1 * COUNT(*), $1 * COUNT(*) FILTER (WHERE is_high_risk)
+        FROM %I
+        GROUP BY 1, 3
+        ON CONFLICT (day, instrument, risk_level) DO UPDATE
+        SET results = r.results + EXCLUDED.results, high_risk = r.high_risk + EXCLUDED.high_risk
+    $sql$, TG_ARGV[0], TG_ARGV[1], CASE TG_OP WHEN 'DELETE' THEN 'old_rows' ELSE 'new_rows' END)
+    USING CASE TG_OP WHEN 'DELETE' THEN -1 ELSE 1 END;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION rollup_posts() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO emotion_daily_rollup AS r (day, space, source, emotion, items)
+        SELECT (created_at AT TIME ZONE 'UTC')::date, space, 'post', COALESCE(emotion, 'neutral'), COUNT(*)
+        FROM new_rows GROUP BY 1, 2, 4
+        ON CONFLICT (day, space, source, emotion) DO UPDATE SET items = r.items + EXCLUDED.items;
+    ELSE
+        INSERT INTO emotion_daily_rollup AS r (day, space, source, emotion, items)
+        SELECT (created_at AT TIME ZONE 'UTC')::date, space, 'post', COALESCE(emotion, 'neutral'), -COUNT(*)
+        FROM old_rows GROUP BY 1, 2, 4
+        ON CONFLICT (day, space, source, emotion) DO UPDATE SET items = r.items + EXCLUDED.items;
+    END IF;
+    RETURN NULL;
+END $$;
+
+-- comments take the space of their post
+CREATE OR REPLACE FUNCTION rollup_comments() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        INSERT INTO emotion_daily_rollup AS r (day, space, source, emotion, items)
+        SELECT (c.created_at AT TIME ZONE 'UTC')::date, p.space, 'comment', COALESCE(c.emotion, 'neutral'), COUNT(*)
+        FROM new_rows c JOIN posts p ON p.id = c.post_id GROUP BY 1, 2, 4
+        ON CONFLICT (day, space, source, emotion) DO UPDATE SET items = r.items + EXCLUDED.items;
+    ELSE
+        -- comments removed by a post's ON DELETE CASCADE no longer find their post;
+        -- rollup_post_comments_delete has already subtracted them
+        INSERT INTO emotion_daily_rollup AS r (day, space, source, emotion, items)
+        SELECT (c.created_at AT TIME ZONE 'UTC')::date, p.space, 'comment', COALESCE(c.emotion, 'neutral'), -COUNT(*)
+        FROM old_rows c JOIN posts p ON p.id = c.post_id GROUP BY 1, 2, 4
+        ON CONFLICT (day, space, source, emotion) DO UPDATE SET items = r.items + EXCLUDED.items;
+    END IF;
+    RETURN NULL;
+END $$;
+
+CREATE OR REPLACE FUNCTION rollup_post_comments_delete() RETURNS trigger LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO emotion_daily_rollup AS r (day, space, source, emotion, items)
+    SELECT (created_at AT TIME ZONE 'UTC')::date, OLD.space, 'comment', COALESCE(emotion, 'neutral'), -COUNT(*)
+    FROM comments WHERE post_id = OLD.id GROUP BY 1, 4
+    ON CONFLICT (day, space, source, emotion) DO UPDATE SET items = r.items + EXCLUDED.items;
+    RETURN OLD;
+END $$;
+
+-- full recount; run once after creating the triggers (and after manual edits)
+CREATE OR REPLACE FUNCTION rebuild_dashboard_rollups() RETURNS void LANGUAGE sql AS $$
+    LOCK TABLE anxiety_results, depression_results, personality_results, wellbeing_results, posts, comments
+        IN SHARE MODE;
+    TRUNCATE risk_daily_rollup, emotion_daily_rollup;
+    INSERT INTO risk_daily_rollup (day, instrument, risk_level, results, high_risk)
+    SELECT day, instrument, risk_level, COUNT(*), COUNT(*) FILTER (WHERE is_high_risk)
+    FROM (
+        SELECT (created_at AT TIME ZONE 'UTC')::date AS day, 'gad7' AS instrument,
+               COALESCE(final_risk, 'Unknown') AS risk_level, is_high_risk FROM anxiety_results
+        UNION ALL
+        SELECT (created_at AT TIME ZONE 'UTC')::date, 'phq9', COALESCE(risk_level, 'Unknown'), is_high_risk
+        FROM depression_results
+        UNION ALL
+        SELECT (created_at AT TIME ZONE 'UTC')::date, 'bfi10', COALESCE(risk_level, 'Unknown'), is_high_risk
+        FROM personality_results
+        UNION ALL
+        SELECT (created_at AT TIME ZONE 'UTC')::date, 'who5', COALESCE(risk_level, 'Unknown'), is_high_risk
+        FROM wellbeing_results
+    ) results
+    GROUP BY 1, 2, 3;
+    INSERT INTO emotion_daily_rollup (day, space, source, emotion, items)
+    SELECT (created_at AT TIME ZONE 'UTC')::date, space, 'post', COALESCE(emotion, 'neutral'), COUNT(*)
+    FROM posts GROUP BY 1, 2, 4;
+    INSERT INTO emotion_daily_rollup (day, space, source, emotion, items)
+    SELECT (c.created_at AT TIME ZONE 'UTC')::date, p.space, 'comment', COALESCE(c.emotion, 'neutral'), COUNT(*)
+    FROM comments c JOIN posts p ON p.id = c.post_id GROUP BY 1, 2, 4;
+$$;
+
+DROP TRIGGER IF EXISTS anxiety_results_rollup_insert ON anxiety_results;
+CREATE TRIGGER anxiety_results_rollup_insert AFTER INSERT ON anxiety_results
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_risk_results('gad7', 'final_risk');
+DROP TRIGGER IF EXISTS anxiety_results_rollup_delete ON anxiety_results;
+CREATE TRIGGER anxiety_results_rollup_delete AFTER DELETE ON anxiety_results
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_risk_results('gad7', 'final_risk');
+DROP TRIGGER IF EXISTS depression_results_rollup_insert ON depression_results;
+CREATE TRIGGER depression_results_rollup_insert AFTER INSERT ON depression_results
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_risk_results('phq9', 'risk_level');
+DROP TRIGGER IF EXISTS depression_results_rollup_delete ON depression_results;
+CREATE TRIGGER depression_results_rollup_delete AFTER DELETE ON depression_results
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_risk_results('phq9', 'risk_level');
+DROP TRIGGER IF EXISTS personality_results_rollup_insert ON personality_results;
+CREATE TRIGGER personality_results_rollup_insert AFTER INSERT ON personality_results
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_risk_results('bfi10', 'risk_level');
+DROP TRIGGER IF EXISTS personality_results_rollup_delete ON personality_results;
+CREATE TRIGGER personality_results_rollup_delete AFTER DELETE ON personality_results
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_risk_results('bfi10', 'risk_level');
+DROP TRIGGER IF EXISTS wellbeing_results_rollup_insert ON wellbeing_results;
+CREATE TRIGGER wellbeing_results_rollup_insert AFTER INSERT ON wellbeing_results
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_risk_results('who5', 'risk_level');
+DROP TRIGGER IF EXISTS wellbeing_results_rollup_delete ON wellbeing_results;
+CREATE TRIGGER wellbeing_results_rollup_delete AFTER DELETE ON wellbeing_results
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_risk_results('who5', 'risk_level');
+DROP TRIGGER IF EXISTS posts_rollup_insert ON posts;
+CREATE TRIGGER posts_rollup_insert AFTER INSERT ON posts
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_posts();
+DROP TRIGGER IF EXISTS posts_rollup_delete ON posts;
+CREATE TRIGGER posts_rollup_delete AFTER DELETE ON posts
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_posts();
+DROP TRIGGER IF EXISTS posts_rollup_comments_delete ON posts;
+CREATE TRIGGER posts_rollup_comments_delete BEFORE DELETE ON posts
+    FOR EACH ROW EXECUTE FUNCTION rollup_post_comments_delete();
+DROP TRIGGER IF EXISTS comments_rollup_insert ON comments;
+CREATE TRIGGER comments_rollup_insert AFTER INSERT ON comments
+    REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_comments();
+DROP TRIGGER IF EXISTS comments_rollup_delete ON comments;
+CREATE TRIGGER comments_rollup_delete AFTER DELETE ON comments
+    REFERENCING OLD TABLE AS old_rows FOR EACH STATEMENT EXECUTE FUNCTION rollup_comments();
+
+SELECT rebuild_dashboard_rollups();
+
 ----------------------------------------------------------
 -- 🧾 SAMPLE DATA (optional, safe to remove later)
 ----------------------------------------------------------
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# importing app never connects to Postgres (the pool is created lazily); keep
+# any accidental connection attempt local and fast
+os.environ.setdefault("DB_HOST", "127.0.0.1")
+os.environ.setdefault("DB_PORT", "1")
+os.environ.setdefault("DB_SSL_DISABLED", "1")
+os.environ.setdefault("ASYNC_RESULT_WRITES", "0")
+os.environ.setdefault("EMOTION_API_URL", "http://127.0.0.1:1/analyze")
+
+TINY_VOCAB = ["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]", "i", "feel", "so", "sad", "happy", "angry",
+              "calm", "today", "and", "the", "day", "was", "long", "export", "sample", "very", "much"]
+TINY_LABELS = ["anger", "joy", "sadness"]
+
+
+@pytest.fixture
+def tiny_ml(tmp_path, monkeypatch):
+    """emotion_model wired to a 1-layer BERT, a 22-word tokenizer and tmp checkpoint paths.
+
+    Everything runs offline on CPU in well under a second; tests using it are
+    skipped where torch/transformers are not installed.
+    """
+    pytest.importorskip("torch")
+    transformers = pytest.importorskip("transformers")
+    pytest.importorskip("sklearn")
+    pytest.importorskip("pandas")
+    import app
+    import emotion_model
+
+    vocab_file = tmp_path / "vocab.txt"
+    vocab_file.write_text("\n".join(TINY_VOCAB) + "\n")
+    tokenizer = transformers.BertTokenizer(str(vocab_file))
+    config = transformers.BertConfig(vocab_size=len(TINY_VOCAB), hidden_size=16, num_hidden_layers=1,
+                                     num_attention_heads=2, intermediate_size=32, max_position_embeddings=64)
+    monkeypatch.setattr(emotion_model, "tokenizer", tokenizer)
+    monkeypatch.setattr(emotion_model.AutoConfig, "from_pretrained", staticmethod(lambda *args, **kwargs: config))
+
+    checkpoints = tmp_path / "checkpoints"
+    checkpoints.mkdir()
+    paths = {
+        "CHECKPOINT_DIR": str(checkpoints),
+        "CHECKPOINT_FILE": str(checkpoints / "emotion_classifier.pth"),
+        "CHECKPOINT_METADATA_FILE": str(checkpoints / "emotion_classifier.json"),
+        "CHECKPOINT_SAFETENSORS_FILE": str(checkpoints / "emotion_classifier.safetensors"),
+        "INT8_CHECKPOINT_FILE": str(checkpoints / "emotion_classifier_int8.pth"),
+        "ONNX_MODEL_FILE": str(checkpoints / "emotion_classifier.onnx"),
+    }
+    for name, value in paths.items():
+        monkeypatch.setattr(app, name, value)
+        monkeypatch.setattr(emotion_model, name, value)
+    monkeypatch.setattr(emotion_model, "TOKEN_CACHE_DIR", str(checkpoints / "token_cache"))
+
+    encoder = emotion_model.LabelEncoder().fit(TINY_LABELS)
+    monkeypatch.setattr(emotion_model, "label_encoder", encoder)
+    emotion_model.torch.manual_seed(0)
+    return emotion_model
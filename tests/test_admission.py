@@ -0,0 +1,63 @@
+import threading
+import time
+
+import app
+
+
+def wait_for(predicate, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def queue_in_thread(gate, admission_class, outcomes, bounded=True):
+    def run():
+        try:
+            token = gate.acquire(admission_class, bounded=bounded)
+        except app.AdmissionRejected as e:
+            outcomes[admission_class] = e.reason
+            return
+        outcomes[admission_class] = "admitted"
+        gate.release(token)
+
+    before = gate.status()["queued"]
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    wait_for(lambda: gate.status()["queued"] > before or admission_class in outcomes)
+    return thread
+
+
+def test_clinical_evicts_community_but_never_background():
+    gate = app.PriorityGate("test", limit=1, max_queue=1, max_wait=2)
+    held = gate.acquire("clinical")
+    outcomes = {}
+    threads = [queue_in_thread(gate, "background", outcomes, bounded=False),
+               queue_in_thread(gate, "community", outcomes)]
+    threads.append(queue_in_thread(gate, "clinical", outcomes))
+    wait_for(lambda: "community" in outcomes)
+
+    assert outcomes == {"community": "evicted"}
+    gate.release(held)
+    for thread in threads:
+        thread.join(timeout=2)
+    assert outcomes == {"community": "evicted", "clinical": "admitted", "background": "admitted"}
+
+
+def test_background_waiters_do_not_fill_the_queue():
+    gate = app.PriorityGate("test", limit=1, max_queue=1, max_wait=2)
+    held = gate.acquire("clinical")
+    outcomes = {}
+    threads = [queue_in_thread(gate, "background", outcomes, bounded=False),
+               queue_in_thread(gate, "community", outcomes)]
+
+    assert outcomes == {}
+    gate.release(held)
+    for thread in threads:
+        thread.join(timeout=2)
+    assert outcomes == {"community": "admitted", "background": "admitted"}
+
+
+def test_route_classes_name_real_endpoints():
+    assert set(app.ROUTE_CLASSES) <= set(app.app.view_functions)
+    assert set(app.ROUTE_CLASSES.values()) <= set(app.route_gates)
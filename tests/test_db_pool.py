@@ -0,0 +1,13 @@
+import app
+
+
+def test_pool_timeout_is_a_503_with_retry_after(monkeypatch):
+    def busy():
+        raise app.PoolTimeout("No database connection available after 10s")
+    monkeypatch.setattr(app.db_pool, "getconn", busy)
+
+    response = app.app.test_client().get("/posts/Community Support")
+
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+
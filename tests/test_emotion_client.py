@@ -0,0 +1,34 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import app
+from benchmark import StubSpace
+
+
+@pytest.fixture
+def single_text_stub():
+    stub = StubSpace(latency_ms=20, jitter_ms=0, failure_rate=0.0, batch=False).start()
+    yield stub
+    stub.stop()
+
+
+def make_client(url):
+    return app.EmotionServiceClient(
+        url, 5, 16, 20, app.TTLCache(100, 60), app.CircuitBreaker(2, 30), app.LatencyTracker(2, 5, 3))
+
+
+def test_batch_rejection_falls_back_to_single_texts(single_text_stub):
+    client = make_client(single_text_stub.url)
+    texts = [f"text number {i}" for i in range(8)]
+    with ThreadPoolExecutor(len(texts)) as pool:
+        results = list(pool.map(client.analyze, texts))
+
+    assert results == [StubSpace.classify(text) for text in texts]
+    assert client.batch_supported is False
+    assert client.breaker.state == "closed"
+    assert single_text_stub.stats["texts"] == len(texts)
+
+    # later batches go straight to single-text calls
+    assert client.analyze_many(["another one", "and another"]) == [
+        StubSpace.classify("another one"), StubSpace.classify("and another")]
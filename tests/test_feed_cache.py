@@ -0,0 +1,26 @@
+import app
+
+
+def test_invalidation_hides_only_the_written_space():
+    cache = app.FeedCache(app.MemoryFeedBackend(16, 60))
+    support, actions = cache.key("Community Support", 20), cache.key("Suggested Actions", 20)
+    cache.set(support, "[]", None)
+    cache.set(actions, "[]", None)
+
+    cache.invalidate("Community Support")
+
+    assert cache.get(cache.key("Community Support", 20)) is None
+    assert cache.get(cache.key("Suggested Actions", 20))["body"] == "[]"
+    status = cache.status()
+    assert (status["hits"], status["misses"], status["invalidations"], status["size"]) == (1, 1, 1, 2)
+
+
+def test_unreachable_backend_size_is_reported_as_unknown():
+    class Down(app.MemoryFeedBackend):
+        def size(self):
+            raise ConnectionError("redis down")
+    cache = app.FeedCache(Down(16, 60))
+
+    assert cache.status()["size"] is None
+    assert cache.stats["errors"] == 1
+    assert "feed_cache_entries" in app.render_metrics()
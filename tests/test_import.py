@@ -0,0 +1,98 @@
+import io
+
+import pytest
+
+import app
+
+
+@pytest.fixture
+def copied(monkeypatch):
+    """Rows handed to COPY, per table, instead of a database"""
+    tables = {}
+    monkeypatch.setattr(app, "copy_rows", lambda table, columns, rows: tables.setdefault(table, []).extend(rows))
+    monkeypatch.setattr(app, "analyze_texts", app.keyword_emotions)
+    return tables
+
+
+def new_job():
+    return {"rows_written": 0, "rows_failed": 0, "tables": {}, "errors": []}
+
+
+def test_who5_rows_without_answers_are_rejected(copied):
+    job = new_job()
+    app.import_assessments("who5", [
+        {"q1": "3", "q2": "4", "q3": "2", "q4": "5", "q5": "3", "text": "ok"},
+        {"text": "no answers at all"},
+        {"answers": '[1, 2, "x", 4, 5]', "text": "non-numeric"},
+    ], job)
+
+    assert job["rows_written"] == 1
+    assert job["rows_failed"] == 2
+    assert len(job["errors"]) == 2
+    assert len(copied["wellbeing_results"]) == 1
+
+
+def test_bad_created_at_only_rejects_its_row(copied):
+    job = new_job()
+    app.import_assessments("gad7", [
+        {"answers": "[1, 1, 1, 1, 1, 1, 1]", "created_at": "2026-01-02T03:04:05Z"},
+        {"answers": "[1, 1, 1, 1, 1, 1, 1]", "created_at": "yesterday"},
+    ], job)
+    app.import_posts([
+        {"text": "hello", "created_at": "2026-01-02 03:04:05"},
+        {"text": "again", "created_at": "32/13/2026"},
+    ], job)
+
+    assert job["rows_written"] == 2
+    assert job["rows_failed"] == 2
+    assert copied["anxiety_results"][0][-1] == "2026-01-02T03:04:05+00:00"
+    assert copied["posts"][0][-1] == "2026-01-02T03:04:05"
+
+
+def test_import_status_is_shared_through_the_job_file(copied, monkeypatch, tmp_path):
+    monkeypatch.setattr(app, "IMPORT_DIR", str(tmp_path))
+    client = app.app.test_client()
+    csv_data = b"instrument,q1,q2,q3,q4,q5\nwho5,1,2,3,4,5\nwho5,,,,,\n"
+    response = client.post("/upload_csv", data={"file": (io.BytesIO(csv_data), "results.csv")})
+    assert response.status_code == 202
+    job_id = response.get_json()["job_id"]
+    app.import_executor.submit(lambda: None).result(timeout=10)
+
+    # what another worker would see: only the file on disk
+    job = app.read_import_job(job_id)
+    assert job["status"] == "completed"
+    assert (job["rows_read"], job["rows_written"], job["rows_failed"]) == (2, 1, 1)
+    status = client.get(f"/upload_csv/{job_id}").get_json()
+    assert status["rows_written"] == 1
+    assert client.get("/upload_csv/unknown").status_code == 404
+
+
+def test_bad_score_or_space_only_rejects_its_row(copied):
+    job = new_job()
+    app.import_assessments("who5", [
+        {"answers": "[1, 2, 3, 4, 5]", "score": "12"},
+        {"answers": "[1, 2, 3, 4, 5]", "score": "twelve"},
+    ], job)
+    app.import_posts([
+        {"text": "hello", "space": "Suggested Actions"},
+        {"text": "where", "space": "Nowhere"},
+        {"text": "   "},
+    ], job)
+
+    assert job["rows_written"] == 2
+    assert job["rows_failed"] == 3
+    assert copied["wellbeing_results"][0][1] == 12
+    assert copied["posts"][0][1] == "Suggested Actions"
+    assert job["errors"][-1] == "post: empty text"
+
+
+def test_failed_chunk_counts_each_row_once(copied, monkeypatch):
+    def broken(table, columns, rows):
+        raise RuntimeError("COPY failed")
+    monkeypatch.setattr(app, "copy_rows", broken)
+    job = dict(new_job(), default_kind="gad7")
+    app.flush_import_batch([{"answers": "[1, 1, 1, 1, 1, 1, 1]"}, {"answers": "[1]"},
+                            {"answers": "[2, 2, 2, 2, 2, 2, 2]"}], job)
+
+    assert job["rows_failed"] == 3
+    assert job["rows_written"] == 0
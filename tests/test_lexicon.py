@@ -0,0 +1,20 @@
+import app
+from lexicon import DEFAULT_LEXICON, EmotionLexicon
+
+
+def test_confidence_is_fixed_for_risk_scoring():
+    lexicon = EmotionLexicon.from_file(app.EMOTION_LEXICON_FILE)
+    mixed = lexicon.analyze("I feel sad but also happy and a bit anxious")
+    single = lexicon.analyze("I feel so hopeless")
+    nothing = lexicon.analyze("the meeting is on tuesday")
+
+    assert mixed["confidence"] == single["confidence"] == 0.7
+    assert nothing == {"label": "neutral", "is_negative": False, "confidence": 0.5, "score": 0.5}
+
+
+def test_negative_lexicon_result_crosses_the_risk_threshold_as_before():
+    result = EmotionLexicon(DEFAULT_LEXICON).analyze("I feel sad and alone")
+    assert result["is_negative"]
+    # a 0.4 questionnaire score is High only because of the text's 0.7
+    assert (0.4 + app.emotion_anomaly_score(result)) / 2 >= 0.5
+    assert (0.4 + app.emotion_anomaly_score({"label": "neutral", "is_negative": False})) / 2 < 0.5
@@ -0,0 +1,242 @@
+"""CPU smoke tests for the torch side (emotion_model.py, export_model.py).
+
+They run a 1-layer BERT through the real code paths and are skipped where
+torch and transformers are not installed (see the tiny_ml fixture).
+"""
+import os
+
+import pytest
+
+from conftest import TINY_LABELS
+
+TINY_CLASSES = sorted(TINY_LABELS)
+
+
+@pytest.fixture
+def tiny_model(tiny_ml, monkeypatch):
+    model = tiny_ml.EmotionClassifier(3, pretrained=False).eval()
+    model.anomaly_head_trained = True
+    monkeypatch.setattr(tiny_ml, "load_model", lambda: model)
+    return model
+
+
+def test_local_engine_batches_texts_into_results(tiny_ml, tiny_model):
+    engine = tiny_ml.LocalEmotionEngine(batch_size=4, window_ms=1, max_length=16)
+
+    results = engine.infer(["i feel sad", "happy", "the day was long and i feel angry"], embeddings=True)
+
+    assert [sorted(r) for r in results] == [["anomaly_score", "confidence", "embedding", "is_negative",
+                                             "label", "score"]] * 3
+    assert all(r["label"] in ("anger", "joy", "sadness") and 0 <= r["anomaly_score"] <= 1 for r in results)
+    assert len(results[0]["embedding"]) == 16
+    assert engine.stats["batches"] == 1 and engine.stats["texts"] == 3
+
+
+def promote(tiny_ml, state_dict, name):
+    """Write weights and the sidecar naming them, like a /train promotion"""
+    weights = f"{tiny_ml.CHECKPOINT_DIR}/emotion_classifier-{name}.safetensors"
+    tiny_ml.save_safetensors_weights(state_dict, weights)
+    return tiny_ml.write_checkpoint_metadata(TINY_CLASSES, weights=weights, anomaly_head_trained=True)
+
+
+def encode(tiny_ml, texts):
+    encoding = tiny_ml.get_tokenizer()(texts, return_tensors="pt", padding="longest")
+    return encoding["input_ids"], encoding["attention_mask"]
+
+
+@pytest.fixture
+def exporter(tiny_ml, monkeypatch):
+    import export_model
+    monkeypatch.setattr(export_model, "INT8_CHECKPOINT_FILE", tiny_ml.INT8_CHECKPOINT_FILE)
+    monkeypatch.setattr(export_model, "ONNX_MODEL_FILE", tiny_ml.ONNX_MODEL_FILE)
+    monkeypatch.setattr(export_model, "CHECKPOINT_FILE", tiny_ml.CHECKPOINT_FILE)
+    monkeypatch.setattr(export_model, "CHECKPOINT_DIR", tiny_ml.CHECKPOINT_DIR)
+    monkeypatch.setattr(export_model, "REPORT_FILE", f"{tiny_ml.CHECKPOINT_DIR}/export_report.json")
+    monkeypatch.setattr(export_model, "ensure_checkpoint_available", lambda: True)
+    return export_model
+
+
+def test_int8_export_loads_and_is_refused_once_stale(tiny_ml, tiny_model, exporter):
+    metadata = promote(tiny_ml, tiny_model.state_dict(), "a")
+    exporter.export_int8(tiny_model, TINY_CLASSES, metadata["weights_sha256"])
+
+    int8_model, labels = tiny_ml.build_model("int8")
+    assert "quantized" in type(int8_model.classifier).__module__
+    assert list(labels) == TINY_CLASSES
+    input_ids, attention_mask = encode(tiny_ml, ["i feel sad today"])
+    with tiny_ml.torch.inference_mode():
+        expected = tiny_model(input_ids, attention_mask)["logits"]
+        assert tiny_ml.torch.allclose(int8_model(input_ids, attention_mask)["logits"], expected, atol=0.1)
+
+    retrained = dict(tiny_model.state_dict())
+    retrained["classifier.bias"] = retrained["classifier.bias"] + 1
+    promote(tiny_ml, retrained, "b")
+    fallback, _ = tiny_ml.build_model("int8")
+    assert "quantized" not in type(fallback.classifier).__module__
+
+
+def test_onnx_export_matches_the_torch_heads(tiny_ml, tiny_model, exporter):
+    pytest.importorskip("onnx")
+    pytest.importorskip("onnxruntime")
+    metadata = promote(tiny_ml, tiny_model.state_dict(), "a")
+    exporter.export_onnx(tiny_model, TINY_CLASSES, metadata["weights_sha256"])
+
+    onnx_model, labels = tiny_ml.build_model("onnx")
+    input_ids, attention_mask = encode(tiny_ml, ["i feel sad today", "happy"])
+    with tiny_ml.torch.inference_mode():
+        expected = tiny_model.heads(input_ids, attention_mask, return_embedding=True)
+    actual = onnx_model.heads(input_ids, attention_mask, return_embedding=True)
+    for name in ("logits", "anomaly_score", "embedding"):
+        assert tiny_ml.torch.allclose(actual[name], expected[name], atol=1e-4), name
+    assert list(labels) == TINY_CLASSES
+
+
+def test_token_cache_is_built_once_and_memory_mapped(tiny_ml, tmp_path):
+    texts = ["i feel sad", "the day was very very very long and i feel so sad today", "happy"]
+    dataset = tmp_path / "dataset.csv"
+    dataset.write_text("text,label\n" + "".join(f"{text},sadness\n" for text in texts))
+
+    store, hit = tiny_ml.load_token_store(str(dataset), texts, max_length=8)
+    again, hit_again = tiny_ml.load_token_store(str(dataset), texts, max_length=8)
+
+    assert (hit, hit_again) == (False, True)
+    assert isinstance(again.input_ids, tiny_ml.np.memmap)
+    expected = tiny_ml.get_tokenizer()(texts, truncation=True, max_length=8)["input_ids"]
+    assert [again.tokens(row).tolist() for row in range(len(again))] == expected
+    assert len(store) == 3
+
+
+def test_pad_collate_pads_to_the_longest_item(tiny_ml):
+    torch = tiny_ml.torch
+    batch = [{"input_ids": torch.tensor([2, 5, 3]), "label": torch.tensor(0)},
+             {"input_ids": torch.tensor([2, 5, 6, 8, 3]), "label": torch.tensor(2)}]
+
+    collated = tiny_ml.pad_collate(batch)
+
+    assert collated["input_ids"].tolist() == [[2, 5, 3, 0, 0], [2, 5, 6, 8, 3]]
+    assert collated["attention_mask"].sum(dim=1).tolist() == [3, 5]
+    assert collated["label"].tolist() == [0, 2]
+
+
+def test_bucket_sampler_resumes_with_the_same_order(tiny_ml):
+    lengths = [3, 17, 5, 9, 12, 4, 8, 15, 6, 11]
+    sampler = tiny_ml.LengthBucketSampler(lengths, batch_size=3, pool_batches=2, seed=7)
+    epochs = [list(sampler) for _ in range(3)]
+
+    resumed = tiny_ml.LengthBucketSampler(lengths, batch_size=3, pool_batches=2, seed=7)
+    resumed.epoch = 2
+
+    assert list(resumed) == epochs[2]
+    assert epochs[0] != epochs[1]
+    assert sorted(i for batch in epochs[0] for i in batch) == list(range(len(lengths)))
+
+
+def test_safetensors_checkpoint_loads_the_weights_the_sidecar_names(tiny_ml, tiny_model):
+    torch = tiny_ml.torch
+    promote(tiny_ml, tiny_model.state_dict(), "a")
+    retrained = dict(tiny_model.state_dict())
+    retrained["classifier.bias"] = retrained["classifier.bias"] + 1
+    promote(tiny_ml, retrained, "b")
+
+    loaded, labels = tiny_ml.build_model("fp32")
+
+    assert list(labels) == TINY_CLASSES
+    assert loaded.anomaly_head_trained
+    assert not any(param.requires_grad for param in loaded.parameters())
+    state = loaded.state_dict()
+    assert set(state) == set(retrained)
+    assert all(torch.equal(state[name], retrained[name]) for name in retrained)
+    input_ids, attention_mask = encode(tiny_ml, ["i feel sad today"])
+    with torch.inference_mode():
+        assert loaded(input_ids, attention_mask)["logits"].shape == (1, 3)
+
+
+def test_heads_match_the_separate_forward_passes(tiny_ml, tiny_model):
+    torch = tiny_ml.torch
+    input_ids, attention_mask = encode(tiny_ml, ["i feel sad today", "happy and calm"])
+    with torch.inference_mode():
+        heads = tiny_model.heads(input_ids, attention_mask, return_embedding=True)
+        logits = tiny_model(input_ids, attention_mask)["logits"]
+        anomaly = tiny_model(input_ids, attention_mask, anomaly=True)["anomaly_score"].squeeze(-1)
+        cls = tiny_model.bert(input_ids=input_ids, attention_mask=attention_mask).last_hidden_state[:, 0]
+
+    assert torch.allclose(heads["logits"], logits, atol=1e-6)
+    assert torch.allclose(heads["anomaly_score"], anomaly, atol=1e-6)
+    assert torch.allclose(heads["embedding"], cls, atol=1e-6)
+    assert "embedding" not in tiny_model.heads(input_ids, attention_mask)
+
+
+def test_long_text_windows_overlap_and_are_capped(tiny_ml):
+    engine = tiny_ml.LocalEmotionEngine(batch_size=4, window_ms=1, max_length=6, long_text=True,
+                                        stride=2, max_windows=3)
+    tok = tiny_ml.get_tokenizer()
+    long_text = "the day was very very very long and i feel so sad today"
+    ids = tok(long_text, add_special_tokens=False)["input_ids"]
+
+    input_ids, attention_mask, spans = engine.encode_windows([long_text, "happy"])
+
+    # 13 tokens in windows of 4 with stride 2 -> 6 windows, capped to 3 spread over the text
+    assert spans == [(0, 3), (3, 4)]
+    assert input_ids[:, 0].tolist() == [tok.cls_token_id] * 4
+    windows = [row[1:int(mask.sum()) - 1].tolist() for row, mask in zip(input_ids, attention_mask)]
+    assert windows[0] == ids[0:4] and windows[1] == ids[4:8] and windows[2] == ids[10:13]
+    assert windows[3] == tok("happy", add_special_tokens=False)["input_ids"]
+
+
+@pytest.mark.parametrize("aggregation", ["max", "mean", "attention"])
+def test_window_aggregation_returns_one_distribution_per_text(tiny_ml, aggregation):
+    torch = tiny_ml.torch
+    engine = tiny_ml.LocalEmotionEngine(batch_size=4, window_ms=1, max_length=6, long_text=True,
+                                        aggregation=aggregation)
+    logits = torch.tensor([[2.0, 0.0, 0.0], [0.0, 0.0, 4.0], [1.0, 1.0, 1.0]])
+    probs = torch.softmax(logits, dim=-1)
+    anomaly = torch.tensor([0.2, 0.9, 0.4])
+    embedding = torch.arange(6.0).reshape(3, 2)
+
+    text_probs, text_anomaly, text_embedding = engine.aggregate(logits, probs, anomaly, embedding, 0, 2)
+    single = engine.aggregate(logits, probs, anomaly, embedding, 2, 3)
+
+    assert torch.isclose(text_probs.sum(), torch.tensor(1.0))
+    assert 0.2 <= float(text_anomaly) <= 0.9
+    assert text_embedding.shape == (2,)
+    if aggregation == "max":
+        assert float(text_anomaly) == pytest.approx(0.9)
+    elif aggregation == "mean":
+        assert torch.allclose(text_probs, probs[:2].mean(dim=0))
+    else:
+        # the more decided second window outweighs the first
+        assert int(text_probs.argmax()) == 2
+    assert torch.equal(single[0], probs[2]) and float(single[1]) == pytest.approx(0.4)
+
+
+def test_long_text_inference_reports_its_windows(tiny_ml, tiny_model):
+    engine = tiny_ml.LocalEmotionEngine(batch_size=4, window_ms=1, max_length=6, long_text=True,
+                                        stride=2, max_windows=3, window_batch=2)
+
+    long_result, short_result = engine.infer(["the day was very very very long and i feel so sad today",
+                                              "happy"])
+
+    assert long_result["windows"] == 3 and "windows" not in short_result
+    assert engine.stats["windows"] == 4
+
+
+def run_export(exporter, monkeypatch, tmp_path, *args):
+    dataset = tmp_path / "export.csv"
+    dataset.write_text("text,label\ni feel sad,sadness\nhappy today,joy\n")
+    monkeypatch.setattr("sys.argv", ["export_model.py", "--samples", "2", "--dataset", str(dataset), *args])
+    exporter.main()
+
+
+def test_safetensors_conversion_writes_versioned_weights_once(tiny_ml, tiny_model, exporter, monkeypatch, tmp_path):
+    tiny_ml.torch.save({"model_state_dict": tiny_model.state_dict(), "label_encoder_classes": TINY_CLASSES,
+                        "num_labels": 3, "anomaly_head_trained": True}, tiny_ml.CHECKPOINT_FILE)
+
+    run_export(exporter, monkeypatch, tmp_path, "--safetensors")
+    metadata = tiny_ml.read_checkpoint_metadata()
+    assert metadata["weights"].startswith("emotion_classifier-")
+    assert not os.path.exists(tiny_ml.CHECKPOINT_SAFETENSORS_FILE)
+
+    run_export(exporter, monkeypatch, tmp_path, "--safetensors")
+    assert tiny_ml.read_checkpoint_metadata() == metadata
+    weights = [name for name in os.listdir(tiny_ml.CHECKPOINT_DIR) if name.endswith(".safetensors")]
+    assert weights == [metadata["weights"]]
@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+
+import app
+
+
+class FakeCursor:
+    def __init__(self, row):
+        self.row = row
+        self.executed = []
+
+    def execute(self, sql, params):
+        self.executed.append(params)
+
+    def fetchone(self):
+        return self.row
+
+
+def test_add_comment_returns_the_commenter(monkeypatch):
+    cursor = FakeCursor({"id": 7, "space": "Community Support"})
+    monkeypatch.setattr(app, "db_cursor", contextmanager(lambda: (yield cursor)))
+    monkeypatch.setattr(app, "analyze_text", lambda text: {"label": "joy"})
+    invalidated = []
+    monkeypatch.setattr(app.feed_cache, "invalidate", invalidated.append)
+
+    response = app.app.test_client().post("/posts/3/comments", json={"text": "thanks", "user_name": "sam"})
+
+    assert response.get_json() == {"id": 7, "post_id": 3, "user_name": "sam", "text": "thanks", "emotion": "joy"}
+    assert cursor.executed[0][1] == "sam"
+    assert invalidated == ["Community Support"]
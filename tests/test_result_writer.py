@@ -0,0 +1,47 @@
+import app
+
+
+def make_writer(tmp_path):
+    return app.ResultWriter(flush_size=10, interval=1, retries=1, spill_file=str(tmp_path / "pending.ndjson"))
+
+
+def test_leftover_replaying_file_is_replayed_first(tmp_path, monkeypatch):
+    inserted = []
+    monkeypatch.setattr(app, "insert_rows", lambda table, rows: inserted.append((table, rows)))
+    writer = make_writer(tmp_path)
+    writer._append_spill("anxiety_results", [("old",)])
+    (tmp_path / "pending.ndjson").rename(tmp_path / "pending.ndjson.replaying")
+    writer._append_spill("anxiety_results", [("new",)])
+
+    assert writer._spill_pending()
+    writer._replay_spill()
+
+    assert inserted == [("anxiety_results", [("old",)]), ("anxiety_results", [("new",)])]
+    assert not writer._spill_pending()
+
+
+def test_replay_skips_while_another_writer_holds_the_lock(tmp_path, monkeypatch):
+    inserted = []
+    monkeypatch.setattr(app, "insert_rows", lambda table, rows: inserted.append((table, rows)))
+    first, second = make_writer(tmp_path), make_writer(tmp_path)
+    first._append_spill("anxiety_results", [("row",)])
+
+    with first._spill_locked():
+        second._replay_spill()
+    assert inserted == []
+
+    second._replay_spill()
+    assert inserted == [("anxiety_results", [("row",)])]
+
+
+def test_failed_replay_keeps_rows(tmp_path, monkeypatch):
+    def fail(table, rows):
+        raise RuntimeError("database down")
+    monkeypatch.setattr(app, "insert_rows", fail)
+    writer = make_writer(tmp_path)
+    writer._append_spill("anxiety_results", [("row",)])
+
+    writer._replay_spill()
+
+    assert (tmp_path / "pending.ndjson").read_text().count("\n") == 1
+    assert not (tmp_path / "pending.ndjson.replaying").exists()
@@ -0,0 +1,52 @@
+import math
+
+import numpy as np
+import pytest
+
+import app
+from scoring import INSTRUMENTS, ScoringError, answers_matrix, logistic_scores, score_batch, score_one
+
+
+def loop_score(instrument, answers):
+    model = INSTRUMENTS[instrument]
+    logit = sum(w * a for w, a in zip(model["weights"], answers)) + model["intercept"]
+    return 1 / (1 + math.exp(-logit))
+
+
+@pytest.mark.parametrize("instrument", sorted(INSTRUMENTS))
+def test_vectorized_scores_match_a_per_row_loop(instrument):
+    items = len(INSTRUMENTS[instrument]["weights"])
+    rng = np.random.default_rng(0)
+    submissions = rng.integers(0, 4, size=(50, items)).tolist()
+
+    scores = logistic_scores(instrument, answers_matrix(instrument, submissions))
+
+    assert np.allclose(scores, [loop_score(instrument, row) for row in submissions])
+    assert score_one(instrument, submissions[0]) == pytest.approx(loop_score(instrument, submissions[0]))
+
+
+@pytest.mark.parametrize("instrument,answers", [
+    ("gad7", [1] * 6), ("phq9", [1] * 10), ("who5", [1] * 4), ("gad7", "1111111"), ("bdi", [1] * 7),
+])
+def test_wrong_shapes_raise_scoring_error(instrument, answers):
+    with pytest.raises(ScoringError):
+        score_batch(instrument, [answers])
+
+
+def test_who5_rejects_non_numeric_answers_instead_of_scoring_zero():
+    assert score_one("who5", {"q1": "3", "q2": 4, "q3": 2.0, "q4": 5, "q5": 3}) == score_one("who5", [3, 4, 2, 5, 3])
+    for bad in ("often", None, True, "nan"):
+        with pytest.raises(ScoringError):
+            score_one("who5", [3, 4, bad, 5, 3])
+
+
+def test_score_batch_route():
+    client = app.app.test_client()
+    response = client.post("/score/batch", json={"instrument": "gad7", "submissions": [[3] * 7, [0] * 7]})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert body["totals"] == [21, 0]
+    assert body["lr_scores"] == [round(loop_score("gad7", [3] * 7), 4), round(loop_score("gad7", [0] * 7), 4)]
+
+    bad = client.post("/score/batch", json={"instrument": "who5", "submissions": [[1, 2, "x", 4, 5]]})
+    assert bad.status_code == 400
@@ -0,0 +1,24 @@
+import os
+
+import app
+
+
+def test_train_rejects_bad_numbers_with_400(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "TRAINING_JOBS_DIR", str(tmp_path))
+    client = app.app.test_client()
+    for body in ({"epochs": "five"}, {"batch_size": None}, {"grad_accum": 0}, {"threads": -1}, [1, 2]):
+        response = client.post("/train", json=body)
+        assert response.status_code == 400, body
+
+
+def test_queued_job_is_alive_before_its_pid_is_known(tmp_path, monkeypatch):
+    monkeypatch.setattr(app, "TRAINING_JOBS_DIR", str(tmp_path))
+    job = {"id": "abc", "status": "queued", "spawned_by": os.getpid()}
+    os.makedirs(app.training_job_dir("abc"))
+    app.write_training_job(dict(job))
+
+    assert app.training_job_alive(job)
+    response = app.app.test_client().get("/training_status?job_id=abc")
+    assert response.get_json()["status"] == "queued"
+
+    assert not app.training_job_alive(dict(job, status="running"))